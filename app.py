@@ -9,6 +9,7 @@ import os
 import sys
 import io
 from modules.module3_search_ranking.search_engine import SearchEngine
+from modules.module3_search_ranking.facets import facet_key, status_key
 from config.settings import Config
 
 if sys.platform.startswith('win'):
@@ -33,6 +34,57 @@ logger = logging.getLogger(__name__)
 
 search_engine = SearchEngine()
 
+def parse_filters(args) -> dict:
+    """Đọc bộ lọc facet từ query string (country=, genre=, status= lặp được; year_from=, year_to=)"""
+    filters = {}
+    for name in ('country', 'genre', 'status'):
+        values = [value.strip() for value in args.getlist(name) if value.strip()]
+        if values:
+            filters[name] = values
+    for name in ('year_from', 'year_to'):
+        value = args.get(name, type=int)
+        if value is not None:
+            filters[name] = value
+    return filters
+
+# Tiêu đề các nhóm facet ở sidebar trang kết quả và số giá trị hiển thị mỗi nhóm
+FACET_TITLES = {'country': 'Quốc gia', 'genre': 'Thể loại', 'status': 'Trạng thái', 'year': 'Năm'}
+FACET_SIDEBAR_LIMIT = 10
+
+def filter_key(facet: str, value) -> str:
+    """Khóa so khớp giá trị bộ lọc (giống FacetIndex.normalize_filters)"""
+    key = facet_key(str(value))
+    return (status_key(key) or key) if facet == 'status' else key
+
+def facet_sidebar(facets: dict, filters: dict) -> list:
+    """Các nhóm facet cho sidebar: [(tiêu đề, [{'label', 'count', 'selected', 'filters'}])]
+    
+    'filters' là bộ lọc khi bấm vào giá trị: bỏ giá trị nếu đang chọn, thêm
+    nếu chưa (năm: lọc đúng một năm).
+    """
+    groups = []
+    for facet, items in facets.items():
+        links = []
+        for item in items:
+            value = item['value']
+            if facet == 'year':
+                selected = filters.get('year_from') == value == filters.get('year_to')
+                toggled = {name: values for name, values in filters.items() if name not in ('year_from', 'year_to')}
+                if not selected:
+                    toggled.update(year_from=value, year_to=value)
+            else:
+                key = filter_key(facet, value)
+                others = [other for other in filters.get(facet, []) if filter_key(facet, other) != key]
+                selected = len(others) < len(filters.get(facet, []))
+                toggled = {name: values for name, values in filters.items() if name != facet}
+                values = others if selected else others + [value]
+                if values:
+                    toggled[facet] = values
+            links.append({'label': item['label'], 'count': item['count'], 'selected': selected, 'filters': toggled})
+        if links:
+            groups.append((FACET_TITLES.get(facet, facet), links))
+    return groups
+
 @app.route('/')
 def index():
     """Trang chủ với form tìm kiếm"""
@@ -43,26 +95,32 @@ def search():
     """Endpoint xử lý tìm kiếm"""
     query = request.args.get('q', '').strip()
     page = int(request.args.get('page', 1))
+    filters = parse_filters(request.args)
     
-    if not query:
+    if not query and not filters:
         return render_template('search_results.html', 
                              query='', 
                              results=[], 
                              total=0,
-                             page=page)
+                             page=page,
+                             filters={},
+                             facet_groups=[])
     
     try:
         # Thực hiện tìm kiếm
-        results, total = search_engine.search(query, page=page)
+        results, total = search_engine.search(query, page=page, filters=filters)
+        facets = search_engine.get_facets(query, filters, FACET_SIDEBAR_LIMIT)
         
         # Log kết quả
-        logger.info(f"Tìm kiếm: '{query}' - Tìm thấy {total} kết quả")
+        logger.info(f"Tìm kiếm: '{query}' {filters} - Tìm thấy {total} kết quả")
         
         return render_template('search_results.html',
                              query=query,
                              results=results,
                              total=total,
-                             page=page)
+                             page=page,
+                             filters=filters,
+                             facet_groups=facet_sidebar(facets, filters))
                              
     except Exception as e:
         logger.error(f"Lỗi khi tìm kiếm: {str(e)}")
@@ -73,22 +131,39 @@ def api_search():
     """API endpoint cho tìm kiếm"""
     query = request.args.get('q', '').strip()
     page = int(request.args.get('page', 1))
+    filters = parse_filters(request.args)
     
-    if not query:
+    if not query and not filters:
         return jsonify({'results': [], 'total': 0, 'page': page})
     
     try:
-        results, total = search_engine.search(query, page=page)
+        results, total = search_engine.search(query, page=page, filters=filters)
         return jsonify({
             'query': query,
+            'filters': filters,
             'results': results,
             'total': total,
-            'page': page
+            'page': page,
+            'facets': search_engine.get_facets(query, filters)
         })
     except Exception as e:
         logger.error(f"API search error: {str(e)}")
         return jsonify({'error': 'Search failed'}), 500
 
+@app.route('/api/facets')
+def api_facets():
+    """API endpoint đếm facet (quốc gia, thể loại, trạng thái, năm) cho query hiện tại"""
+    query = request.args.get('q', '').strip()
+    filters = parse_filters(request.args)
+    limit = request.args.get('limit', type=int)
+    
+    try:
+        facets = search_engine.get_facets(query, filters, limit)
+        return jsonify({'query': query, 'filters': filters, 'facets': facets})
+    except Exception as e:
+        logger.error(f"API facets error: {str(e)}")
+        return jsonify({'error': 'Facets failed'}), 500
+
 @app.route('/api/suggestions')
 def api_suggestions():
     """API endpoint cho search suggestions"""
@@ -124,6 +199,11 @@ def api_movies_by_genre(genre):
         logger.error(f"API movies by genre error: {str(e)}")
         return jsonify({'movies': [], 'genre': genre})
 
+@app.route('/api/stats')
+def api_stats():
+    """API endpoint cho thống kê vận hành (pool kết nối database, cache kết quả)"""
+    return jsonify(search_engine.get_stats())
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
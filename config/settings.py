@@ -18,9 +18,18 @@ class Config:
     # Database settings
     BASE_DIR = Path(__file__).parent.parent
     DATABASE_PATH = BASE_DIR / 'data' / 'search_engine.db'
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Byte được mmap khi đọc database
+    SQLITE_CACHE_SIZE_KB = 16 * 1024  # Page cache mỗi kết nối (KB)
+    SQLITE_IMMUTABLE = os.environ.get('SQLITE_IMMUTABLE', 'False').lower() == 'true'  # Chỉ bật khi file không bao giờ bị ghi
     
     # Crawling settings
-    CRAWL_DELAY = 1  # Giây delay giữa các request
+    CRAWL_RATE = float(os.environ.get('CRAWL_RATE', 1.0))  # Số request/giây tối đa tới mỗi host
+    CRAWL_BURST = 2  # Số request được gửi dồn khi host đã rảnh một lúc
+    CRAWL_CONCURRENCY = int(os.environ.get('CRAWL_CONCURRENCY', 4))  # Số thread tải trang chi tiết song song
+    CRAWL_TIMEOUT = 30  # Giây chờ tối đa mỗi request
+    CRAWL_HTML_PARSER = os.environ.get('CRAWL_HTML_PARSER', 'lxml')  # 'lxml' (một lượt) hoặc 'html.parser' (BeautifulSoup)
+    CRAWL_WRITE_BATCH = int(os.environ.get('CRAWL_WRITE_BATCH', 200))  # Số dòng mỗi transaction ghi database
+    CRAWL_FLUSH_INTERVAL = 5.0  # Giây tối đa một dòng nằm trong bộ đệm ghi
     MAX_PAGES_PER_SITE = 100
     ALLOWED_DOMAINS = [
         'motchill.cc',
@@ -37,11 +46,35 @@ class Config:
     RESULTS_PER_PAGE = 10
     MAX_RESULTS = 1000
     MIN_SCORE_THRESHOLD = 0.1
+    SEARCH_CACHE_SIZE = 512  # Số query tối đa giữ trong cache kết quả (LRU)
+    SEARCH_CACHE_TTL = 600  # Giây một kết quả được giữ trong cache
+    KEYWORD_CACHE_SIZE = 4096  # Số term khớp substring giữ trong cache posting của mỗi index/segment (LRU)
+    PROXIMITY_BOOST = 20.0  # Điểm cộng tối đa khi các từ khóa đứng liền nhau
+    PROXIMITY_WINDOW = 8  # Số vị trí tối đa của cửa sổ chứa mọi từ khóa để được cộng điểm
     
     # TF-IDF settings
     MAX_DF = 0.85  # Bỏ qua từ xuất hiện trong >85% documents
     MIN_DF = 2     # Bỏ qua từ xuất hiện trong <2 documents
     MAX_FEATURES = 10000  # Số từ tối đa trong vocabulary
+    SCORING_BACKEND = os.environ.get('SCORING_BACKEND', 'python')  # 'python' hoặc 'numpy' (cần scipy)
+    DYNAMIC_PRUNING = True  # Cắt tỉa MaxScore khi chọn top-k (kết quả không đổi)
+    
+    # BM25F settings
+    BM25_K1 = 1.2  # Độ bão hòa tần suất term
+    BM25_B = 0.75  # Mức chuẩn hóa theo độ dài field (0: không chuẩn hóa)
+    FIELD_BOOSTS = {  # Trọng số từng field khi chấm điểm (field không có mặt: 1.0)
+        'title': 2.0,
+        'original_title': 1.0,
+        'description': 1.0,
+        'genre': 1.5,
+        'cast': 1.2,
+        'director': 1.3,
+        'country': 1.0
+    }
+    
+    # Index segment settings
+    SEGMENT_MERGE_FACTOR = 4  # Gộp khi một tầng có đủ 4 segment cùng cỡ
+    MAX_SEGMENTS = 8  # Số segment tối đa mỗi truy vấn phải duyệt
     
     # Evaluation settings
     GROUND_TRUTH_PATH = BASE_DIR / 'data' / 'ground_truth.json'
@@ -53,8 +86,10 @@ class Config:
     
     # File paths
     RAW_DATA_PATH = BASE_DIR / 'data' / 'raw'
+    RAW_HTML_PATH = RAW_DATA_PATH / 'html'  # Trang chi tiết đã lưu (--save-html), dùng cho benchmark parser
     PROCESSED_DATA_PATH = BASE_DIR / 'data' / 'processed'
     INDEX_PATH = BASE_DIR / 'data' / 'index'
+    INDEX_SEGMENTS_PATH = INDEX_PATH / 'segments'
     
     @classmethod
     def init_directories(cls):
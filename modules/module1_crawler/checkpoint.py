@@ -0,0 +1,156 @@
+"""
+Module 1: Web Crawling
+Checkpoint của lượt crawl để chạy tiếp sau khi bị dừng giữa chừng
+
+Trạng thái nằm trong hai bảng của database phim:
+- crawl_categories: trang danh sách cuối cùng đã tải của từng category và
+  category đó đã xong chưa;
+- crawl_failed_pages: trang danh sách tải lỗi, được tải lại khi chạy tiếp
+  (category còn trang lỗi thì chưa được tính là xong);
+- crawl_frontier: link trang chi tiết lấy từ từng trang danh sách (theo thứ
+  tự category, trang, vị trí) cùng trạng thái 'pending' / 'done' / 'failed'.
+
+Link của một trang danh sách được ghi cùng transaction với số trang, nên chạy
+tiếp không phải tải lại trang danh sách đã xong. Trạng thái 'done' của trang
+chi tiết được crawler ghi cùng transaction với phim (xem flush_writes).
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from modules.module1_crawler.frontier import normalize_url
+
+class CrawlCheckpoint:
+    """Trạng thái lượt crawl lưu trong database (an toàn giữa các thread)"""
+    
+    # Cập nhật trạng thái trang chi tiết; crawler chạy câu này trong transaction ghi phim
+    UPDATE_STATUS_SQL = 'UPDATE crawl_frontier SET status = ? WHERE url = ?'
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS crawl_categories (
+                            category TEXT PRIMARY KEY,
+                            last_page INTEGER NOT NULL DEFAULT 0,
+                            done INTEGER NOT NULL DEFAULT 0
+                        )
+                    ''')
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS crawl_frontier (
+                            rank INTEGER NOT NULL,
+                            page INTEGER NOT NULL,
+                            position INTEGER NOT NULL,
+                            url TEXT NOT NULL,
+                            status TEXT NOT NULL DEFAULT 'pending',
+                            PRIMARY KEY (rank, page, position)
+                        )
+                    ''')
+                    conn.execute('CREATE INDEX IF NOT EXISTS idx_crawl_frontier_url ON crawl_frontier(url)')
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS crawl_failed_pages (
+                            category TEXT NOT NULL,
+                            page INTEGER NOT NULL,
+                            PRIMARY KEY (category, page)
+                        )
+                    ''')
+            finally:
+                conn.close()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def _write(self, statements: Iterable[Tuple[str, object]]):
+        """Chạy các câu lệnh (sql, tham số | list tham số) trong một transaction"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    for sql, params in statements:
+                        if isinstance(params, list):
+                            conn.executemany(sql, params)
+                        else:
+                            conn.execute(sql, params)
+            finally:
+                conn.close()
+    
+    def start(self, categories: List[str], resume: bool = False):
+        """Bắt đầu lượt crawl
+        
+        Args:
+            resume: giữ trạng thái lượt trước (chạy tiếp); False thì xóa và bắt đầu lại
+        """
+        statements = [] if resume else [('DELETE FROM crawl_frontier', ()), ('DELETE FROM crawl_categories', ()),
+                                        ('DELETE FROM crawl_failed_pages', ())]
+        statements.append(('INSERT OR IGNORE INTO crawl_categories (category) VALUES (?)',
+                           [(category,) for category in categories]))
+        self._write(statements)
+    
+    def unfinished(self) -> bool:
+        """Lượt crawl trước còn dở: còn category chưa xong hoặc trang chi tiết chưa tải"""
+        conn = self._connect()
+        try:
+            return bool(conn.execute(
+                "SELECT EXISTS(SELECT 1 FROM crawl_categories WHERE done = 0) "
+                "OR EXISTS(SELECT 1 FROM crawl_frontier WHERE status = 'pending')"
+            ).fetchone()[0])
+        finally:
+            conn.close()
+    
+    def categories(self) -> Dict[str, Tuple[int, bool]]:
+        """{category: (trang danh sách cuối đã tải, đã xong)}"""
+        conn = self._connect()
+        try:
+            return {category: (last_page, bool(done)) for category, last_page, done in
+                    conn.execute('SELECT category, last_page, done FROM crawl_categories')}
+        finally:
+            conn.close()
+    
+    def save_page(self, rank: int, category: str, page: int, urls: List[str]):
+        """Ghi link lấy từ một trang danh sách và đánh dấu trang đó đã tải
+        
+        Args:
+            rank: thứ tự của category trong lượt crawl (giữ thứ tự link khi chạy tiếp)
+        """
+        self._write([
+            ('INSERT OR IGNORE INTO crawl_frontier (rank, page, position, url) VALUES (?, ?, ?, ?)',
+             [(rank, page, position, normalize_url(url)) for position, url in enumerate(urls)]),
+            ('UPDATE crawl_categories SET last_page = MAX(last_page, ?) WHERE category = ?', (page, category)),
+            ('DELETE FROM crawl_failed_pages WHERE category = ? AND page = ?', (category, page))
+        ])
+    
+    def fail_page(self, category: str, page: int):
+        """Ghi trang danh sách tải lỗi để lần chạy tiếp tải lại"""
+        self._write([('INSERT OR IGNORE INTO crawl_failed_pages (category, page) VALUES (?, ?)', (category, page))])
+    
+    def failed_pages(self) -> Dict[str, List[int]]:
+        """{category: [trang danh sách tải lỗi]}"""
+        conn = self._connect()
+        try:
+            pages = {}
+            for category, page in conn.execute('SELECT category, page FROM crawl_failed_pages ORDER BY category, page'):
+                pages.setdefault(category, []).append(page)
+            return pages
+        finally:
+            conn.close()
+    
+    def finish_category(self, category: str):
+        """Đánh dấu category đã xong, trừ khi còn trang danh sách tải lỗi"""
+        self._write([('UPDATE crawl_categories SET done = 1 WHERE category = ? AND NOT EXISTS '
+                      '(SELECT 1 FROM crawl_failed_pages WHERE category = ?)', (category, category))])
+    
+    def frontier_urls(self) -> List[Tuple[str, str]]:
+        """(url, trạng thái) theo thứ tự category, trang, vị trí"""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT url, status FROM crawl_frontier ORDER BY rank, page, position').fetchall()
+        finally:
+            conn.close()
@@ -8,10 +8,15 @@ import requests
 from bs4 import BeautifulSoup
 import json
 import time
+import gzip
+import hashlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import sqlite3
+from datetime import datetime, timezone
 from pathlib import Path
 import os
 import sys
@@ -20,26 +25,77 @@ import re
 # Thêm path để import config
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from config.settings import Config
+from modules.module2_text_processing.text_processor import MovieIndexBuilder
+from modules.module1_crawler.rate_limiter import HostRateLimiter
+from modules.module1_crawler.frontier import URLFrontier
+from modules.module1_crawler.checkpoint import CrawlCheckpoint
+from modules.module1_crawler.detail_parser import LXML_AVAILABLE, parse_detail_html
 
 class MotchillCrawler:
     """Crawler chuyên dụng cho website Motchilli.io (Đã cập nhật)"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+    MOVIE_COLUMNS = ('title', 'original_title', 'url', 'description', 'year', 'genre', 'country',
+                     'director', 'cast', 'duration', 'quality', 'rating', 'poster_url',
+                     'trailer_url', 'episodes', 'status', 'source_website')
+    
+    # Số dòng đọc từ cursor mỗi lần khi xuất dữ liệu
+    EXPORT_CHUNK_SIZE = 500
+    
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    
+    def __init__(self, base_url: str = None, db_path=None, concurrency: int = None, rate: float = None):
+        """
+        Args:
+            base_url: gốc website (mặc định Motchilli; trỏ sang server HTTP local khi test)
+            db_path: file database (mặc định Config.DATABASE_PATH)
+            concurrency: số thread tải trang chi tiết (mặc định Config.CRAWL_CONCURRENCY)
+            rate: số request/giây tối đa tới mỗi host (mặc định Config.CRAWL_RATE)
+        """
+        # Mỗi thread một Session (requests.Session không đảm bảo an toàn giữa các thread)
+        self._local = threading.local()
         
         # Cấu hình logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         
         # Khởi tạo database
-        self.db_path = Config.DATABASE_PATH
+        self.db_path = db_path or Config.DATABASE_PATH
         self.init_database()
         
         # Base URL cho Motchilli (ĐÃ CẬP NHẬT)
-        self.base_url = "https://motchilli.io"
+        self.base_url = (base_url or "https://motchilli.io").rstrip('/')
+        
+        self.concurrency = max(1, concurrency or Config.CRAWL_CONCURRENCY)
+        self.rate_limiter = HostRateLimiter(rate or Config.CRAWL_RATE, Config.CRAWL_BURST)
+        
+        # Thư mục lưu HTML trang chi tiết đã tải (None: không lưu)
+        self.html_dir = None
+        
+        # Checkpoint của lượt crawl đang chạy (trạng thái trang chi tiết ghi cùng batch phim)
+        self.checkpoint: Optional[CrawlCheckpoint] = None
+        
+        # Bộ đệm ghi database (write-behind), chỉ dùng từ thread điều phối
+        self._pending_movies: List[Dict] = []
+        self._pending_cache: List[Dict] = []
+        self._pending_status: List[Tuple[str, str]] = []
+        self._last_flush = time.monotonic()
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self.failed_urls = set()  # URL có phim ghi lỗi
+        self.write_stats = {'rows': 0, 'batches': 0, 'seconds': 0.0}
+    
+    @property
+    def session(self) -> requests.Session:
+        """Session HTTP của thread hiện tại"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update({'User-Agent': self.USER_AGENT})
+        return session
+    
+    def fetch(self, url: str, headers: Dict = None) -> requests.Response:
+        """GET url sau khi chờ tới lượt của host (thay cho sleep cố định giữa các request)"""
+        self.rate_limiter.acquire(url)
+        return self.session.get(url, headers=headers, timeout=Config.CRAWL_TIMEOUT)
         
     def init_database(self):
         """Khởi tạo database để lưu dữ liệu phim"""
@@ -48,6 +104,9 @@ class MotchillCrawler:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL: web app đọc song song trong khi crawler ghi (chế độ lưu luôn trong file DB)
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Tạo bảng lưu movies
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS movies (
@@ -73,11 +132,35 @@ class MotchillCrawler:
             )
         ''')
         
+        # Xuất phần thay đổi theo crawled_at (export_to_json(since=...))
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movies_crawled_at ON movies(crawled_at)')
+        
+        # Validator HTTP và hash nội dung của từng trang chi tiết (crawl lại có điều kiện)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS page_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                movie_hash TEXT,
+                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
         conn.commit()
         conn.close()
         
-    def crawl_motchill_categories(self, max_pages: int = 10) -> List[Dict]:
-        """Thu thập danh sách phim từ các category của Motchilli (ĐÃ CẬP NHẬT)"""
+    def crawl_motchill_categories(self, max_pages: int = 10, persist_seen: bool = False,
+                                  resume: bool = False) -> List[Dict]:
+        """Thu thập danh sách phim từ các category của Motchilli (ĐÃ CẬP NHẬT)
+        
+        Tiến độ (trang danh sách đã tải, link và trạng thái trang chi tiết) được
+        ghi checkpoint trong database trong lúc crawl.
+        
+        Args:
+            persist_seen: bỏ qua các phim đã crawl ở lượt trước (tập URL lưu trong bảng crawled_urls)
+            resume: chạy tiếp lượt crawl bị dừng, không tải lại trang đã xong
+        """
         
         # Cập nhật danh sách thể loại theo cấu trúc /the-loai/
         categories = [
@@ -105,21 +188,61 @@ class MotchillCrawler:
             '/quoc-gia/au-my'
         ]
         
-        all_movies = []
+        checkpoint = CrawlCheckpoint(self.db_path)
+        checkpoint.start(categories, resume)
+        progress = checkpoint.categories()
+        failed_pages = checkpoint.failed_pages()
         
-        for category in categories:
-            self.logger.info(f"Crawling category: {category}")
-            # Giảm số trang crawl mỗi category để test nhanh hơn
-            movies = self.crawl_category_pages(category, max_pages)
-            all_movies.extend(movies)
+        def collect(rank: int, category: str):
+            last_page, done = progress[category]
+            if done:
+                return
+            on_page = lambda page, page_urls: checkpoint.save_page(rank, category, page, page_urls)
+            on_error = lambda page: checkpoint.fail_page(category, page)
             
-        return all_movies
+            # Trang danh sách lỗi ở lượt trước được tải lại trước
+            urls = []
+            for page in failed_pages.get(category, []):
+                urls += self.collect_movie_urls(category, page, start_page=page, on_page=on_page, on_error=on_error)
+            urls += self.collect_movie_urls(category, max_pages, start_page=last_page + 1,
+                                            on_page=on_page, on_error=on_error)
+            checkpoint.finish_category(category)
+            self.logger.info(f"Category {category}: {len(urls)} link (từ trang {last_page + 1})")
+        
+        # Gom link trang chi tiết của mọi category trước (mỗi category một thread,
+        # rate limiter vẫn giữ tốc độ chung của host), loại trùng rồi mới tải
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawler') as executor:
+            list(executor.map(collect, range(len(categories)), categories))
+        
+        # Link lấy từ checkpoint (gồm cả trang danh sách tải ở lượt trước khi chạy tiếp)
+        frontier_urls = checkpoint.frontier_urls()
+        finished = {url for url, status in frontier_urls if status == 'done'}
+        frontier = URLFrontier(self.db_path if persist_seen else None)
+        frontier.extend(url for url, status in frontier_urls if status != 'done')
+        
+        self.logger.info(f"Frontier: {len(frontier_urls)} link, {len(frontier)} trang chi tiết cần tải "
+                         f"(bỏ {frontier.duplicates} link trùng, {frontier.skipped_previous} link đã crawl trước đó, "
+                         f"{len(finished)} trang đã xong trước khi dừng)")
+        
+        self.checkpoint = checkpoint
+        try:
+            return self.crawl_movie_pages(frontier.pop_all(), frontier)
+        finally:
+            self.checkpoint = None
     
-    def crawl_category_pages(self, category: str, max_pages: int) -> List[Dict]:
-        """Thu thập phim từ một category cụ thể (ĐÃ CẬP NHẬT)"""
-        movies = []
+    def collect_movie_urls(self, category: str, max_pages: int, start_page: int = 1,
+                           on_page: Callable[[int, List[str]], None] = None,
+                           on_error: Callable[[int], None] = None) -> List[str]:
+        """Lấy link trang chi tiết từ các trang danh sách của một category (theo thứ tự xuất hiện)
         
-        for page in range(1, max_pages + 1):
+        Args:
+            start_page: trang danh sách bắt đầu (chạy tiếp từ checkpoint)
+            on_page: gọi với (số trang, link của trang) sau mỗi trang tải thành công
+            on_error: gọi với số trang khi tải trang đó lỗi (trang bị bỏ qua)
+        """
+        movie_urls = []
+        
+        for page in range(start_page, max_pages + 1):
             try:
                 # Cấu trúc URL trang dường như không có /page-{page} mà dùng ?page={page}
                 # Thử cả hai
@@ -127,23 +250,24 @@ class MotchillCrawler:
                 url_format_2 = f"{self.base_url}{category}/page/{page}"
                 
                 # Thử format 1 trước
-                response = self.session.get(url_format_1)
+                response = self.fetch(url_format_1)
                 self.logger.info(f"Crawling page {page}: {url_format_1}")
                 
                 if response.status_code != 200:
                     self.logger.info(f"Thử URL format 2: {url_format_2}")
-                    response = self.session.get(url_format_2) # Thử format 2
+                    response = self.fetch(url_format_2) # Thử format 2
                     response.raise_for_status() # Báo lỗi nếu thất bại
-
+                
                 soup = BeautifulSoup(response.content, 'html.parser')
                 
                 # Sửa selector dựa trên HTML mới: Tìm 'li' có class 'item'
                 movie_elements = soup.find_all('li', class_='item')
-
+                
                 if not movie_elements:
                     self.logger.info(f"Không tìm thấy phim ở trang {page}, dừng crawling category này")
                     break
                 
+                page_urls = []
                 for element in movie_elements:
                     # Sửa logic tìm link: Tìm link chi tiết trong h3.name-title
                     movie_link_tag = element.find('h3', class_='name-title')
@@ -154,102 +278,236 @@ class MotchillCrawler:
                     
                     if not movie_link:
                         movie_link = element.find('a') # Fallback
-
+                    
                     if movie_link:
                         movie_url = urljoin(self.base_url, movie_link.get('href'))
                         
                         # Bỏ qua nếu URL không hợp lệ
-                        if not movie_url.startswith(self.base_url + '/phim/'):
-                            continue
-
-                        movie_data = self.crawl_movie_detail(movie_url)
-                        
-                        if movie_data:
-                            movies.append(movie_data)
-                            self.save_movie_to_db(movie_data)
-                            
-                        # Delay để tránh spam
-                        time.sleep(Config.CRAWL_DELAY)
-                        
-                time.sleep(1)  # Delay giữa các trang
+                        if movie_url.startswith(self.base_url + '/phim/'):
+                            page_urls.append(movie_url)
+                
+                movie_urls.extend(page_urls)
+                if on_page:
+                    on_page(page, page_urls)
                 
             except Exception as e:
                 self.logger.error(f"Lỗi khi crawl trang {page} category {category}: {str(e)}")
+                if on_error:
+                    on_error(page)
                 continue
+        
+        return movie_urls
+    
+    def crawl_category_pages(self, category: str, max_pages: int) -> List[Dict]:
+        """Thu thập phim từ một category cụ thể (ĐÃ CẬP NHẬT)"""
+        frontier = URLFrontier()
+        frontier.extend(self.collect_movie_urls(category, max_pages))
+        return self.crawl_movie_pages(frontier.pop_all(), frontier)
+    
+    def crawl_movie_pages(self, urls: List[str], frontier: URLFrontier = None) -> List[Dict]:
+        """Tải và lưu các trang chi tiết
+        
+        Trang chi tiết được tải song song bởi self.concurrency thread; rate limiter
+        giữ tốc độ mỗi host. Trang đã crawl trước đó được tải có điều kiện và chỉ
+        phim mới/thay đổi được lưu, theo đúng thứ tự của urls.
+        
+        Returns:
+            Các phim mới hoặc có thay đổi
+        """
+        cache = self.load_page_cache()
+        movies = []
+        crawled_urls = []
+        self._last_flush = time.monotonic()
+        counts = {'changed': 0, 'unchanged': 0, 'failed': 0}
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawler') as executor:
+            results = executor.map(lambda url: self.refresh_movie_detail(url, cache.get(url)), urls)
+            for url, (state, movie_data, entry) in zip(urls, results):
+                counts[state] += 1
+                if state == 'failed':
+                    self.queue_write(frontier_status=('failed', url))
+                    continue
                 
+                if state == 'changed':
+                    movies.append(movie_data)
+                crawled_urls.append(url)
+                
+                # Phim thay đổi được ghi cùng page_cache; trang không đổi chỉ cập nhật page_cache khi cần
+                self.queue_write(movie_data, entry if entry != cache.get(url) else None, ('done', url))
+        
+        self.flush_writes()
+        if self.failed_urls:
+            movies = [movie_data for movie_data in movies if movie_data['url'] not in self.failed_urls]
+            crawled_urls = [url for url in crawled_urls if url not in self.failed_urls]
+        if frontier is not None:
+            frontier.mark_crawled(crawled_urls)
+        
+        self.logger.info(f"Trang chi tiết: {counts['changed']} mới/thay đổi, "
+                         f"{counts['unchanged']} không đổi, {counts['failed']} lỗi")
+        self.logger.info(self.write_report())
         return movies
     
+    def load_page_cache(self) -> Dict[str, Dict]:
+        """Đọc bảng page_cache: {url: bản ghi}"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            return {row['url']: dict(row) for row in conn.execute(
+                'SELECT url, etag, last_modified, content_hash, movie_hash FROM page_cache')}
+        finally:
+            conn.close()
+    
     def crawl_movie_detail(self, url: str) -> Optional[Dict]:
         """Thu thập chi tiết một bộ phim từ Motchill (ĐÃ CẬP NHẬT)"""
         try:
             self.logger.info(f"Crawling detail page: {url}")
-            response = self.session.get(url)
+            response = self.fetch(url)
             response.raise_for_status()
+            return self.parse_movie_detail(url, response.content)
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # --- Trích xuất thông tin phim (selectors MỚI) ---
-            
-            # Tiêu đề
-            title = self.safe_extract_text(soup.find('span', class_='title'))
-            if not title:
-                title = self.safe_extract_text(soup.find('h1')) # Fallback
-            
-            # Tiêu đề gốc
-            original_title_span = soup.find('span', class_='real-name')
-            original_title_text = self.safe_extract_text(original_title_span)
-            original_title = re.sub(r'\(\d{4}\)', '', original_title_text).strip() # Loại bỏ năm (2025)
-            
-            # Mô tả phim
-            description_elem = soup.find('div', class_='detail').find('div', class_='tab')
-            description = self.safe_extract_text(description_elem)
-            
-            # Thông tin chi tiết (dùng helper mới)
-            year = self.extract_year(soup)
-            genre = self.extract_genre(soup)
-            country = self.extract_country(soup)
-            director = self.extract_director(soup)
-            cast = self.extract_cast(soup)
-            duration = self.extract_duration(soup)
-            quality = self.extract_quality(soup)
-            rating = self.extract_rating(soup)
-            episodes = self.extract_episodes_info(soup)
-            status = self.extract_status(soup)
-            
-            # Poster
-            poster_elem = soup.find('div', class_='poster').find('img')
-            poster_url = poster_elem.get('src') if poster_elem else None
-            if poster_url and not poster_url.startswith('http'):
-                poster_url = urljoin(self.base_url, poster_url)
+        except Exception as e:
+            self.logger.error(f"Lỗi khi crawl movie {url}: {str(e)}")
+            return None
+    
+    def refresh_movie_detail(self, url: str, cached: Optional[Dict] = None) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """Tải lại trang chi tiết có điều kiện (If-None-Match / If-Modified-Since)
+        
+        Trang trả 304 hoặc có nội dung (hash) như lần trước thì không phải bóc
+        tách lại; phim bóc tách ra giống lần trước thì không phải ghi database.
+        
+        Args:
+            cached: bản ghi page_cache của url từ lần crawl trước (None nếu chưa có)
+        
+        Returns:
+            (trạng thái, movie_data, bản ghi page_cache mới); trạng thái là
+            'changed' (movie_data cần lưu), 'unchanged' hoặc 'failed'
+        """
+        try:
+            headers = {}
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
             
-            # Trailer (giữ logic cũ, có thể không tìm thấy)
-            trailer_url = self.extract_trailer_url(soup)
+            self.logger.info(f"Crawling detail page: {url}")
+            response = self.fetch(url, headers=headers)
+            if cached and response.status_code == 304:
+                return 'unchanged', None, cached
+            response.raise_for_status()
+            if self.html_dir:
+                self.save_html(url, response.content)
             
-            movie_data = {
-                'title': title,
-                'original_title': original_title,
+            entry = {
                 'url': url,
-                'description': description,
-                'year': year,
-                'genre': genre,
-                'country': country,
-                'director': director,
-                'cast': cast,
-                'duration': duration,
-                'quality': quality, # Ánh xạ sang "Ngôn ngữ"
-                'rating': rating,
-                'poster_url': poster_url,
-                'trailer_url': trailer_url,
-                'episodes': episodes, # Ánh xạ sang "Số tập"
-                'status': status, # Ánh xạ sang "Trạng thái"
-                'source_website': 'motchilli.io'
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': hashlib.sha1(response.content).hexdigest(),
+                'movie_hash': cached.get('movie_hash') if cached else None
             }
+            if cached and cached.get('content_hash') == entry['content_hash']:
+                return 'unchanged', None, entry
             
-            return movie_data
+            movie_data = self.parse_movie_detail(url, response.content)
+            entry['movie_hash'] = self.movie_hash(movie_data)
+            if cached and cached.get('movie_hash') == entry['movie_hash']:
+                return 'unchanged', None, entry
+            return 'changed', movie_data, entry
             
         except Exception as e:
             self.logger.error(f"Lỗi khi crawl movie {url}: {str(e)}")
-            return None
+            return 'failed', None, None
+    
+    def save_html(self, url: str, content: bytes):
+        """Lưu HTML trang chi tiết (tên file là slug của URL), làm fixture cho benchmark parser"""
+        try:
+            os.makedirs(self.html_dir, exist_ok=True)
+            slug = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1] or 'index'
+            with open(os.path.join(self.html_dir, f'{slug}.html'), 'wb') as f:
+                f.write(content)
+        except Exception as e:
+            self.logger.warning(f"Không lưu được HTML {url}: {e}")
+    
+    @staticmethod
+    def movie_hash(movie_data: Dict) -> str:
+        """Hash nội dung các field của phim (so xem có cần ghi lại không)"""
+        return hashlib.sha1(json.dumps(movie_data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    def parse_movie_detail(self, url: str, content: bytes) -> Dict:
+        """Bóc tách thông tin phim từ HTML trang chi tiết
+        
+        Mặc định dùng lxml một lượt (detail_parser); không có lxml hoặc
+        Config.CRAWL_HTML_PARSER = 'html.parser' thì dùng BeautifulSoup.
+        """
+        if LXML_AVAILABLE and Config.CRAWL_HTML_PARSER == 'lxml':
+            movie_data = parse_detail_html(content, self.base_url)
+            movie_data['url'] = url
+            movie_data['source_website'] = 'motchilli.io'
+            return movie_data
+        return self.parse_movie_detail_soup(url, content)
+    
+    def parse_movie_detail_soup(self, url: str, content: bytes) -> Dict:
+        """Bóc tách trang chi tiết bằng BeautifulSoup (html.parser), mỗi nhãn một lần tìm"""
+        soup = BeautifulSoup(content, 'html.parser')
+        
+        # --- Trích xuất thông tin phim (selectors MỚI) ---
+        
+        # Tiêu đề
+        title = self.safe_extract_text(soup.find('span', class_='title'))
+        if not title:
+            title = self.safe_extract_text(soup.find('h1')) # Fallback
+        
+        # Tiêu đề gốc
+        original_title_span = soup.find('span', class_='real-name')
+        original_title_text = self.safe_extract_text(original_title_span)
+        original_title = re.sub(r'\(\d{4}\)', '', original_title_text).strip() # Loại bỏ năm (2025)
+        
+        # Mô tả phim
+        description_elem = soup.find('div', class_='detail').find('div', class_='tab')
+        description = self.safe_extract_text(description_elem)
+        
+        # Thông tin chi tiết (dùng helper mới)
+        year = self.extract_year(soup)
+        genre = self.extract_genre(soup)
+        country = self.extract_country(soup)
+        director = self.extract_director(soup)
+        cast = self.extract_cast(soup)
+        duration = self.extract_duration(soup)
+        quality = self.extract_quality(soup)
+        rating = self.extract_rating(soup)
+        episodes = self.extract_episodes_info(soup)
+        status = self.extract_status(soup)
+        
+        # Poster
+        poster_elem = soup.find('div', class_='poster').find('img')
+        poster_url = poster_elem.get('src') if poster_elem else None
+        if poster_url and not poster_url.startswith('http'):
+            poster_url = urljoin(self.base_url, poster_url)
+        
+        # Trailer (giữ logic cũ, có thể không tìm thấy)
+        trailer_url = self.extract_trailer_url(soup)
+        
+        movie_data = {
+            'title': title,
+            'original_title': original_title,
+            'url': url,
+            'description': description,
+            'year': year,
+            'genre': genre,
+            'country': country,
+            'director': director,
+            'cast': cast,
+            'duration': duration,
+            'quality': quality, # Ánh xạ sang "Ngôn ngữ"
+            'rating': rating,
+            'poster_url': poster_url,
+            'trailer_url': trailer_url,
+            'episodes': episodes, # Ánh xạ sang "Số tập"
+            'status': status, # Ánh xạ sang "Trạng thái"
+            'source_website': 'motchilli.io'
+        }
+        
+        return movie_data
     
     def safe_extract_text(self, element) -> str:
         """Trích xuất text an toàn từ element"""
@@ -365,98 +623,225 @@ class MotchillCrawler:
         """
         return self._extract_info_from_list(soup, 'Trạng thái:')
     
-    def save_movie_to_db(self, movie_data: Dict):
-        """Lưu thông tin phim vào database"""
+    def save_movie_to_db(self, movie_data: Dict) -> bool:
+        """Lưu thông tin phim vào database ngay (kèm các dòng đang chờ trong bộ đệm)"""
+        self.queue_write(movie_data)
+        return self.flush_writes()
+    
+    def queue_write(self, movie_data: Optional[Dict] = None, cache_entry: Optional[Dict] = None,
+                    frontier_status: Optional[Tuple[str, str]] = None):
+        """Đưa phim, bản ghi page_cache và/hoặc trạng thái checkpoint (status, url) vào bộ đệm ghi
+        
+        Bộ đệm được ghi xuống khi đủ Config.CRAWL_WRITE_BATCH dòng hoặc đã quá
+        Config.CRAWL_FLUSH_INTERVAL giây kể từ lần ghi trước.
+        """
+        if movie_data:
+            self._pending_movies.append(movie_data)
+        if cache_entry:
+            self._pending_cache.append(cache_entry)
+        if frontier_status and self.checkpoint is not None:
+            self._pending_status.append(frontier_status)
+        
+        pending = len(self._pending_movies) + len(self._pending_cache) + len(self._pending_status)
+        if pending >= Config.CRAWL_WRITE_BATCH or time.monotonic() - self._last_flush >= Config.CRAWL_FLUSH_INTERVAL:
+            self.flush_writes()
+    
+    def _writer(self) -> sqlite3.Connection:
+        """Kết nối ghi dùng lại giữa các batch"""
+        if self._write_conn is None:
+            self._write_conn = sqlite3.connect(self.db_path)
+            # WAL (đặt trong init_database) + synchronous=NORMAL: chỉ fsync khi checkpoint
+            self._write_conn.execute('PRAGMA synchronous=NORMAL')
+        return self._write_conn
+    
+    def flush_writes(self) -> bool:
+        """Ghi toàn bộ bộ đệm trong một transaction (executemany)
+        
+        Phim, page_cache và trạng thái checkpoint của nó nằm cùng transaction:
+        batch lỗi (hoặc bị dừng trước khi ghi) thì không dòng nào được ghi, các
+        trang đó sẽ được tải lại ở lượt sau.
+        """
+        self._last_flush = time.monotonic()
+        movies, entries, statuses = self._pending_movies, self._pending_cache, self._pending_status
+        if not movies and not entries and not statuses:
+            return True
+        self._pending_movies, self._pending_cache, self._pending_status = [], [], []
+        
+        start = time.perf_counter()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO movies 
-                (title, original_title, url, description, year, genre, country,
-                 director, cast, duration, quality, rating, poster_url, 
-                 trailer_url, episodes, status, source_website)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                movie_data.get('title'),
-                movie_data.get('original_title'),
-                movie_data.get('url'),
-                movie_data.get('description'),
-                movie_data.get('year'),
-                movie_data.get('genre'),
-                movie_data.get('country'),
-                movie_data.get('director'),
-                movie_data.get('cast'),
-                movie_data.get('duration'),
-                movie_data.get('quality'),
-                movie_data.get('rating'),
-                movie_data.get('poster_url'),
-                movie_data.get('trailer_url'),
-                movie_data.get('episodes'),
-                movie_data.get('status'),
-                movie_data.get('source_website')
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-            self.logger.info(f"Đã lưu phim: {movie_data.get('title')}")
-            
+            conn = self._writer()
+            with conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO movies 
+                    (title, original_title, url, description, year, genre, country,
+                     director, cast, duration, quality, rating, poster_url, 
+                     trailer_url, episodes, status, source_website)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', ([movie_data.get(column) for column in self.MOVIE_COLUMNS] for movie_data in movies))
+                conn.executemany('''
+                    INSERT OR REPLACE INTO page_cache (url, etag, last_modified, content_hash, movie_hash)
+                    VALUES (:url, :etag, :last_modified, :content_hash, :movie_hash)
+                ''', entries)
+                if statuses:
+                    conn.executemany(CrawlCheckpoint.UPDATE_STATUS_SQL, statuses)
         except Exception as e:
-            self.logger.error(f"Lỗi khi lưu phim '{movie_data.get('title')}': {str(e)}")
+            self.logger.error(f"Lỗi khi lưu {len(movies)} phim vào database: {str(e)}")
+            self.failed_urls.update(movie_data.get('url') for movie_data in movies)
+            return False
+        
+        elapsed = time.perf_counter() - start
+        rows = len(movies) + len(entries) + len(statuses)
+        self.write_stats['rows'] += rows
+        self.write_stats['batches'] += 1
+        self.write_stats['seconds'] += elapsed
+        self.logger.info(f"Đã lưu {len(movies)} phim, {len(entries)} page_cache "
+                         f"({rows / max(elapsed, 1e-9):.0f} dòng/giây)")
+        return True
     
-    def export_to_json(self, output_file: str):
-        """Xuất dữ liệu ra file JSON"""
+    def write_report(self) -> str:
+        """Tóm tắt tốc độ ghi database (để chỉnh CRAWL_WRITE_BATCH)"""
+        stats = self.write_stats
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        return (f"Ghi database: {stats['rows']} dòng trong {stats['batches']} batch, "
+                f"{stats['seconds']:.3f} giây ({rate:.0f} dòng/giây)")
+    
+    def close(self):
+        """Ghi nốt bộ đệm và đóng kết nối ghi"""
+        self.flush_writes()
+        if self._write_conn is not None:
+            self._write_conn.close()
+            self._write_conn = None
+    
+    def export_to_json(self, output_file: str, since: str = None, compress: bool = None) -> int:
+        """Xuất dữ liệu ra file JSON hoặc NDJSON theo kiểu streaming
+        
+        Cursor được đọc từng khối EXPORT_CHUNK_SIZE dòng và ghi ngay, bộ nhớ
+        không phụ thuộc số phim. Đuôi .ndjson/.jsonl: mỗi dòng một phim; đuôi
+        khác: mảng JSON (giống json.dump(..., indent=2)). Đuôi .gz thì nén gzip.
+        File được ghi ra file tạm rồi đổi tên, người đọc không thấy file dở dang.
+        
+        Args:
+            since: chỉ xuất phim có crawled_at >= since ('YYYY-MM-DD HH:MM:SS', UTC
+                   như CURRENT_TIMESTAMP của SQLite) để đồng bộ phần thay đổi
+            compress: nén gzip (mặc định theo đuôi .gz)
+        
+        Returns:
+            Số phim đã xuất (-1 nếu lỗi)
+        """
+        if compress is None:
+            compress = output_file.endswith('.gz')
+        name = output_file[:-3] if output_file.endswith('.gz') else output_file
+        ndjson = name.endswith(('.ndjson', '.jsonl'))
+        
+        temp_file = f"{output_file}.tmp"
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            cursor.execute('SELECT * FROM movies')
-            rows = cursor.fetchall()
+            if since:
+                cursor.execute('SELECT * FROM movies WHERE crawled_at >= ? ORDER BY crawled_at, id', (since,))
+            else:
+                cursor.execute('SELECT * FROM movies')
             
             # Lấy tên cột
             column_names = [description[0] for description in cursor.description]
             
-            # Chuyển thành list of dict
-            movies = []
-            for row in rows:
-                movie_dict = dict(zip(column_names, row))
-                movies.append(movie_dict)
-            
-            # Lưu ra file JSON
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(movies, f, ensure_ascii=False, indent=2)
+            os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+            opener = gzip.open if compress else open
+            count = 0
+            latest = None
+            with opener(temp_file, 'wt', encoding='utf-8') as f:
+                if not ndjson:
+                    f.write('[')
+                while True:
+                    rows = cursor.fetchmany(self.EXPORT_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        movie_dict = dict(zip(column_names, row))
+                        if ndjson:
+                            f.write(json.dumps(movie_dict, ensure_ascii=False))
+                            f.write('\n')
+                        else:
+                            f.write(',\n  ' if count else '\n  ')
+                            f.write(json.dumps(movie_dict, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+                        count += 1
+                        latest = max(latest or '', movie_dict.get('crawled_at') or '')
+                if not ndjson:
+                    f.write('\n]' if count else ']')
             
             conn.close()
-            self.logger.info(f"Đã xuất {len(movies)} phim ra {output_file}")
+            os.replace(temp_file, output_file)
+            self.logger.info(f"Đã xuất {count} phim ra {output_file}"
+                             + (f" (crawled_at mới nhất: {latest})" if latest else ""))
+            return count
             
         except Exception as e:
             self.logger.error(f"Lỗi khi xuất dữ liệu: {str(e)}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return -1
 
 def main():
     """Hàm main để chạy crawler"""
     crawler = MotchillCrawler()
     
-    # Xóa DB cũ để crawl lại (QUAN TRỌNG)
-    if os.path.exists(crawler.db_path):
-        os.remove(crawler.db_path)
+    # Mặc định giữ database (phim, checkpoint, page_cache): trang không đổi chỉ
+    # trả về 304, lượt crawl trước còn dở thì được chạy tiếp
+    
+    # --fresh: xóa toàn bộ database và crawl lại từ đầu
+    fresh = '--fresh' in sys.argv
+    
+    # --refresh: bắt đầu lượt mới kể cả khi lượt trước còn dở, xuất thêm file phim thay đổi
+    refresh = '--refresh' in sys.argv
+    
+    # --resume: chạy tiếp lượt crawl bị dừng (bỏ qua trang đã xong)
+    resume = '--resume' in sys.argv
+    
+    # --save-html: lưu HTML trang chi tiết vào data/raw/html (fixture cho parser_benchmark.py)
+    if '--save-html' in sys.argv:
+        crawler.html_dir = str(Config.RAW_HTML_PATH)
+    
+    if fresh:
+        # Xóa DB cũ (kèm file WAL) để crawl lại
+        for path in (crawler.db_path, f"{crawler.db_path}-wal", f"{crawler.db_path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
         print(f"Đã xóa database cũ: {crawler.db_path}")
         
-    crawler.init_database() # Tạo lại database
+        crawler.init_database() # Tạo lại database
+    elif not refresh and not resume and CrawlCheckpoint(crawler.db_path).unfinished():
+        resume = True
+        print("Lượt crawl trước chưa xong, chạy tiếp (--refresh: bắt đầu lượt mới, --fresh: xóa database)")
+    
+    # Mốc thời gian (UTC, cùng định dạng crawled_at) để xuất riêng phần thay đổi
+    started_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
     
     # Crawl dữ liệu
     print("Bắt đầu crawl dữ liệu từ Motchilli.io...")
     # Giảm max_pages xuống 1 hoặc 2 để test nhanh
-    movies = crawler.crawl_motchill_categories(max_pages=2) 
+    movies = crawler.crawl_motchill_categories(max_pages=2, resume=resume) 
     
-    print(f"Đã crawl được {len(movies)} phim")
+    print(f"Đã crawl được {len(movies)} phim mới/thay đổi")
     
     # Xuất dữ liệu
     output_path = Config.RAW_DATA_PATH / 'movies.json'
+    crawler.close()
     crawler.export_to_json(str(output_path))
     
     print(f"Dữ liệu đã được lưu tại: {output_path}")
+    
+    if refresh:
+        # Phim mới/thay đổi trong lượt này (NDJSON nén) cho hệ thống phía sau đồng bộ
+        delta_path = Config.RAW_DATA_PATH / f"movies-delta-{started_at.replace(' ', '-').replace(':', '')}.ndjson.gz"
+        delta_count = crawler.export_to_json(str(delta_path), since=started_at)
+        print(f"Đã xuất {delta_count} phim thay đổi tại: {delta_path}")
+    
+    # Cập nhật index tìm kiếm (chỉ tách từ lại các phim mới/thay đổi)
+    index_builder = MovieIndexBuilder()
+    added, removed = index_builder.update_index_from_database()
+    index_builder.wait_for_merge()
+    print(f"Đã cập nhật index: +{added} / -{removed} phim")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
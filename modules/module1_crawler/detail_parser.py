@@ -0,0 +1,137 @@
+"""
+Module 1: Web Crawling
+Bóc tách trang chi tiết phim bằng lxml trong một lượt
+
+Cách cũ (BeautifulSoup + html.parser) dựng cây bằng Python rồi quét lại toàn
+bộ tài liệu một lần cho mỗi nhãn <dt> (khoảng 9 lần mỗi trang). Ở đây cây được
+dựng bởi lxml (C), các <dt> được duyệt đúng một lần thành bảng nhãn -> <dd>,
+các selector còn lại là XPath biên dịch sẵn. Kết quả giống hệt cách cũ.
+"""
+
+import re
+from typing import Dict, Optional
+from urllib.parse import urljoin
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+def _class_xpath(tag: str, class_name: str, extra: str = '') -> str:
+    """XPath tìm tag có class_name trong danh sách class (giống class_= của BeautifulSoup)"""
+    condition = f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+    if extra:
+        condition += f' and {extra}'
+    return f'{tag}[{condition}]'
+
+if LXML_AVAILABLE:
+    _PARSER = lxml_html.HTMLParser(encoding='utf-8')
+    _TITLE = etree.XPath('//' + _class_xpath('span', 'title'))
+    _H1 = etree.XPath('//h1')
+    _REAL_NAME = etree.XPath('//' + _class_xpath('span', 'real-name'))
+    _DETAIL = etree.XPath('//' + _class_xpath('div', 'detail'))
+    _TAB = etree.XPath('.//' + _class_xpath('div', 'tab'))
+    _POSTER = etree.XPath('//' + _class_xpath('div', 'poster'))
+    _RATING = etree.XPath('//' + _class_xpath('span', 'average', "@id='average'"))
+    _IFRAMES = etree.XPath('//iframe[@src]')
+
+_YEAR_IN_TITLE = re.compile(r'\((\d{4})\)')
+_TRAILER_TEXT = re.compile(r'Trailer', re.I)
+_TRAILER_SRC = re.compile(r'youtube|youtu.be')
+
+def _text(element) -> str:
+    return element.text_content().strip() if element is not None else ""
+
+def _first(elements):
+    return elements[0] if elements else None
+
+def _info_map(root) -> Dict[str, object]:
+    """Một lượt qua các <dt>: {nhãn chữ thường: <dd> đầu tiên đứng sau}
+    
+    Nhãn lặp lại thì giữ lần xuất hiện đầu tiên (như soup.find).
+    """
+    info = {}
+    for dt in root.iter('dt'):
+        label = dt.text_content().strip().lower()
+        if label not in info:
+            info[label] = next(dt.itersiblings('dd'), None)
+    return info
+
+def _info(info: Dict[str, object], label: str, extract_links: bool = False) -> str:
+    dd = info.get(label.lower())
+    if dd is None:
+        return ""
+    if extract_links:
+        links = list(dd.iterdescendants('a'))
+        if links:
+            return ', '.join(_text(link) for link in links)
+    return _text(dd)
+
+def parse_detail_html(content: bytes, base_url: str) -> Dict:
+    """Bóc tách các field phim từ HTML trang chi tiết (chưa gồm url, source_website)
+    
+    Raises:
+        IndexError khi trang thiếu div.detail hoặc div.poster (cách cũ cũng lỗi)
+    """
+    root = lxml_html.document_fromstring(content, parser=_PARSER)
+    info = _info_map(root)
+    
+    # Tiêu đề
+    title = _text(_first(_TITLE(root))) or _text(_first(_H1(root)))
+    
+    # Tiêu đề gốc (bỏ năm "(2025)")
+    original_title_text = _text(_first(_REAL_NAME(root)))
+    original_title = _YEAR_IN_TITLE.sub('', original_title_text).strip()
+    
+    # Mô tả phim
+    description = _text(_first(_TAB(_DETAIL(root)[0])))
+    
+    # Năm: từ bảng thông tin, dự phòng từ tiêu đề gốc
+    year_text = _info(info, 'Năm sản xuất:')
+    year: Optional[int] = int(year_text) if year_text.isdigit() else None
+    if year is None:
+        year_match = _YEAR_IN_TITLE.search(original_title_text)
+        if year_match:
+            year = int(year_match.group(1))
+    
+    # Rating
+    rating = None
+    rating_match = re.search(r'(\d+\.?\d*)', _text(_first(_RATING(root))))
+    if rating_match:
+        rating = float(rating_match.group(1))
+    
+    # Poster
+    poster_elem = next(_POSTER(root)[0].iter('img'), None)
+    poster_url = poster_elem.get('src') if poster_elem is not None else None
+    if poster_url and not poster_url.startswith('http'):
+        poster_url = urljoin(base_url, poster_url)
+    
+    # Trailer: link có chữ "Trailer", nếu không có thì iframe YouTube
+    trailer_url = ""
+    trailer_link = next((link for link in root.iter('a') if _TRAILER_TEXT.search(link.text_content())), None)
+    if trailer_link is not None:
+        trailer_url = trailer_link.get('href', '')
+    else:
+        iframe = next((frame for frame in _IFRAMES(root) if _TRAILER_SRC.search(frame.get('src'))), None)
+        if iframe is not None:
+            trailer_url = iframe.get('src', '')
+    
+    return {
+        'title': title,
+        'original_title': original_title,
+        'description': description,
+        'year': year,
+        'genre': _info(info, 'Thể loại:', extract_links=True),
+        'country': _info(info, 'Quốc gia:', extract_links=True),
+        'director': _info(info, 'Đạo diễn:', extract_links=True),
+        'cast': _info(info, 'Diễn viên:', extract_links=True),
+        'duration': _info(info, 'Thời lượng:'),
+        'quality': _info(info, 'Ngôn ngữ:'),
+        'rating': rating,
+        'poster_url': poster_url,
+        'trailer_url': trailer_url,
+        'episodes': _info(info, 'Số tập:'),
+        'status': _info(info, 'Trạng thái:')
+    }
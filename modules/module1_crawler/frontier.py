@@ -0,0 +1,94 @@
+"""
+Module 1: Web Crawling
+Frontier URL trang chi tiết phim, loại trùng giữa các danh mục
+
+Một phim xuất hiện ở nhiều danh sách (/the-loai/..., /quoc-gia/...,
+/danh-sach/...). Crawler gom link từ mọi trang danh sách vào frontier trước,
+frontier chỉ giữ mỗi URL (đã chuẩn hóa) một lần, nên mỗi trang chi tiết chỉ
+được tải một lần trong một lượt crawl. Tùy chọn lưu tập URL đã crawl vào
+bảng crawled_urls của database để bỏ qua chúng ở các lượt sau.
+"""
+
+import sqlite3
+from typing import Iterable, List, Set
+from urllib.parse import urldefrag, urlparse, urlunparse
+
+def normalize_url(url: str) -> str:
+    """Khóa so trùng URL: bỏ fragment, host chữ thường, bỏ '/' cuối path"""
+    url, _ = urldefrag(url.strip())
+    parts = urlparse(url)
+    path = parts.path.rstrip('/') or '/'
+    return urlunparse((parts.scheme.lower(), parts.netloc.lower(), path, parts.params, parts.query, ''))
+
+class URLFrontier:
+    """Hàng đợi URL theo thứ tự phát hiện, mỗi URL một lần"""
+    
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path: database chứa bảng crawled_urls; None = chỉ loại trùng trong lượt crawl này
+        """
+        self.db_path = db_path
+        self.seen: Set[str] = set()  # URL đã vào frontier hoặc đã crawl ở lượt trước
+        self.queue: List[str] = []  # URL chờ tải
+        self.discovered = 0  # Số link đã gặp (kể cả trùng)
+        self.skipped_previous = 0  # Số link bỏ qua vì đã crawl ở lượt trước
+        
+        self._previous: Set[str] = set()
+        if db_path:
+            self._previous = self._load_crawled()
+            self.seen.update(self._previous)
+    
+    def _load_crawled(self) -> Set[str]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawled_urls (
+                    url TEXT PRIMARY KEY,
+                    crawled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            return {url for (url,) in conn.execute('SELECT url FROM crawled_urls')}
+        finally:
+            conn.close()
+    
+    def __len__(self) -> int:
+        return len(self.queue)
+    
+    def add(self, url: str) -> bool:
+        """Thêm URL; False nếu đã có (trong lượt này hoặc đã crawl trước đó)"""
+        self.discovered += 1
+        key = normalize_url(url)
+        if key in self.seen:
+            if key in self._previous:
+                self.skipped_previous += 1
+            return False
+        self.seen.add(key)
+        self.queue.append(key)
+        return True
+    
+    def extend(self, urls: Iterable[str]) -> int:
+        """Thêm nhiều URL, trả về số URL mới"""
+        return sum(self.add(url) for url in urls)
+    
+    def pop_all(self) -> List[str]:
+        """Lấy toàn bộ URL đang chờ (theo thứ tự phát hiện)"""
+        urls, self.queue = self.queue, []
+        return urls
+    
+    def mark_crawled(self, urls: Iterable[str]):
+        """Ghi các URL đã crawl thành công vào tập đã crawl (nếu frontier lưu bền)"""
+        if not self.db_path:
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO crawled_urls (url) VALUES (?)',
+                                 ((normalize_url(url),) for url in urls))
+        finally:
+            conn.close()
+    
+    @property
+    def duplicates(self) -> int:
+        """Số link trùng đã bị bỏ (không tính link đã crawl ở lượt trước)"""
+        return self.discovered - len(self.seen - self._previous) - self.skipped_previous
@@ -0,0 +1,136 @@
+"""
+Module 1: Web Crawling
+Micro-benchmark bóc tách trang chi tiết: BeautifulSoup (html.parser) và lxml một lượt
+
+Chạy trên các trang đã lưu trong data/raw/html (crawl với --save-html để lưu).
+Khi thư mục trống, trang mẫu được dựng từ data/raw/movies.json theo bố cục
+trang chi tiết Motchilli mà crawler bóc tách (kèm menu, danh sách phim liên
+quan, script) để kích thước gần với trang thật.
+
+    python modules/module1_crawler/parser_benchmark.py [thư_mục_html] [số_lần_lặp]
+"""
+
+import html
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from config.settings import Config
+from modules.module1_crawler.crawler import MotchillCrawler
+from modules.module1_crawler.detail_parser import LXML_AVAILABLE, parse_detail_html
+
+def load_fixtures(html_dir: Path) -> List[Tuple[str, bytes]]:
+    """(tên file, nội dung) của các trang .html đã lưu"""
+    if not html_dir.is_dir():
+        return []
+    return [(path.name, path.read_bytes()) for path in sorted(html_dir.glob('*.html'))]
+
+def render_fixture(movie: Dict, related: List[Dict]) -> bytes:
+    """Dựng trang chi tiết mẫu từ một bản ghi movies.json"""
+    def esc(value) -> str:
+        return html.escape(str(value or ''))
+    
+    def links(value) -> str:
+        return ', '.join(f'<a href="#">{esc(part.strip())}</a>' for part in str(value or '').split(',') if part.strip())
+    
+    menu = ''.join(f'<li><a href="/the-loai/tl-{i}">Thể loại {i}</a></li>' for i in range(30))
+    items = ''.join(
+        f'<li class="item"><a href="{esc(other["url"])}"><img src="{esc(other["poster_url"])}"></a>'
+        f'<h3 class="name-title"><a href="{esc(other["url"])}">{esc(other["title"])}</a></h3>'
+        f'<span class="label">{esc(other["quality"])}</span></li>'
+        for other in related
+    )
+    info = (
+        f'<dt>Năm sản xuất:</dt><dd>{esc(movie["year"])}</dd>'
+        f'<dt>Thể loại:</dt><dd>{links(movie["genre"])}</dd>'
+        f'<dt>Quốc gia:</dt><dd>{links(movie["country"])}</dd>'
+        f'<dt>Đạo diễn:</dt><dd>{links(movie["director"])}</dd>'
+        f'<dt>Diễn viên:</dt><dd>{links(movie["cast"])}</dd>'
+        f'<dt>Thời lượng:</dt><dd>{esc(movie["duration"])}</dd>'
+        f'<dt>Ngôn ngữ:</dt><dd>{esc(movie["quality"])}</dd>'
+        f'<dt>Số tập:</dt><dd>{esc(movie["episodes"])}</dd>'
+        f'<dt>Trạng thái:</dt><dd>{esc(movie["status"])}</dd>'
+    )
+    page = f'''<!DOCTYPE html>
+<html lang="vi"><head><meta charset="utf-8"><title>{esc(movie["title"])}</title>
+<script>window.dataLayer = window.dataLayer || []; {"var x = 1;" * 200}</script></head>
+<body><header><nav><ul class="menu">{menu}</ul></nav></header>
+<div class="container"><div class="detail">
+<div class="poster"><img src="{esc(movie["poster_url"])}"></div>
+<h1><span class="title">{esc(movie["title"])}</span></h1>
+<span class="real-name">{esc(movie["original_title"])} ({esc(movie["year"])})</span>
+<div class="rating"><span class="average" id="average">{esc(movie["rating"])}</span></div>
+<dl class="movie-info">{info}</dl>
+<div class="tab">{esc(movie["description"])}</div>
+</div><div class="related"><ul class="list-film">{items}</ul></div></div>
+<footer>{"<p>Motchill - xem phim online</p>" * 20}</footer></body></html>'''
+    return page.encode('utf-8')
+
+def sample_fixtures(limit: int = 50) -> List[Tuple[str, bytes]]:
+    """Trang mẫu dựng từ data/raw/movies.json"""
+    with open(Config.RAW_DATA_PATH / 'movies.json', encoding='utf-8') as f:
+        movies = json.load(f)
+    
+    fixtures = []
+    for index, movie in enumerate(movies[:limit]):
+        related = [movies[(index + offset) % len(movies)] for offset in range(1, 25)]
+        fixtures.append((f'{movie["url"].rstrip("/").rsplit("/", 1)[-1]}.html', render_fixture(movie, related)))
+    return fixtures
+
+def time_parser(parse: Callable, pages: List[Tuple[str, bytes]], repeat: int) -> float:
+    """Thời gian trung bình (ms) mỗi trang, lấy lần lặp nhanh nhất"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, content in pages:
+            parse(content)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 / len(pages)
+
+def main():
+    """Hàm main"""
+    logging.basicConfig(level=logging.WARNING)
+    html_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Config.RAW_HTML_PATH
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    
+    pages = load_fixtures(html_dir)
+    source = str(html_dir)
+    if not pages:
+        pages = sample_fixtures()
+        source = 'trang mẫu dựng từ data/raw/movies.json'
+    
+    if not LXML_AVAILABLE:
+        print("Chưa cài lxml: pip install lxml")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        crawler = MotchillCrawler(db_path=str(Path(tmp) / 'benchmark.db'))
+        crawler.logger.setLevel(logging.WARNING)
+        parsers = {
+            'BeautifulSoup (html.parser)': lambda content: crawler.parse_movie_detail_soup('', content),
+            'lxml một lượt': lambda content: dict(parse_detail_html(content, crawler.base_url),
+                                                  url='', source_website='motchilli.io')
+        }
+        
+        # Hai cách phải cho cùng kết quả trên mọi trang
+        mismatches = [name for name, content in pages
+                      if parsers['BeautifulSoup (html.parser)'](content) != parsers['lxml một lượt'](content)]
+        
+        total_kb = sum(len(content) for _, content in pages) / 1024
+        print(f"{len(pages)} trang ({total_kb / len(pages):.1f} KB/trang) - {source}")
+        print("-" * 60)
+        timings = {}
+        for name, parse in parsers.items():
+            timings[name] = time_parser(parse, pages, repeat)
+            print(f"{name:<30} | {timings[name]:8.2f} ms/trang")
+        print("-" * 60)
+        print(f"Tăng tốc: {timings['BeautifulSoup (html.parser)'] / timings['lxml một lượt']:.1f}x, "
+              f"{len(mismatches)} trang khác kết quả {mismatches[:5] if mismatches else ''}")
+
+if __name__ == "__main__":
+    main()
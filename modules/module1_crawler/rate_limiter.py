@@ -0,0 +1,71 @@
+"""
+Module 1: Web Crawling
+Giới hạn tốc độ request theo từng host (token bucket)
+
+Mỗi host có một bucket chứa tối đa `burst` token, được nạp lại `rate`
+token mỗi giây; mỗi request lấy một token. Khi bucket cạn, thread gọi
+đặt chỗ token kế tiếp rồi ngủ đúng khoảng thời gian cần chờ, nên nhiều
+worker cùng crawl một host vẫn không vượt quá `rate` request/giây.
+"""
+
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+class TokenBucket:
+    """Token bucket an toàn giữa các thread"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: số token nạp lại mỗi giây (> 0)
+            burst: số token tối đa (số request được gửi dồn ngay lập tức)
+        """
+        if rate <= 0:
+            raise ValueError(f"rate phải lớn hơn 0: {rate}")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self) -> float:
+        """Lấy một token, trả về số giây phải chờ trước khi được dùng nó
+        
+        Token có thể âm: mỗi lần đặt chỗ đẩy lượt kế tiếp lùi thêm 1/rate giây,
+        nên các thread chờ được phục vụ lần lượt thay vì tranh nhau.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+    
+    def acquire(self) -> float:
+        """Chờ tới khi có token; trả về số giây đã chờ"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class HostRateLimiter:
+    """Một TokenBucket cho mỗi host (netloc của URL)"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return bucket
+    
+    def acquire(self, url: str) -> float:
+        """Chờ tới lượt gửi request tới host của url; trả về số giây đã chờ"""
+        return self.bucket(urlparse(url).netloc.lower()).acquire()
@@ -0,0 +1,488 @@
+"""
+Module 2: Text Processing & Indexing
+Định dạng file index nhị phân (đọc qua mmap)
+
+Bố cục file:
+    [header][bảng section][section 0][section 1]...
+
+- Bảng document dạng cột (doc_id, độ dài, norm, năm, offset text) sắp xếp theo doc_id
+- Độ dài từng field của mỗi document (n_fields cột liền nhau mỗi row) cho BM25F
+- Từ điển term đã sắp xếp (so sánh theo byte UTF-8) để tra bằng binary search, kèm
+  cận trên điểm của từng term (dùng cắt tỉa top-k)
+- Posting list mã hóa delta + varint (cả row lẫn vị trí token trong document),
+  chia khối POSTING_BLOCK_SIZE document; bảng skip (row đầu và offset của mỗi
+  khối) cho phép tra một document chỉ giải mã khối chứa nó
+- Hai từ điển keyword: token nguyên dạng và token đã bỏ dấu (folded)
+
+Các cột số được ghi theo byte order của máy và đọc lại bằng memoryview.cast,
+nên mở file không cần giải mã gì ngoài header; nhiều process cùng mmap một
+file sẽ dùng chung page cache của hệ điều hành.
+
+Index nhiều segment có thêm file thống kê (cùng cách bố trí header + bảng
+section) chứa df, cận trên điểm của từng term và norm của từng document, tính
+trên các bản còn sống của mọi segment lúc ghi manifest. Norm xếp dày theo doc_id
+(phần tử thứ doc_id, chỗ trống là 0.0; doc_id là khóa tự tăng của database nên
+mảng không thưa) để tra thẳng không cần tìm kiếm.
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+MAGIC = b'MOVIEIDX'
+FORMAT_VERSION = 5
+BYTE_ORDER_MARK = 0x01020304
+POSTING_BLOCK_SIZE = 64  # Số document mỗi khối posting (một mục bảng skip)
+
+HEADER = struct.Struct('=8sIIIIII')  # magic, version, BOM, n_docs, n_terms, n_keywords, n_fields
+SECTION = struct.Struct('=QQ')  # offset, length
+
+# Thứ tự và kiểu (typecode của array/memoryview) của các section
+SECTIONS = [
+    ('doc_ids', 'q'),
+    ('doc_lengths', 'I'),
+    ('doc_norms', 'd'),
+    ('doc_years', 'i'),
+    ('doc_field_lengths', 'I'),
+    ('doc_text_offsets', 'Q'),
+    ('doc_text', 'B'),
+    ('term_offsets', 'Q'),
+    ('term_blob', 'B'),
+    ('term_df', 'I'),
+    ('term_idf', 'd'),
+    ('term_max_weight', 'd'),
+    ('term_postings_offsets', 'Q'),
+    ('term_postings', 'B'),
+    ('term_skip_offsets', 'Q'),
+    ('skip_rows', 'I'),
+    ('skip_offsets', 'Q'),
+    ('keyword_offsets', 'Q'),
+    ('keyword_blob', 'B'),
+    ('keyword_postings_offsets', 'Q'),
+    ('keyword_postings', 'B'),
+    ('folded_offsets', 'Q'),
+    ('folded_blob', 'B'),
+    ('folded_postings_offsets', 'Q'),
+    ('folded_postings', 'B'),
+]
+
+STATS_MAGIC = b'MOVIESTA'
+STATS_HEADER = struct.Struct('=8sIIII')  # magic, version, BOM, n_docs, n_terms
+
+# Section của file thống kê toàn collection
+STATS_SECTIONS = [
+    ('doc_norms', 'd'),
+    ('term_offsets', 'Q'),
+    ('term_blob', 'B'),
+    ('term_df', 'I'),
+    ('term_max_weight', 'd'),
+]
+
+# Section của từng từ điển keyword: (offsets, blob, postings_offsets, postings)
+KEYWORD_FIELDS = {
+    False: ('keyword_offsets', 'keyword_blob', 'keyword_postings_offsets', 'keyword_postings'),
+    True: ('folded_offsets', 'folded_blob', 'folded_postings_offsets', 'folded_postings'),
+}
+
+def encode_varint(value: int, out: bytearray):
+    """Ghi một số nguyên không âm dạng varint (7 bit mỗi byte)"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varints(data) -> List[int]:
+    """Giải mã toàn bộ dãy varint trong một vùng byte"""
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    return values
+
+def _string_table(strings: List[bytes]) -> Tuple[array, bytes]:
+    """Ghép các chuỗi thành blob + mảng offset (n + 1 phần tử)"""
+    offsets = array('Q', [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return offsets, b''.join(strings)
+
+def _keyword_table(keywords: Dict[str, Set[int]], rows: Dict[int, int]) -> Tuple[array, bytes, array, bytes]:
+    """Mã hóa từ điển keyword: token sắp xếp theo byte UTF-8, posting là delta(row)"""
+    encoded_keywords = sorted((token.encode('utf-8'), token) for token in keywords)
+    offsets, blob = _string_table([encoded for encoded, _ in encoded_keywords])
+    postings_offsets = array('Q', [0])
+    postings = bytearray()
+    
+    for _, token in encoded_keywords:
+        previous_row = 0
+        for row in sorted(rows[doc_id] for doc_id in keywords[token]):
+            encode_varint(row - previous_row, postings)
+            previous_row = row
+        postings_offsets.append(len(postings))
+    
+    return offsets, blob, postings_offsets, bytes(postings)
+
+def write_index_file(file_path: str, docs: List[Tuple[int, int, float, Optional[int], str, str, List[int]]],
+                     terms: Dict[str, Tuple[float, float, Dict[int, List[int]]]],
+                     keywords: Dict[str, Set[int]], folded_keywords: Dict[str, Set[int]] = None):
+    """Ghi index ra file nhị phân
+    
+    Args:
+        docs: List (doc_id, doc_length, doc_norm, year, title, text, [độ dài từng field])
+        terms: {term: (idf, trọng số chuẩn hóa lớn nhất, {doc_id: [positions]})}
+        keywords: {token: {doc_id}}
+        folded_keywords: {token đã bỏ dấu: {doc_id}}
+    
+    File được ghi ra file tạm rồi đổi tên (atomic), nên các process đang mmap
+    file cũ vẫn đọc được cho tới khi mở lại.
+    """
+    docs = sorted(docs, key=lambda doc: doc[0])
+    rows = {doc[0]: row for row, doc in enumerate(docs)}
+    field_count = len(docs[0][6]) if docs else 0
+    
+    doc_text_offsets, doc_text = _string_table(
+        [f"{title}\x00{text}".encode('utf-8') for _, _, _, _, title, text, _ in docs]
+    )
+    
+    # Từ điển term sắp xếp theo byte UTF-8 (khớp với cách so sánh khi tra cứu)
+    encoded_terms = sorted((term.encode('utf-8'), term) for term in terms)
+    term_offsets, term_blob = _string_table([encoded for encoded, _ in encoded_terms])
+    term_df = array('I')
+    term_idf = array('d')
+    term_max_weight = array('d')
+    term_postings_offsets = array('Q', [0])
+    term_postings = bytearray()
+    term_skip_offsets = array('Q', [0])
+    skip_rows = array('I')
+    skip_offsets = array('Q')
+    
+    for _, term in encoded_terms:
+        idf, max_weight, postings = terms[term]
+        term_df.append(len(postings))
+        term_idf.append(idf)
+        term_max_weight.append(max_weight)
+        
+        # Mỗi document: delta(row), tf, tf delta(position)
+        previous_row = 0
+        for count, (row, positions) in enumerate(sorted((rows[doc_id], positions)
+                                                        for doc_id, positions in postings.items())):
+            if count % POSTING_BLOCK_SIZE == 0:
+                skip_rows.append(row)
+                skip_offsets.append(len(term_postings))
+            encode_varint(row - previous_row, term_postings)
+            encode_varint(len(positions), term_postings)
+            previous_position = 0
+            for position in positions:
+                encode_varint(position - previous_position, term_postings)
+                previous_position = position
+            previous_row = row
+        term_postings_offsets.append(len(term_postings))
+        term_skip_offsets.append(len(skip_rows))
+    
+    keyword_sections = _keyword_table(keywords, rows)
+    folded_sections = _keyword_table(folded_keywords or {}, rows)
+    
+    sections = {
+        'doc_ids': array('q', [doc[0] for doc in docs]),
+        'doc_lengths': array('I', [doc[1] for doc in docs]),
+        'doc_norms': array('d', [doc[2] for doc in docs]),
+        'doc_years': array('i', [doc[3] or 0 for doc in docs]),
+        'doc_field_lengths': array('I', [length for doc in docs for length in doc[6]]),
+        'doc_text_offsets': doc_text_offsets,
+        'doc_text': doc_text,
+        'term_offsets': term_offsets,
+        'term_blob': term_blob,
+        'term_df': term_df,
+        'term_idf': term_idf,
+        'term_max_weight': term_max_weight,
+        'term_postings_offsets': term_postings_offsets,
+        'term_postings': bytes(term_postings),
+        'term_skip_offsets': term_skip_offsets,
+        'skip_rows': skip_rows,
+        'skip_offsets': skip_offsets,
+    }
+    for folded, sections_data in ((False, keyword_sections), (True, folded_sections)):
+        sections.update(zip(KEYWORD_FIELDS[folded], sections_data))
+    
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER_MARK,
+                         len(docs), len(encoded_terms), len(keywords), field_count)
+    _write_sections(file_path, header, SECTIONS, sections)
+
+def write_stats_file(file_path: str, doc_norms: Dict[int, float], terms: Dict[str, Tuple[int, float]]):
+    """Ghi file thống kê toàn collection
+    
+    Args:
+        doc_norms: {doc_id: norm} của mọi document còn sống
+        terms: {term: (df, trọng số chuẩn hóa lớn nhất)} của các term có df > 0
+    """
+    norms = array('d', [0.0]) * (max(doc_norms, default=-1) + 1)
+    for doc_id, norm in doc_norms.items():
+        norms[doc_id] = norm
+    encoded_terms = sorted((term.encode('utf-8'), term) for term in terms)
+    term_offsets, term_blob = _string_table([encoded for encoded, _ in encoded_terms])
+    
+    sections = {
+        'doc_norms': norms,
+        'term_offsets': term_offsets,
+        'term_blob': term_blob,
+        'term_df': array('I', [terms[term][0] for _, term in encoded_terms]),
+        'term_max_weight': array('d', [terms[term][1] for _, term in encoded_terms]),
+    }
+    header = STATS_HEADER.pack(STATS_MAGIC, FORMAT_VERSION, BYTE_ORDER_MARK, len(doc_norms), len(encoded_terms))
+    _write_sections(file_path, header, STATS_SECTIONS, sections)
+
+def _write_sections(file_path: str, header: bytes, specs: List[Tuple[str, str]], sections: Dict):
+    """Ghi header, bảng section rồi các section theo thứ tự specs (qua file tạm rồi đổi tên)"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        
+        # Chừa chỗ cho bảng section, ghi lại sau khi biết offset
+        table_offset = f.tell()
+        f.write(b'\x00' * SECTION.size * len(specs))
+        
+        table = []
+        for name, _ in specs:
+            data = sections[name]
+            data = data.tobytes() if isinstance(data, array) else data
+            
+            # Căn lề 8 byte cho các cột số
+            f.write(b'\x00' * (-f.tell() % 8))
+            table.append((f.tell(), len(data)))
+            f.write(data)
+        
+        f.seek(table_offset)
+        for offset, length in table:
+            f.write(SECTION.pack(offset, length))
+    
+    os.replace(tmp_path, file_path)
+
+class MappedFile:
+    """File nhị phân [header][bảng section][section]... mở qua mmap (chỉ đọc, không copy dữ liệu)"""
+    
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._views = []
+        with open(file_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def _check_header(self, magic: bytes, version: int, bom: int, expected_magic: bytes, kind: str):
+        if magic != expected_magic:
+            raise ValueError(f"{self.file_path} không phải file {kind}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.file_path} có phiên bản định dạng {version}, cần {FORMAT_VERSION}")
+        if bom != BYTE_ORDER_MARK:
+            raise ValueError(f"{self.file_path} được ghi với byte order khác ({sys.byteorder})")
+    
+    def _map_sections(self, specs: List[Tuple[str, str]], table_offset: int):
+        """Gắn mỗi section thành thuộc tính (memoryview đã cast theo typecode)"""
+        view = memoryview(self._mmap)
+        self._views.append(view)
+        self._section_offsets = {}
+        for position, (name, typecode) in enumerate(specs):
+            offset, length = SECTION.unpack_from(self._mmap, table_offset + position * SECTION.size)
+            self._section_offsets[name] = offset
+            section = view[offset:offset + length]
+            if typecode != 'B':
+                section = section.cast(typecode)
+            self._views.append(section)
+            setattr(self, name, section)
+    
+    def close(self):
+        """Giải phóng các memoryview và đóng mmap"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+    
+    @staticmethod
+    def _find(offsets, blob, count: int, key: bytes) -> int:
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if bytes(blob[offsets[mid]:offsets[mid + 1]]) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < count and bytes(blob[offsets[low]:offsets[low + 1]]) == key:
+            return low
+        return -1
+    
+    def find_term(self, term: str) -> int:
+        """Tra vị trí term trong từ điển term, -1 nếu không có"""
+        return self._find(self.term_offsets, self.term_blob, self.term_count, term.encode('utf-8'))
+    
+    def term_at(self, position: int) -> str:
+        return bytes(self.term_blob[self.term_offsets[position]:self.term_offsets[position + 1]]).decode('utf-8')
+
+class StatsFileReader(MappedFile):
+    """Đọc file thống kê toàn collection qua mmap"""
+    
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        try:
+            magic, version, bom, self.doc_count, self.term_count = STATS_HEADER.unpack_from(self._mmap, 0)
+            self._check_header(magic, version, bom, STATS_MAGIC, 'thống kê index')
+            self._map_sections(STATS_SECTIONS, STATS_HEADER.size)
+        except Exception:
+            self.close()
+            raise
+    
+    def doc_norm(self, doc_id: int) -> float:
+        """Norm của document còn sống, 0.0 nếu không có"""
+        return self.doc_norms[doc_id] if 0 <= doc_id < len(self.doc_norms) else 0.0
+
+class IndexFileReader(MappedFile):
+    """Đọc file index nhị phân qua mmap (chỉ đọc, không copy dữ liệu)"""
+    
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        try:
+            magic, version, bom, self.doc_count, self.term_count, self.keyword_count, self.field_count = \
+                HEADER.unpack_from(self._mmap, 0)
+            self._check_header(magic, version, bom, MAGIC, 'index')
+            self._map_sections(SECTIONS, HEADER.size)
+        except Exception:
+            self.close()
+            raise
+    
+    # --- Bảng document ---
+    
+    def row_of(self, doc_id: int) -> int:
+        """Tìm vị trí (row) của doc_id, -1 nếu không có"""
+        row = bisect.bisect_left(self.doc_ids, doc_id)
+        if row < self.doc_count and self.doc_ids[row] == doc_id:
+            return row
+        return -1
+    
+    def doc_text_at(self, row: int) -> Tuple[str, str]:
+        """Lấy (title, text) của document tại row"""
+        data = bytes(self.doc_text[self.doc_text_offsets[row]:self.doc_text_offsets[row + 1]])
+        title, _, text = data.decode('utf-8').partition('\x00')
+        return title, text
+    
+    def field_lengths_at(self, row: int) -> List[int]:
+        """Độ dài (số token) từng field của document tại row"""
+        start = row * self.field_count
+        return self.doc_field_lengths[start:start + self.field_count].tolist()
+    
+    # --- Từ điển term ---
+    
+    def postings_at(self, position: int) -> Iterator[Tuple[int, array]]:
+        """Duyệt posting list của term: (row, array('I') positions)"""
+        values = decode_varints(
+            self.term_postings[self.term_postings_offsets[position]:self.term_postings_offsets[position + 1]]
+        )
+        i = 0
+        row = 0
+        while i < len(values):
+            row += values[i]
+            tf = values[i + 1]
+            # Cộng dồn delta bằng accumulate (chạy trong C) thay vì vòng lặp Python
+            yield row, array('I', accumulate(values[i + 2:i + 2 + tf]))
+            i += 2 + tf
+    
+    def frequencies_at(self, position: int) -> Iterator[Tuple[int, int]]:
+        """Duyệt posting list của term chỉ lấy tần suất: (row, tf), không dựng mảng vị trí"""
+        values = decode_varints(
+            self.term_postings[self.term_postings_offsets[position]:self.term_postings_offsets[position + 1]]
+        )
+        i = 0
+        row = 0
+        while i < len(values):
+            row += values[i]
+            tf = values[i + 1]
+            yield row, tf
+            i += 2 + tf
+    
+    def find_block(self, position: int, row: int) -> int:
+        """Khối posting của term có thể chứa row (tra bảng skip), -1 nếu row đứng trước khối đầu"""
+        first = self.term_skip_offsets[position]
+        block = bisect.bisect_right(self.skip_rows, row, first, self.term_skip_offsets[position + 1]) - 1
+        return block if block >= first else -1
+    
+    def block_frequencies(self, position: int, block: int) -> Dict[int, int]:
+        """Giải mã một khối posting của term (tối đa POSTING_BLOCK_SIZE document): {row: tf}"""
+        end = (self.skip_offsets[block + 1] if block + 1 < self.term_skip_offsets[position + 1]
+               else self.term_postings_offsets[position + 1])
+        values = decode_varints(self.term_postings[self.skip_offsets[block]:end])
+        
+        # Delta đầu khối tính từ row cuối của khối trước, bảng skip lưu sẵn row đầu khối
+        frequencies = {}
+        row = self.skip_rows[block] - values[0]
+        i = 0
+        while i < len(values):
+            row += values[i]
+            frequencies[row] = values[i + 1]
+            i += 2 + values[i + 1]
+        return frequencies
+    
+    # --- Từ điển keyword (folded=True: từ điển token đã bỏ dấu) ---
+    
+    def keyword_total(self, folded: bool = False) -> int:
+        """Số token trong từ điển keyword"""
+        return len(getattr(self, KEYWORD_FIELDS[folded][0])) - 1
+    
+    def find_keyword(self, token: str, folded: bool = False) -> int:
+        """Tra vị trí token trong từ điển keyword, -1 nếu không có"""
+        offsets_name, blob_name, _, _ = KEYWORD_FIELDS[folded]
+        return self._find(getattr(self, offsets_name), getattr(self, blob_name),
+                          self.keyword_total(folded), token.encode('utf-8'))
+    
+    def keyword_at(self, position: int, folded: bool = False) -> str:
+        offsets_name, blob_name, _, _ = KEYWORD_FIELDS[folded]
+        offsets = getattr(self, offsets_name)
+        return bytes(getattr(self, blob_name)[offsets[position]:offsets[position + 1]]).decode('utf-8')
+    
+    def keyword_rows(self, position: int, folded: bool = False) -> List[int]:
+        """Lấy danh sách row chứa keyword tại vị trí position"""
+        _, _, postings_offsets_name, postings_name = KEYWORD_FIELDS[folded]
+        postings_offsets = getattr(self, postings_offsets_name)
+        rows = []
+        row = 0
+        for delta in decode_varints(
+            getattr(self, postings_name)[postings_offsets[position]:postings_offsets[position + 1]]
+        ):
+            row += delta
+            rows.append(row)
+        return rows
+    
+    def keywords_containing(self, substring: str, folded: bool = False) -> List[int]:
+        """Tìm vị trí các keyword chứa substring
+        
+        Tìm trực tiếp trên blob bằng mmap.find (so khớp byte UTF-8 tương
+        đương so khớp ký tự), không cần giải mã từng token.
+        """
+        offsets_name, blob_name, _, _ = KEYWORD_FIELDS[folded]
+        offsets = getattr(self, offsets_name)
+        key = substring.encode('utf-8')
+        if not key:
+            return list(range(self.keyword_total(folded)))
+        
+        start = self._section_offsets[blob_name]
+        end = start + len(getattr(self, blob_name))
+        positions = []
+        hit = self._mmap.find(key, start, end)
+        while hit != -1:
+            relative = hit - start
+            position = bisect.bisect_right(offsets, relative) - 1
+            token_end = offsets[position + 1]
+            if relative + len(key) <= token_end:
+                positions.append(position)
+                # Token đã khớp, nhảy sang token tiếp theo
+                hit = self._mmap.find(key, start + token_end, end)
+            else:
+                hit = self._mmap.find(key, hit + 1, end)
+        return positions
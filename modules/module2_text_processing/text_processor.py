@@ -5,18 +5,24 @@ Xử lý văn bản tiếng Việt và xây dựng chỉ mục ngược (Inverte
 
 import sqlite3
 import json
-import pickle
-from typing import Dict, List, Set, Tuple
-from collections import defaultdict, Counter
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+from collections import defaultdict, Counter, OrderedDict
 import re
 import math
+import heapq
 import logging
+import os
+import threading
+import unicodedata
+from array import array
 from pathlib import Path
 import sys
 
 # Thêm path để import config
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from config.settings import Config
+from modules.module2_text_processing.index_format import (write_index_file, write_stats_file, IndexFileReader,
+                                                          StatsFileReader)
 
 try:
     from underthesea import word_tokenize
@@ -25,6 +31,32 @@ except ImportError:
     UNDERTHESEA_AVAILABLE = False
     print("Warning: underthesea not installed. Using simple tokenization.")
 
+try:
+    import numpy as np
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+def _build_fold_table() -> Dict[int, Optional[str]]:
+    """Bảng str.translate bỏ dấu: chữ Latin có dấu -> chữ gốc, đ/Đ -> d/D, xóa dấu tổ hợp"""
+    table = {ord('đ'): 'd', ord('Đ'): 'D'}
+    for start, end in ((0x00C0, 0x0250), (0x1E00, 0x1F00)):
+        for code in range(start, end):
+            base = ''.join(
+                char for char in unicodedata.normalize('NFD', chr(code))
+                if not unicodedata.combining(char)
+            )
+            if len(base) == 1 and base != chr(code):
+                table[code] = base
+    
+    # Văn bản dạng NFD (chữ + dấu tổ hợp rời)
+    for code in range(0x0300, 0x0370):
+        table[code] = None
+    return table
+
+DIACRITIC_FOLD_TABLE = _build_fold_table()
+
 class VietnameseTextProcessor:
     """Xử lý văn bản tiếng Việt"""
     
@@ -87,6 +119,18 @@ class VietnameseTextProcessor:
         
         return text.strip()
     
+    @staticmethod
+    def fold_diacritics(text: str) -> str:
+        """Bỏ dấu tiếng Việt (kể cả đ -> d) bằng bảng dịch tính sẵn
+        
+        Ví dụ: "hàn quốc" -> "han quoc"
+        """
+        return text.translate(DIACRITIC_FOLD_TABLE) if text else ""
+    
+    @classmethod
+    def has_diacritics(cls, text: str) -> bool:
+        return cls.fold_diacritics(text) != text
+    
     def tokenize(self, text: str) -> List[str]:
         """Tách từ tiếng Việt"""
         if not text:
@@ -124,7 +168,364 @@ class VietnameseTextProcessor:
         
         return tokens
 
-class InvertedIndex:
+class SearchableIndex:
+    """Các thao tác truy vấn dùng chung cho InvertedIndex (trong RAM) và MappedIndex (mmap)"""
+    
+    # Các field được index, theo thứ tự vị trí token trong document
+    FIELDS = ('title', 'original_title', 'description', 'genre', 'cast', 'director', 'country')
+    
+    # Khoảng trống vị trí giữa hai field liên tiếp (cụm từ không khớp vắt qua hai field)
+    FIELD_GAP = 8
+    
+    # Sai số tương đối khi so cận trên với ngưỡng top-k (bù sai số làm tròn số thực)
+    PRUNING_EPSILON = 1e-9
+    
+    # Posting list trên file được tra từng khối tới size / PROBE_DECODE_RATIO
+    # lần, sau đó giải mã cả list một lần (xem _posting_lookups)
+    PROBE_DECODE_RATIO = 8
+    
+    def match_keywords(self, terms: List[str], folded: bool = None) -> Set[int]:
+        """Tìm các document chứa đủ tất cả term (Logic AND)
+        
+        Query gõ không dấu (ví dụ "han quoc") được tra trên từ điển token đã
+        bỏ dấu nên khớp cả "hàn quốc", "hán quốc"...; query có dấu ở bất kỳ
+        term nào thì mọi term phải khớp đúng dấu. folded khác None thì dùng
+        đúng từ điển đó (khi tra từng term của một query nhiều term).
+        
+        Returns:
+            Set doc_id thỏa mãn
+        """
+        if not terms:
+            return set()
+        
+        if folded is None:
+            folded = not any(VietnameseTextProcessor.has_diacritics(term) for term in terms)
+        
+        # Giao từ posting list ngắn nhất để tập ứng viên nhỏ nhanh nhất
+        postings = sorted((self._keyword_postings(term, folded) for term in set(terms)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        
+        return candidates
+    
+    def _keyword_postings(self, term: str, folded: bool = False) -> frozenset:
+        """Lấy tập doc_id có chứa term (khớp substring trong token), qua cache LRU
+        
+        Khóa cache đến từ query người dùng nên cache chỉ giữ tối đa
+        Config.KEYWORD_CACHE_SIZE term gần nhất.
+        
+        folded=True: tra trên từ điển token đã bỏ dấu
+        """
+        key = (term, folded)
+        with self._term_lock:
+            postings = self._term_cache.get(key)
+            if postings is not None:
+                self._term_cache.move_to_end(key)
+                return postings
+        
+        postings = self._find_keyword_postings(term, folded)
+        with self._term_lock:
+            self._term_cache[key] = postings
+            while len(self._term_cache) > Config.KEYWORD_CACHE_SIZE:
+                self._term_cache.popitem(last=False)
+        return postings
+    
+    def _ensure_weights(self):
+        """Đảm bảo trọng số TF-IDF đã cập nhật trước khi truy vấn (index chỉ đọc: không cần)"""
+        pass
+    
+    @classmethod
+    def field_frequencies(cls, positions: List[int], field_lengths: List[int]) -> List[int]:
+        """Tần suất term theo từng field, suy ra từ vị trí (đã sắp xếp) và độ dài field"""
+        counts = [0] * len(field_lengths)
+        field = 0
+        field_end = field_lengths[0] if field_lengths else 0
+        for position in positions:
+            while position >= field_end and field + 1 < len(field_lengths):
+                field += 1
+                field_end += cls.FIELD_GAP + field_lengths[field]
+            counts[field] += 1
+        return counts
+    
+    def bm25f_scores(self, query: str, doc_ids: Set[int] = None) -> Dict[int, float]:
+        """Chấm điểm BM25F cho các document chứa ít nhất một term của query
+        
+        Tần suất term của từng field được chuẩn hóa theo độ dài field so với
+        độ dài trung bình, nhân trọng số field (Config.FIELD_BOOSTS) rồi cộng
+        lại trước khi bão hòa theo k1:
+            tf~ = sum_f boost_f * tf_f / (1 - b + b * len_f / avg_len_f)
+            score = sum_t idf(t) * tf~ / (k1 + tf~)
+        
+        Args:
+            doc_ids: Chỉ chấm điểm các document này (mặc định: mọi document)
+        
+        Returns:
+            {doc_id: score}
+        """
+        self._ensure_weights()
+        query_terms = set(self.text_processor.process_text(query))
+        if not query_terms or not self.doc_count:
+            return {}
+        
+        k1, b = Config.BM25_K1, Config.BM25_B
+        boosts = [Config.FIELD_BOOSTS.get(field, 1.0) for field in self.FIELDS]
+        averages = self.field_length_averages()
+        doc_scores = defaultdict(float)
+        
+        for term in query_terms:
+            df = self.document_frequency(term)
+            if not df:
+                continue
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            
+            for doc_id, positions, field_lengths in self.term_postings(term):
+                if doc_ids is not None and doc_id not in doc_ids:
+                    continue
+                weighted_tf = 0.0
+                for field, tf in enumerate(self.field_frequencies(positions, field_lengths)):
+                    if tf:
+                        weighted_tf += boosts[field] * tf / (1 - b + b * field_lengths[field] / averages[field])
+                doc_scores[doc_id] += idf * weighted_tf / (k1 + weighted_tf)
+        
+        return doc_scores
+    
+    def search_bm25f(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Tìm kiếm xếp hạng theo BM25F
+        
+        Returns:
+            List of (doc_id, score) sorted by score descending
+        """
+        return heapq.nlargest(top_k, self.bm25f_scores(query).items(), key=lambda x: x[1])
+    
+    def _doc_positions(self, term: str, folded: bool, doc_ids: Set[int]) -> Dict[int, List[int]]:
+        """Vị trí của term trong các document doc_ids: {doc_id: [positions]}
+        
+        folded=True: gộp vị trí của mọi term có dạng bỏ dấu bằng term
+        """
+        variants = self.folded_terms(term) if folded else [term]
+        doc_positions = {}
+        for variant in variants:
+            for doc_id, positions in self.term_positions(variant):
+                if doc_id not in doc_ids:
+                    continue
+                if doc_id in doc_positions:
+                    doc_positions[doc_id] = sorted(set(doc_positions[doc_id]).union(positions))
+                else:
+                    doc_positions[doc_id] = positions
+        return doc_positions
+    
+    def _positional_candidates(self, tokens: List[str], doc_ids: Set[int],
+                               folded: bool) -> Tuple[Dict[str, Dict[int, List[int]]], Set[int]]:
+        """Vị trí của từng term và các document chứa đủ mọi term (giao từ term hiếm nhất)"""
+        positions = {term: self._doc_positions(term, folded, doc_ids) for term in set(tokens)}
+        candidates = set(doc_ids)
+        for term_positions in sorted(positions.values(), key=len):
+            if not candidates:
+                break
+            candidates &= term_positions.keys()
+        return positions, candidates
+    
+    def phrase_matches(self, tokens: List[str], doc_ids: Set[int], folded: bool = False) -> Set[int]:
+        """Các document trong doc_ids chứa tokens liền nhau theo đúng thứ tự
+        
+        Giao vị trí trên posting list: vị trí p của token đầu khớp nếu token
+        thứ i nằm ở p + i. Các field cách nhau FIELD_GAP vị trí nên cụm từ
+        không khớp vắt qua hai field.
+        
+        Args:
+            tokens: Các term đã qua process_text
+            folded: Khớp cả các term có dấu mà bỏ dấu thì bằng token
+        """
+        if not tokens:
+            return set()
+        
+        positions, candidates = self._positional_candidates(tokens, doc_ids, folded)
+        
+        matches = set()
+        for doc_id in candidates:
+            following = [(offset, set(positions[term][doc_id])) for offset, term in enumerate(tokens[1:], 1)]
+            if any(all(start + offset in term_positions for offset, term_positions in following)
+                   for start in positions[tokens[0]][doc_id]):
+                matches.add(doc_id)
+        return matches
+    
+    def proximity_spans(self, tokens: List[str], doc_ids: Set[int], folded: bool = False) -> Dict[int, int]:
+        """Độ dài cửa sổ vị trí ngắn nhất chứa mọi term của query trong từng document
+        
+        Returns:
+            {doc_id: số vị trí của cửa sổ} (bằng số term khác nhau khi các term liền nhau)
+        """
+        terms = list(dict.fromkeys(tokens))
+        if len(terms) < 2:
+            return {}
+        
+        positions, candidates = self._positional_candidates(terms, doc_ids, folded)
+        
+        spans = {}
+        for doc_id in candidates:
+            events = sorted((position, term_index) for term_index, term in enumerate(terms)
+                            for position in positions[term][doc_id])
+            
+            # Cửa sổ trượt ngắn nhất phủ đủ mọi term
+            counts = [0] * len(terms)
+            covered = 0
+            left = 0
+            best = None
+            for position, term_index in events:
+                if counts[term_index] == 0:
+                    covered += 1
+                counts[term_index] += 1
+                while covered == len(terms):
+                    left_position, left_term = events[left]
+                    span = position - left_position + 1
+                    if best is None or span < best:
+                        best = span
+                    counts[left_term] -= 1
+                    if counts[left_term] == 0:
+                        covered -= 1
+                    left += 1
+            spans[doc_id] = best
+        return spans
+    
+    def _cosine_top_k(self, query_terms: List[Tuple[float, float, Callable, Callable]], query_norm: float,
+                      norm_of: Callable, top_k: int, prune: bool) -> List[Tuple[int, float]]:
+        """Chọn top-k theo cosine similarity từ posting list của các term trong query
+        
+        Args:
+            query_terms: List (trọng số query, cận trên đóng góp của term vào
+                điểm đã chuẩn hóa, hàm duyệt (key, trọng số document) của
+                posting list, hàm lấy trọng số document theo key hoặc None)
+                theo thứ tự query
+            norm_of: Hàm lấy độ dài vector của document theo key
+            prune: Cắt tỉa MaxScore; kết quả giống hệt khi duyệt toàn bộ
+        
+        Điểm = sum(trọng số query * trọng số document) / (norm document * norm query).
+        Bằng điểm thì key nhỏ hơn đứng trước.
+        
+        Returns:
+            List of (key, score) sorted by score descending
+        """
+        if top_k <= 0:
+            return []
+        
+        # MaxScore: duyệt posting list theo cận trên giảm dần. Trước mỗi list,
+        # ngưỡng top-k là điểm lớn thứ k trong các điểm cộng dồn (điểm chỉ tăng
+        # thêm); document chưa gặp có điểm tối đa bằng tổng cận trên các list
+        # còn lại (remaining). Khi tổng này nhỏ hơn ngưỡng thì các list còn lại
+        # chỉ được tra cho các ứng viên còn có thể vào top-k thay vì duyệt hết.
+        order = list(range(len(query_terms)))
+        if prune:
+            order.sort(key=lambda i: -query_terms[i][1])
+        remaining = [0.0] * (len(order) + 1)
+        for rank in range(len(order) - 1, -1, -1):
+            remaining[rank] = remaining[rank + 1] + query_terms[order[rank]][1]
+        
+        accumulators = defaultdict(float)  # {key: tổng trọng số query * trọng số document}
+        collecting = True  # Còn nhận document mới
+        
+        for rank, term_index in enumerate(order):
+            query_weight, _, iter_weights, weight_of = query_terms[term_index]
+            
+            if prune and len(accumulators) >= top_k:
+                partial_scores = {key: total / (norm_of(key) * query_norm) for key, total in accumulators.items()}
+                cutoff = heapq.nlargest(top_k, partial_scores.values())[-1] * (1 - self.PRUNING_EPSILON)
+                if remaining[rank] < cutoff:
+                    collecting = False
+                if not collecting:
+                    for key, partial in partial_scores.items():
+                        if partial + remaining[rank] < cutoff:
+                            del accumulators[key]
+            
+            if collecting:
+                for key, weight in iter_weights():
+                    accumulators[key] += query_weight * weight
+            else:
+                for key in accumulators:
+                    weight = weight_of(key)
+                    if weight is not None:
+                        accumulators[key] += query_weight * weight
+        
+        key_scores = {key: total / (norm_of(key) * query_norm) for key, total in accumulators.items()}
+        
+        if order != sorted(order):
+            # Đã cộng khác thứ tự query: tính lại các ứng viên sát ngưỡng theo
+            # đúng thứ tự cộng của bản duyệt toàn bộ để điểm giống hệt
+            cutoff = -math.inf
+            if len(key_scores) > top_k:
+                cutoff = heapq.nlargest(top_k, key_scores.values())[-1] * (1 - self.PRUNING_EPSILON)
+            exact_scores = {}
+            for key, score in key_scores.items():
+                if score < cutoff:
+                    continue
+                total = 0.0
+                for query_weight, _, _, weight_of in query_terms:
+                    weight = weight_of(key)
+                    if weight is not None:
+                        total += query_weight * weight
+                exact_scores[key] = total / (norm_of(key) * query_norm)
+            key_scores = exact_scores
+        
+        return heapq.nlargest(top_k, key_scores.items(), key=lambda x: (x[1], -x[0]))
+    
+    def _posting_lookups(self, size: int, decode: Callable, probe: Callable) -> Tuple[Callable, Callable]:
+        """(hàm duyệt (key, trọng số), hàm lấy trọng số theo key) của một posting list dài size trên file
+        
+        Duyệt thì giải mã cả list một lần và giữ lại cho các lần tra sau. List
+        chưa giải mã thì tra bằng probe cho tới khi số lần tra đạt size /
+        PROBE_DECODE_RATIO: khi đó ứng viên dày tới mức gần như khối nào cũng
+        phải giải mã, nên giải mã cả list rồi tra dict rẻ hơn.
+        
+        Args:
+            decode: Hàm giải mã cả list thành {key: trọng số}
+            probe: Hàm lấy trọng số của một key chỉ giải mã khối chứa nó
+        """
+        probes = [0]
+        decoded = []  # [{key: trọng số}] sau khi đã giải mã cả list
+        
+        def weights() -> Dict[int, float]:
+            if not decoded:
+                decoded.append(decode())
+            return decoded[0]
+        
+        def weight_of(key: int) -> Optional[float]:
+            if not decoded:
+                probes[0] += 1
+                if probes[0] * self.PROBE_DECODE_RATIO < size:
+                    return probe(key)
+            return weights().get(key)
+        
+        return (lambda: weights().items()), weight_of
+    
+    def search_batch(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[int, float]]]:
+        """Tìm kiếm nhiều query cùng lúc
+        
+        Với backend NumPy/SciPy toàn bộ batch được tính bằng một phép nhân ma trận.
+        
+        Returns:
+            List kết quả (như search) theo đúng thứ tự queries
+        """
+        self._ensure_weights()
+        if self.matrix_backend is not None:
+            return self.matrix_backend.search_batch(queries, top_k)
+        return [self.search(query, top_k) for query in queries]
+    
+    def enable_matrix_backend(self) -> bool:
+        """Bật backend NumPy/SciPy (ma trận CSR) cho search/search_batch
+        
+        Returns:
+            True nếu bật được, False nếu thiếu numpy/scipy
+        """
+        if not SCIPY_AVAILABLE:
+            self.logger.warning("numpy/scipy chưa được cài (pip install numpy scipy), dùng backend Python")
+            return False
+        
+        self.matrix_backend = SparseMatrixScorer(self)
+        return True
+
+class InvertedIndex(SearchableIndex):
     """Chỉ mục ngược (Inverted Index) cho tìm kiếm"""
     
     def __init__(self):
@@ -134,162 +535,1016 @@ class InvertedIndex:
         # Cấu trúc dữ liệu chính
         self.index = defaultdict(dict)  # {term: {doc_id: [positions]}}
         self.doc_lengths = {}  # {doc_id: length}
+        self.doc_field_lengths = {}  # {doc_id: [độ dài từng field theo FIELDS]}
+        self.doc_terms = {}  # {doc_id: [terms]} để xóa/cập nhật document
         self.doc_count = 0
         self.vocabulary = set()
+        self._folded_vocabulary = None  # {term đã bỏ dấu: [term]}, tạo lại khi cần
         
         # TF-IDF data
-        self.tf_idf = defaultdict(dict)  # {doc_id: {term: tf_idf_score}}
+        self.tf_idf = defaultdict(dict)  # {term: {doc_id: tf_idf_score}} (theo term, như posting list)
         self.idf = {}  # {term: idf_score}
+        self.doc_norms = {}  # {doc_id: ||tf_idf vector||}
+        self.term_max_weight = {}  # {term: max tf_idf / doc_norm}, cận trên cho cắt tỉa top-k
+        self.avg_field_lengths = [0.0] * len(self.FIELDS)  # Độ dài trung bình từng field (BM25F)
+        self.matrix_backend = None  # SparseMatrixScorer khi bật backend NumPy/SciPy
+        self._weights_dirty = False  # True khi index thay đổi sau lần tính TF-IDF gần nhất
+        
+        # Keyword data cho SearchEngine (khớp từ khóa kiểu substring như bản cũ)
+        self.keyword_index = defaultdict(set)  # {token: {doc_id}}
+        self.folded_keyword_index = defaultdict(set)  # {token đã bỏ dấu: {doc_id}}
+        self.doc_store = {}  # {doc_id: {'title': ..., 'text': ..., 'year': ...}}
+        self._term_cache = OrderedDict()  # {(query_term, folded): frozenset(doc_id)}, LRU
+        self._term_lock = threading.Lock()
         
-    def add_document(self, doc_id: int, text_fields: Dict[str, str], weights: Dict[str, float] = None):
+    def add_document(self, doc_id: int, text_fields: Dict[str, str]):
         """Thêm document vào index
         
+        Nếu doc_id đã có thì document cũ được thay thế (cập nhật). IDF/TF-IDF
+        không tính lại ngay mà được tính lại một lần ở lần truy vấn tiếp theo.
+        
+        Mỗi token chỉ được lưu một lần; các field nối tiếp nhau theo FIELDS
+        (cách nhau FIELD_GAP vị trí) và độ dài từng field được lưu riêng, nên
+        tần suất theo field suy ra được từ vị trí. Trọng số field
+        (Config.FIELD_BOOSTS) chỉ áp dụng lúc chấm điểm BM25F.
+        
         Args:
             doc_id: ID của document
             text_fields: Dict chứa các field text {"title": "...", "description": "..."}
-            weights: Dict trọng số cho từng field {"title": 2.0, "description": 1.0}
         """
-        if weights is None:
-            weights = {"title": 2.0, "description": 1.0, "genre": 1.5, "cast": 1.2, "director": 1.3}
+        self._remove_terms(doc_id)
         
-        all_tokens = []
         term_positions = defaultdict(list)
+        field_lengths = []
         position = 0
         
         # Xử lý từng field
-        for field_name, field_text in text_fields.items():
-            if not field_text:
-                continue
-                
-            tokens = self.text_processor.process_text(field_text)
-            field_weight = weights.get(field_name, 1.0)
+        for field_name in self.FIELDS:
+            tokens = self.text_processor.process_text(text_fields.get(field_name) or '')
             
-            for token in tokens:
-                # Áp dụng trọng số bằng cách lặp lại token
-                for _ in range(int(field_weight)):
-                    all_tokens.append(token)
-                    term_positions[token].append(position)
-                    position += 1
+            for offset, token in enumerate(tokens):
+                term_positions[token].append(position + offset)
+            field_lengths.append(len(tokens))
+            position += len(tokens) + self.FIELD_GAP
         
-        # Cập nhật index
+        # Cập nhật index (vị trí lưu trong array('I'), gọn hơn list số nguyên Python)
         for term, positions in term_positions.items():
-            self.index[term][doc_id] = positions
+            self.index[term][doc_id] = array('I', positions)
             self.vocabulary.add(term)
+        self._folded_vocabulary = None
         
         # Lưu độ dài document
-        self.doc_lengths[doc_id] = len(all_tokens)
+        self.doc_lengths[doc_id] = sum(field_lengths)
+        self.doc_field_lengths[doc_id] = field_lengths
+        self.doc_terms[doc_id] = list(term_positions)
         self.doc_count += 1
+        self._weights_dirty = True
         
-        self.logger.debug(f"Đã index document {doc_id} với {len(all_tokens)} tokens")
+        self.logger.debug(f"Đã index document {doc_id} với {self.doc_lengths[doc_id]} tokens")
     
-    def calculate_tf_idf(self):
-        """Tính toán TF-IDF cho toàn bộ collection"""
-        self.logger.info("Bắt đầu tính toán TF-IDF...")
+    def add_keyword_document(self, doc_id: int, title: str, full_text: str, year: int = None):
+        """Thêm document vào keyword index
         
-        # Tính IDF cho mỗi term
-        for term in self.vocabulary:
-            df = len(self.index[term])  # Document frequency
-            self.idf[term] = math.log(self.doc_count / df) if df > 0 else 0
+        Args:
+            doc_id: ID của document
+            title: Tiêu đề đã chuyển chữ thường
+            full_text: Toàn bộ text tìm kiếm đã chuyển chữ thường
+            year: Năm phát hành (dùng để sắp xếp)
+        """
+        self._remove_keywords(doc_id)
         
-        # Tính TF-IDF cho mỗi document
-        for doc_id in self.doc_lengths:
-            doc_length = self.doc_lengths[doc_id]
-            
-            for term in self.vocabulary:
-                if doc_id in self.index[term]:
-                    tf = len(self.index[term][doc_id]) / doc_length  # Term frequency
-                    idf = self.idf[term]
-                    self.tf_idf[doc_id][term] = tf * idf
-                else:
-                    self.tf_idf[doc_id][term] = 0
+        self.doc_store[doc_id] = {'title': title, 'text': full_text, 'year': year}
         
-        self.logger.info(f"Đã tính toán TF-IDF cho {len(self.vocabulary)} terms và {self.doc_count} documents")
+        # Tách theo khoảng trắng: term không chứa khoảng trắng nên nếu là
+        # substring của full_text thì chắc chắn nằm trọn trong một token
+        for token in set(full_text.split()):
+            self.keyword_index[token].add(doc_id)
+        for token in set(self.text_processor.fold_diacritics(full_text).split()):
+            self.folded_keyword_index[token].add(doc_id)
+        
+        self._term_cache.clear()
     
-    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
-        """Tìm kiếm documents liên quan đến query
+    def remove_document(self, doc_id: int) -> bool:
+        """Xóa document khỏi index (postings, độ dài, df và keyword index)
         
         Returns:
-            List of (doc_id, score) sorted by score descending
+            True nếu document có trong index
+        """
+        found = doc_id in self.doc_lengths or doc_id in self.doc_store
+        self._remove_terms(doc_id)
+        self._remove_keywords(doc_id)
+        return found
+    
+    def copy_document(self, source: 'InvertedIndex', doc_id: int):
+        """Chép nguyên postings/keyword của một document từ index khác (không tách từ lại)"""
+        self._remove_terms(doc_id)
+        
+        terms = source.doc_terms.get(doc_id, [])
+        for term in terms:
+            self.index[term][doc_id] = source.index[term][doc_id]
+            self.vocabulary.add(term)
+        self._folded_vocabulary = None
+        self.doc_lengths[doc_id] = source.doc_lengths[doc_id]
+        self.doc_field_lengths[doc_id] = list(source.doc_field_lengths[doc_id])
+        self.doc_terms[doc_id] = list(terms)
+        self.doc_count += 1
+        self._weights_dirty = True
+        
+        doc = source.doc_store.get(doc_id)
+        if doc is not None:
+            self.add_keyword_document(doc_id, doc['title'], doc['text'], doc['year'])
+    
+    def _remove_terms(self, doc_id: int):
+        """Gỡ document khỏi posting list TF-IDF"""
+        if doc_id not in self.doc_lengths:
+            return
+        
+        for term in self.doc_terms.pop(doc_id, []):
+            self.tf_idf.get(term, {}).pop(doc_id, None)
+            postings = self.index.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.index[term]
+                self.vocabulary.discard(term)
+                self.idf.pop(term, None)
+                self.tf_idf.pop(term, None)
+                self.term_max_weight.pop(term, None)
+                self._folded_vocabulary = None
+        
+        del self.doc_lengths[doc_id]
+        self.doc_field_lengths.pop(doc_id, None)
+        self.doc_norms.pop(doc_id, None)
+        self.doc_count -= 1
+        self._weights_dirty = True
+    
+    def _remove_keywords(self, doc_id: int):
+        """Gỡ document khỏi keyword index"""
+        doc = self.doc_store.pop(doc_id, None)
+        if doc is None:
+            return
+        
+        folded_text = self.text_processor.fold_diacritics(doc['text'])
+        for keyword_index, text in ((self.keyword_index, doc['text']), (self.folded_keyword_index, folded_text)):
+            for token in set(text.split()):
+                doc_ids = keyword_index.get(token)
+                if doc_ids is None:
+                    continue
+                doc_ids.discard(doc_id)
+                if not doc_ids:
+                    del keyword_index[token]
+        
+        self._term_cache.clear()
+    
+    def _ensure_weights(self):
+        """Tính lại IDF/TF-IDF nếu index đã thay đổi (lazy, gộp nhiều lần cập nhật)"""
+        if self._weights_dirty:
+            self.calculate_tf_idf()
+    
+    def _find_keyword_postings(self, term: str, folded: bool) -> frozenset:
+        """Tập doc_id có token chứa term (chưa qua cache)"""
+        # Duyệt vocabulary (nhỏ hơn rất nhiều so với số phim x số field),
+        # kết quả được cache nên term hay gặp không phải duyệt lại
+        keyword_index = self.folded_keyword_index if folded else self.keyword_index
+        docs = set()
+        for token, doc_ids in keyword_index.items():
+            if term in token:
+                docs.update(doc_ids)
+        return frozenset(docs)
+    
+    def get_doc(self, doc_id: int) -> Optional[Dict]:
+        """Lấy dữ liệu keyword ({'title', 'text', 'year'}) của document"""
+        return self.doc_store.get(doc_id)
+    
+    def all_doc_ids(self) -> List[int]:
+        return sorted(self.doc_lengths)
+    
+    def doc_norm(self, doc_id: int) -> float:
+        return self.doc_norms.get(doc_id, 0.0)
+    
+    def document_frequency(self, term: str) -> int:
+        return len(self.index.get(term, ()))
+    
+    def term_postings(self, term: str) -> Iterator[Tuple[int, List[int], List[int]]]:
+        """Duyệt posting list của term: (doc_id, [positions], [độ dài từng field])"""
+        for doc_id, positions in self.index.get(term, {}).items():
+            yield doc_id, positions, self.doc_field_lengths[doc_id]
+    
+    def term_positions(self, term: str) -> Iterator[Tuple[int, array]]:
+        """Duyệt posting list của term: (doc_id, positions)"""
+        return iter(self.index.get(term, {}).items())
+    
+    def folded_terms(self, term: str) -> List[str]:
+        """Các term trong từ điển có dạng bỏ dấu bằng term (ví dụ "han" -> "hàn", "hán")"""
+        folded_vocabulary = self._folded_vocabulary
+        if folded_vocabulary is None:
+            folded_vocabulary = defaultdict(list)
+            for vocabulary_term in self.vocabulary:
+                folded_vocabulary[self.text_processor.fold_diacritics(vocabulary_term)].append(vocabulary_term)
+            self._folded_vocabulary = folded_vocabulary
+        return folded_vocabulary.get(term, [])
+    
+    def field_length_averages(self) -> List[float]:
+        return self.avg_field_lengths
+    
+    def _compute_field_averages(self):
+        totals = [0] * len(self.FIELDS)
+        for field_lengths in self.doc_field_lengths.values():
+            for field, length in enumerate(field_lengths):
+                totals[field] += length
+        count = len(self.doc_field_lengths)
+        self.avg_field_lengths = [total / count if count else 0.0 for total in totals]
+    
+    def iter_tf_idf(self) -> Iterator[Tuple[int, str, float]]:
+        """Duyệt các trọng số khác 0: (doc_id, term, tf_idf)"""
+        self._ensure_weights()
+        for term, weights in self.tf_idf.items():
+            for doc_id, weight in weights.items():
+                yield doc_id, term, weight
+    
+    def calculate_tf_idf(self, total_docs: int = None, external_df: Dict[str, int] = None):
+        """Tính toán TF-IDF cho toàn bộ collection
+        
+        Chỉ lưu các trọng số khác 0 (sparse) bằng cách duyệt posting list,
+        nên chi phí tỉ lệ với tổng số token thay vì số document x vocabulary.
+        
+        Args:
+            total_docs: Tổng số document của cả collection khi index này chỉ là
+                một segment (mặc định: doc_count)
+            external_df: Document frequency của các term ở những segment khác
         """
+        self.logger.info("Bắt đầu tính toán TF-IDF...")
+        
+        if total_docs is None:
+            total_docs = self.doc_count
+        if external_df is None:
+            external_df = {}
+        
+        self.tf_idf = defaultdict(dict)
+        self.idf = {}
+        squared_norms = defaultdict(float)
+        
+        for term, postings in self.index.items():
+            # Tính IDF cho mỗi term
+            df = len(postings) + external_df.get(term, 0)  # Document frequency
+            idf = max(math.log(total_docs / df), 0) if df > 0 else 0
+            self.idf[term] = idf
+            
+            if idf == 0:
+                continue
+            
+            # Tính TF-IDF cho các document chứa term
+            for doc_id, positions in postings.items():
+                tf = len(positions) / self.doc_lengths[doc_id]  # Term frequency
+                weight = tf * idf
+                self.tf_idf[term][doc_id] = weight
+                squared_norms[doc_id] += weight ** 2
+        
+        # Độ dài vector của từng document (dùng cho cosine similarity)
+        self.doc_norms = {doc_id: math.sqrt(squared_norms.get(doc_id, 0.0)) for doc_id in self.doc_lengths}
+        
+        # Cận trên đóng góp của từng term vào cosine (trước khi nhân trọng số query)
+        self.term_max_weight = {
+            term: max(weight / self.doc_norms[doc_id] for doc_id, weight in weights.items())
+            for term, weights in self.tf_idf.items()
+        }
+        
+        self._compute_field_averages()
+        self._weights_dirty = False
+        
+        # Ma trận CSR phải tạo lại theo trọng số mới
+        if Config.SCORING_BACKEND == 'numpy' or self.matrix_backend is not None:
+            self.enable_matrix_backend()
+        
+        self.logger.info(f"Đã tính toán TF-IDF cho {len(self.vocabulary)} terms và {self.doc_count} documents")
+    
+    def query_vector(self, query: str) -> Dict[str, float]:
+        """Tính vector TF-IDF của query (chỉ gồm các term có trong index)"""
+        self._ensure_weights()
         query_tokens = self.text_processor.process_text(query)
         
         if not query_tokens:
-            return []
+            return {}
         
-        # Tính vector query
         query_tf = Counter(query_tokens)
         query_length = len(query_tokens)
         query_vector = {}
         
         for term in query_tf:
-            if term in self.vocabulary:
+            idf = self.idf.get(term, 0)
+            if term in self.vocabulary and idf > 0:
                 tf = query_tf[term] / query_length
-                idf = self.idf.get(term, 0)
                 query_vector[term] = tf * idf
         
-        # Tính cosine similarity với mỗi document
-        doc_scores = {}
+        return query_vector
+    
+    def search(self, query: str, top_k: int = 10, prune: bool = None) -> List[Tuple[int, float]]:
+        """Tìm kiếm documents liên quan đến query
         
-        for doc_id in self.doc_lengths:
-            score = 0
-            doc_norm = 0
-            query_norm = 0
-            
-            for term in query_vector:
-                query_weight = query_vector[term]
-                doc_weight = self.tf_idf[doc_id].get(term, 0)
-                
-                score += query_weight * doc_weight
-                query_norm += query_weight ** 2
-                doc_norm += doc_weight ** 2
-            
-            # Normalize
-            if doc_norm > 0 and query_norm > 0:
-                score = score / (math.sqrt(doc_norm) * math.sqrt(query_norm))
-                doc_scores[doc_id] = score
+        Cộng dồn điểm chỉ trên posting list của các term trong query, chuẩn
+        hóa bằng độ dài vector đầy đủ của document (doc_norms) để ra đúng
+        cosine similarity. Với prune, các document không thể vào top-k được
+        bỏ qua nhờ cận trên term_max_weight (MaxScore), kết quả không đổi.
+        
+        Args:
+            prune: Bật cắt tỉa MaxScore (mặc định: Config.DYNAMIC_PRUNING)
+        
+        Returns:
+            List of (doc_id, score) sorted by score descending
+        """
+        self._ensure_weights()
+        if self.matrix_backend is not None:
+            return self.matrix_backend.search(query, top_k)
         
-        # Sắp xếp theo score
-        results = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
+        query_vector = self.query_vector(query)
+        
+        if not query_vector:
+            return []
         
-        return results[:top_k]
+        query_norm = math.sqrt(sum(weight ** 2 for weight in query_vector.values()))
+        
+        query_terms = []
+        for term, query_weight in query_vector.items():
+            upper_bound = query_weight / query_norm * self.term_max_weight.get(term, 0.0)
+            weights = self.tf_idf[term]
+            query_terms.append((query_weight, upper_bound, weights.items, weights.get))
+        
+        if prune is None:
+            prune = Config.DYNAMIC_PRUNING
+        return self._cosine_top_k(query_terms, query_norm, self.doc_norms.__getitem__, top_k, prune)
     
     def save_index(self, file_path: str):
-        """Lưu index ra file"""
+        """Lưu index ra file nhị phân (xem index_format)"""
         try:
-            data = {
-                'index': dict(self.index),
-                'doc_lengths': self.doc_lengths,
-                'doc_count': self.doc_count,
-                'vocabulary': list(self.vocabulary),
-                'tf_idf': dict(self.tf_idf),
-                'idf': self.idf
+            self._ensure_weights()
+            
+            docs = []
+            for doc_id in set(self.doc_lengths) | set(self.doc_store):
+                doc = self.doc_store.get(doc_id, {})
+                docs.append((
+                    doc_id,
+                    self.doc_lengths.get(doc_id, 0),
+                    self.doc_norms.get(doc_id, 0.0),
+                    doc.get('year'),
+                    doc.get('title', ''),
+                    doc.get('text', ''),
+                    self.doc_field_lengths.get(doc_id, [0] * len(self.FIELDS))
+                ))
+            
+            terms = {
+                term: (self.idf.get(term, 0.0), self.term_max_weight.get(term, 0.0), postings)
+                for term, postings in self.index.items()
             }
             
-            with open(file_path, 'wb') as f:
-                pickle.dump(data, f)
+            write_index_file(file_path, docs, terms, self.keyword_index, self.folded_keyword_index)
             
             self.logger.info(f"Đã lưu index tại {file_path}")
             
         except Exception as e:
             self.logger.error(f"Lỗi khi lưu index: {e}")
     
-    def load_index(self, file_path: str):
-        """Load index từ file"""
+    def load_index(self, file_path: str) -> bool:
+        """Load toàn bộ index từ file vào RAM (để cập nhật/ghi lại)
+        
+        Phía tìm kiếm nên dùng MappedIndex để không phải giải mã cả file.
+        
+        Returns:
+            True nếu load thành công, False nếu lỗi hoặc file có định dạng cũ
+        """
+        try:
+            reader = IndexFileReader(file_path)
+        except Exception as e:
+            self.logger.error(f"Lỗi khi load index: {e}")
+            return False
+        
         try:
-            with open(file_path, 'rb') as f:
-                data = pickle.load(f)
+            doc_ids = list(reader.doc_ids)
+            
+            self.doc_lengths = {}
+            self.doc_field_lengths = {}
+            self.doc_norms = {}
+            self.doc_store = {}
+            for row, doc_id in enumerate(doc_ids):
+                title, text = reader.doc_text_at(row)
+                self.doc_lengths[doc_id] = reader.doc_lengths[row]
+                self.doc_field_lengths[doc_id] = reader.field_lengths_at(row)
+                self.doc_norms[doc_id] = reader.doc_norms[row]
+                self.doc_store[doc_id] = {'title': title, 'text': text, 'year': reader.doc_years[row] or None}
+            self.doc_count = len(doc_ids)
             
-            self.index = defaultdict(dict, data['index'])
-            self.doc_lengths = data['doc_lengths']
-            self.doc_count = data['doc_count']
-            self.vocabulary = set(data['vocabulary'])
-            self.tf_idf = defaultdict(dict, data['tf_idf'])
-            self.idf = data['idf']
+            self.index = defaultdict(dict)
+            self.idf = {}
+            self.term_max_weight = {}
+            self.tf_idf = defaultdict(dict)
+            self.doc_terms = {doc_id: [] for doc_id in doc_ids}
+            for position in range(reader.term_count):
+                term = reader.term_at(position)
+                idf = reader.term_idf[position]
+                self.idf[term] = idf
+                self.term_max_weight[term] = reader.term_max_weight[position]
+                for row, positions in reader.postings_at(position):
+                    doc_id = doc_ids[row]
+                    self.index[term][doc_id] = positions
+                    self.doc_terms[doc_id].append(term)
+                    if idf != 0:
+                        self.tf_idf[term][doc_id] = len(positions) / self.doc_lengths[doc_id] * idf
+            self.vocabulary = set(self.index)
+            self._folded_vocabulary = None
+            self._compute_field_averages()
+            
+            self.keyword_index = defaultdict(set)
+            self.folded_keyword_index = defaultdict(set)
+            for folded, keyword_index in ((False, self.keyword_index), (True, self.folded_keyword_index)):
+                for position in range(reader.keyword_total(folded)):
+                    keyword_index[reader.keyword_at(position, folded)] = {
+                        doc_ids[row] for row in reader.keyword_rows(position, folded)
+                    }
+            self._term_cache.clear()
+            self._weights_dirty = False
+            
+            if Config.SCORING_BACKEND == 'numpy':
+                self.enable_matrix_backend()
             
             self.logger.info(f"Đã load index từ {file_path}")
+            return True
             
         except Exception as e:
             self.logger.error(f"Lỗi khi load index: {e}")
+            return False
+        finally:
+            reader.close()
+
+class MappedIndex(SearchableIndex):
+    """Index chỉ đọc, truy vấn trực tiếp trên file nhị phân qua mmap
+    
+    Mở file chỉ đọc header nên gần như tức thì với mọi kích thước; các worker
+    cùng mở một file sẽ dùng chung page cache thay vì mỗi worker một bản trong RAM.
+    """
+    
+    def __init__(self, file_path: str):
+        self.logger = logging.getLogger(__name__)
+        self.text_processor = VietnameseTextProcessor()
+        self.reader = IndexFileReader(file_path)
+        self.doc_count = self.reader.doc_count
+        self.matrix_backend = None
+        self._term_cache = OrderedDict()  # {(query_term, folded): frozenset(doc_id)}, LRU
+        self._term_lock = threading.Lock()
+        self._avg_field_lengths = None  # Tính lần đầu khi chấm điểm BM25F
+        self._folded_vocabulary = None  # {term đã bỏ dấu: [term]}, tạo lần đầu khi cần
+        
+        if Config.SCORING_BACKEND == 'numpy':
+            self.enable_matrix_backend()
+    
+    def close(self):
+        self.reader.close()
+    
+    def get_doc(self, doc_id: int) -> Optional[Dict]:
+        """Lấy dữ liệu keyword ({'title', 'text', 'year'}) của document"""
+        row = self.reader.row_of(doc_id)
+        if row < 0:
+            return None
+        title, text = self.reader.doc_text_at(row)
+        return {'title': title, 'text': text, 'year': self.reader.doc_years[row] or None}
+    
+    def all_doc_ids(self) -> List[int]:
+        return list(self.reader.doc_ids)
+    
+    def doc_norm(self, doc_id: int) -> float:
+        row = self.reader.row_of(doc_id)
+        return self.reader.doc_norms[row] if row >= 0 else 0.0
+    
+    def _find_keyword_postings(self, term: str, folded: bool) -> frozenset:
+        """Tập doc_id có token chứa term (chưa qua cache)"""
+        rows = set()
+        for position in self.reader.keywords_containing(term, folded):
+            rows.update(self.reader.keyword_rows(position, folded))
+        return frozenset(self.reader.doc_ids[row] for row in rows)
+    
+    def _query_terms(self, query: str) -> Dict[str, Tuple[int, float]]:
+        """Tính vector query: {term: (vị trí trong từ điển, trọng số)}"""
+        query_tokens = self.text_processor.process_text(query)
+        
+        if not query_tokens:
+            return {}
+        
+        query_tf = Counter(query_tokens)
+        query_length = len(query_tokens)
+        query_terms = {}
+        
+        for term in query_tf:
+            position = self.reader.find_term(term)
+            if position < 0:
+                continue
+            idf = self.reader.term_idf[position]
+            if idf > 0:
+                query_terms[term] = (position, query_tf[term] / query_length * idf)
+        
+        return query_terms
+    
+    def query_vector(self, query: str) -> Dict[str, float]:
+        """Tính vector TF-IDF của query (chỉ gồm các term có trong index)"""
+        return {term: weight for term, (_, weight) in self._query_terms(query).items()}
+    
+    def document_frequency(self, term: str) -> int:
+        position = self.reader.find_term(term)
+        return self.reader.term_df[position] if position >= 0 else 0
+    
+    def term_postings(self, term: str) -> Iterator[Tuple[int, List[int], List[int]]]:
+        """Duyệt posting list của term: (doc_id, [positions], [độ dài từng field])"""
+        reader = self.reader
+        position = reader.find_term(term)
+        if position < 0:
+            return
+        for row, positions in reader.postings_at(position):
+            yield reader.doc_ids[row], positions, reader.field_lengths_at(row)
+    
+    def term_positions(self, term: str) -> Iterator[Tuple[int, array]]:
+        """Duyệt posting list của term: (doc_id, positions)"""
+        reader = self.reader
+        position = reader.find_term(term)
+        if position < 0:
+            return
+        for row, positions in reader.postings_at(position):
+            yield reader.doc_ids[row], positions
+    
+    def folded_terms(self, term: str) -> List[str]:
+        """Các term trong từ điển có dạng bỏ dấu bằng term"""
+        if self._folded_vocabulary is None:
+            folded_vocabulary = defaultdict(list)
+            for position in range(self.reader.term_count):
+                vocabulary_term = self.reader.term_at(position)
+                folded_vocabulary[self.text_processor.fold_diacritics(vocabulary_term)].append(vocabulary_term)
+            self._folded_vocabulary = folded_vocabulary
+        return self._folded_vocabulary.get(term, [])
+    
+    def field_length_averages(self) -> List[float]:
+        if self._avg_field_lengths is None:
+            reader = self.reader
+            self._avg_field_lengths = [
+                sum(reader.doc_field_lengths[field::reader.field_count]) / reader.doc_count
+                if reader.doc_count else 0.0
+                for field in range(reader.field_count)
+            ]
+        return self._avg_field_lengths
+    
+    def _row_weights(self, position: int) -> Tuple[Callable, Callable]:
+        """(hàm duyệt (row, tf_idf), hàm lấy tf_idf theo row) của term
+        
+        Tra một row chỉ giải mã khối posting chứa nó (qua bảng skip), nên list
+        chỉ còn được tra cho các ứng viên sau cắt tỉa không phải giải mã toàn
+        bộ (trừ khi ứng viên dày, xem _posting_lookups).
+        """
+        reader = self.reader
+        idf = reader.term_idf[position]
+        blocks = {}  # {khối: {row: tf}} đã giải mã trong query này
+        
+        def decode() -> Dict[int, float]:
+            doc_lengths = reader.doc_lengths
+            return {row: tf / doc_lengths[row] * idf for row, tf in reader.frequencies_at(position)}
+        
+        def probe(row: int) -> Optional[float]:
+            block = reader.find_block(position, row)
+            if block < 0:
+                return None
+            frequencies = blocks.get(block)
+            if frequencies is None:
+                frequencies = blocks[block] = reader.block_frequencies(position, block)
+            tf = frequencies.get(row)
+            return tf / reader.doc_lengths[row] * idf if tf is not None else None
+        
+        return self._posting_lookups(reader.term_df[position], decode, probe)
+    
+    def search(self, query: str, top_k: int = 10, prune: bool = None) -> List[Tuple[int, float]]:
+        """Tìm kiếm documents liên quan đến query (cosine, duyệt posting list)
+        
+        Với prune, MaxScore dùng cận trên term_max_weight ghi sẵn trong file
+        để bỏ qua các document không thể vào top-k, kết quả không đổi.
+        
+        Args:
+            prune: Bật cắt tỉa MaxScore (mặc định: Config.DYNAMIC_PRUNING)
+        
+        Returns:
+            List of (doc_id, score) sorted by score descending
+        """
+        if self.matrix_backend is not None:
+            return self.matrix_backend.search(query, top_k)
+        
+        query_terms = self._query_terms(query)
+        
+        if not query_terms:
+            return []
+        
+        query_norm = math.sqrt(sum(weight ** 2 for _, weight in query_terms.values()))
+        
+        reader = self.reader
+        scored_terms = []
+        for position, query_weight in query_terms.values():
+            upper_bound = query_weight / query_norm * reader.term_max_weight[position]
+            scored_terms.append((query_weight, upper_bound) + self._row_weights(position))
+        
+        if prune is None:
+            prune = Config.DYNAMIC_PRUNING
+        top_rows = self._cosine_top_k(scored_terms, query_norm, reader.doc_norms.__getitem__, top_k, prune)
+        return [(reader.doc_ids[row], score) for row, score in top_rows]
+    
+    def iter_tf_idf(self) -> Iterator[Tuple[int, str, float]]:
+        """Duyệt các trọng số khác 0: (doc_id, term, tf_idf)"""
+        reader = self.reader
+        for position in range(reader.term_count):
+            idf = reader.term_idf[position]
+            if idf == 0:
+                continue
+            term = reader.term_at(position)
+            for row, positions in reader.postings_at(position):
+                yield reader.doc_ids[row], term, len(positions) / reader.doc_lengths[row] * idf
+    
+    def to_inverted_index(self) -> 'InvertedIndex':
+        """Giải mã toàn bộ file thành InvertedIndex (có thể cập nhật)"""
+        index = InvertedIndex()
+        index.load_index(self.reader.file_path)
+        return index
+
+class SegmentedIndex(SearchableIndex):
+    """Index gồm nhiều segment bất biến (kiểu LSM), đọc qua mmap
+    
+    Thư mục segment có file manifest (segments.json) liệt kê các segment còn
+    sống và tombstone {doc_id: generation}. Một bản của document trong segment
+    có generation g chỉ còn sống nếu g >= tombstone của doc_id đó, nên thêm,
+    cập nhật hay xóa chỉ cần ghi segment mới và tombstone, không sửa segment cũ.
+    
+    IDF/norm ghi trong mỗi segment chỉ đúng tại lúc ghi segment, nên không
+    dùng để chấm điểm: df, norm và cận trên điểm của từng term trên các bản
+    còn sống của mọi segment được phía ghi tính sẵn vào file thống kê mà
+    manifest trỏ tới (MovieIndexBuilder._write_stats), điểm giống hệt index
+    build lại từ đầu. Mở index chỉ mmap file, không giải mã posting list.
+    """
+    
+    MANIFEST_NAME = 'segments.json'
+    
+    def __init__(self, segments_path: Path):
+        self.logger = logging.getLogger(__name__)
+        self.text_processor = VietnameseTextProcessor()
+        self.segments_path = Path(segments_path)
+        self.matrix_backend = None
+        
+        manifest = self.read_manifest(self.segments_path)
+        if not manifest.get('stats'):
+            raise ValueError(f"{self.segments_path} chưa có file thống kê (index ghi bằng phiên bản cũ)")
+        self.generation = manifest['generation']
+        self.tombstones = {int(doc_id): gen for doc_id, gen in manifest['tombstones'].items()}
+        
+        # Segment mới nhất đứng trước
+        self.segments = []  # [(generation, name, MappedIndex)]
+        for info in sorted(manifest['segments'], key=lambda info: info['generation'], reverse=True):
+            segment = MappedIndex(str(self.segments_path / info['name']))
+            self.segments.append((info['generation'], info['name'], segment))
+        
+        self.stats = StatsFileReader(str(self.segments_path / manifest['stats']))
+        self.doc_count = self.stats.doc_count
+        self._avg_field_lengths = None  # Tính lần đầu khi chấm điểm BM25F
+        
+        # [{row đã bị tombstone}] theo thứ tự self.segments (chỉ duyệt cột doc_id)
+        self._dead_rows = [self.dead_rows(segment.reader, generation, self.tombstones)
+                           for generation, _, segment in self.segments]
+        
+        if Config.SCORING_BACKEND == 'numpy':
+            self.enable_matrix_backend()
+    
+    @classmethod
+    def read_manifest(cls, segments_path: Path) -> Dict:
+        """Đọc manifest, trả về manifest rỗng nếu chưa có"""
+        manifest_file = Path(segments_path) / cls.MANIFEST_NAME
+        if not manifest_file.exists():
+            return {'generation': 0, 'next_segment': 1, 'segments': [], 'tombstones': {}}
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    @classmethod
+    def write_manifest(cls, segments_path: Path, manifest: Dict):
+        """Ghi manifest (atomic: ghi file tạm rồi đổi tên)"""
+        manifest_file = Path(segments_path) / cls.MANIFEST_NAME
+        tmp_file = manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_file, manifest_file)
+    
+    @staticmethod
+    def dead_rows(reader: IndexFileReader, generation: int, tombstones: Dict[int, int]) -> Set[int]:
+        """Các row của segment có bản document đã bị tombstone"""
+        return {row for row, doc_id in enumerate(reader.doc_ids) if tombstones.get(doc_id, 0) > generation}
+    
+    def is_live(self, doc_id: int, generation: int) -> bool:
+        return self.tombstones.get(doc_id, 0) <= generation
+    
+    def live_doc_ids(self) -> Dict[int, Tuple[int, MappedIndex]]:
+        """{doc_id: (generation, segment)} của các bản document còn sống"""
+        live = {}
+        for generation, _, segment in self.segments:
+            for doc_id in segment.reader.doc_ids:
+                if self.is_live(doc_id, generation):
+                    live[doc_id] = (generation, segment)
+        return live
+    
+    def match_keywords(self, terms: List[str], folded: bool = None) -> Set[int]:
+        """Tìm các document chứa đủ tất cả term (Logic AND) trên mọi segment"""
+        candidates = set()
+        for generation, _, segment in self.segments:
+            candidates.update(
+                doc_id for doc_id in segment.match_keywords(terms, folded)
+                if self.is_live(doc_id, generation)
+            )
+        return candidates
+    
+    def get_doc(self, doc_id: int) -> Optional[Dict]:
+        """Lấy dữ liệu keyword của bản document còn sống"""
+        for generation, _, segment in self.segments:
+            if not self.is_live(doc_id, generation):
+                continue
+            doc = segment.get_doc(doc_id)
+            if doc is not None:
+                return doc
+        return None
+    
+    def _idf(self, term: str) -> float:
+        """IDF của term theo thống kê toàn collection"""
+        position = self.stats.find_term(term)
+        return self._idf_at(position) if position >= 0 else 0
+    
+    def _idf_at(self, position: int) -> float:
+        """IDF của term tại vị trí position trong file thống kê"""
+        df = self.stats.term_df[position]
+        return max(math.log(self.doc_count / df), 0) if df > 0 else 0
+    
+    def _iter_live_weights(self) -> Iterator[Tuple[int, str, float]]:
+        """Duyệt (doc_id, term, tf_idf) của các bản còn sống theo IDF toàn collection"""
+        for (_, _, segment), dead in zip(self.segments, self._dead_rows):
+            reader = segment.reader
+            for position in range(reader.term_count):
+                term = reader.term_at(position)
+                idf = self._idf(term)
+                if idf == 0:
+                    continue
+                for row, tf in reader.frequencies_at(position):
+                    if row not in dead:
+                        yield reader.doc_ids[row], term, tf / reader.doc_lengths[row] * idf
+    
+    def document_frequency(self, term: str) -> int:
+        """Số bản document còn sống chứa term (trên mọi segment)"""
+        position = self.stats.find_term(term)
+        return self.stats.term_df[position] if position >= 0 else 0
+    
+    def term_postings(self, term: str) -> Iterator[Tuple[int, List[int], List[int]]]:
+        """Duyệt posting list của term trên mọi segment, chỉ các bản còn sống"""
+        for generation, _, segment in self.segments:
+            for doc_id, positions, field_lengths in segment.term_postings(term):
+                if self.is_live(doc_id, generation):
+                    yield doc_id, positions, field_lengths
+    
+    def term_positions(self, term: str) -> Iterator[Tuple[int, array]]:
+        """Duyệt posting list của term trên mọi segment, chỉ các bản còn sống"""
+        for generation, _, segment in self.segments:
+            for doc_id, positions in segment.term_positions(term):
+                if self.is_live(doc_id, generation):
+                    yield doc_id, positions
+    
+    def folded_terms(self, term: str) -> List[str]:
+        """Các term (trên mọi segment) có dạng bỏ dấu bằng term"""
+        variants = {}
+        for _, _, segment in self.segments:
+            variants.update(dict.fromkeys(segment.folded_terms(term)))
+        return list(variants)
+    
+    def field_length_averages(self) -> List[float]:
+        """Độ dài trung bình từng field trên các bản document còn sống"""
+        if self._avg_field_lengths is None:
+            totals = [0] * len(self.FIELDS)
+            for generation, _, segment in self.segments:
+                reader = segment.reader
+                for row, doc_id in enumerate(reader.doc_ids):
+                    if self.is_live(doc_id, generation):
+                        for field, length in enumerate(reader.field_lengths_at(row)):
+                            totals[field] += length
+            self._avg_field_lengths = [total / self.doc_count if self.doc_count else 0.0 for total in totals]
+        return self._avg_field_lengths
+    
+    def _query_terms(self, query: str) -> Dict[str, Tuple[int, float]]:
+        """Tính vector query theo thống kê toàn bộ segment: {term: (vị trí trong file thống kê, trọng số)}"""
+        query_tokens = self.text_processor.process_text(query)
+        
+        if not query_tokens or not self.doc_count:
+            return {}
+        
+        query_tf = Counter(query_tokens)
+        query_length = len(query_tokens)
+        query_terms = {}
+        
+        for term in query_tf:
+            position = self.stats.find_term(term)
+            if position < 0:
+                continue
+            idf = self._idf_at(position)
+            if idf > 0:
+                query_terms[term] = (position, query_tf[term] / query_length * idf)
+        
+        return query_terms
+    
+    def query_vector(self, query: str) -> Dict[str, float]:
+        """Tính vector TF-IDF của query theo thống kê toàn bộ segment"""
+        return {term: weight for term, (_, weight) in self._query_terms(query).items()}
+    
+    def _live_row(self, doc_id: int) -> Tuple[int, int]:
+        """(thứ tự segment, row) của bản còn sống của document, (-1, -1) nếu không có"""
+        for index, ((_, _, segment), dead) in enumerate(zip(self.segments, self._dead_rows)):
+            row = segment.reader.row_of(doc_id)
+            if row >= 0 and row not in dead:
+                return index, row
+        return -1, -1
+    
+    def _doc_weights(self, term: str, idf: float, locations: Dict[int, Tuple[int, int]]) -> Tuple[Callable, Callable]:
+        """(hàm duyệt (doc_id, tf_idf), hàm lấy tf_idf theo doc_id) của term trên các bản còn sống
+        
+        Tra một document chỉ giải mã khối posting chứa bản còn sống của nó
+        (bảng skip), trừ khi ứng viên dày (xem _posting_lookups).
+        
+        Args:
+            idf: IDF của term theo thống kê toàn collection
+            locations: {doc_id: (thứ tự segment, row)} của bản còn sống đã tìm
+                trong query này (dùng chung giữa các term)
+        """
+        positions = [segment.reader.find_term(term) for _, _, segment in self.segments]
+        blocks = {}  # {(thứ tự segment, khối): {row: tf}} đã giải mã trong query này
+        
+        def decode() -> Dict[int, float]:
+            weights = {}
+            for (_, _, segment), dead, position in zip(self.segments, self._dead_rows, positions):
+                if position < 0:
+                    continue
+                reader = segment.reader
+                doc_ids, doc_lengths = reader.doc_ids, reader.doc_lengths
+                weights.update((doc_ids[row], tf / doc_lengths[row] * idf)
+                               for row, tf in reader.frequencies_at(position) if row not in dead)
+            return weights
+        
+        def probe(doc_id: int) -> Optional[float]:
+            location = locations.get(doc_id)
+            if location is None:
+                location = locations[doc_id] = self._live_row(doc_id)
+            index, row = location
+            if index < 0 or positions[index] < 0:
+                return None
+            reader = self.segments[index][2].reader
+            block = reader.find_block(positions[index], row)
+            if block < 0:
+                return None
+            frequencies = blocks.get((index, block))
+            if frequencies is None:
+                frequencies = blocks[(index, block)] = reader.block_frequencies(positions[index], block)
+            tf = frequencies.get(row)
+            return tf / reader.doc_lengths[row] * idf if tf is not None else None
+        
+        size = sum(segment.reader.term_df[position]
+                   for (_, _, segment), position in zip(self.segments, positions) if position >= 0)
+        return self._posting_lookups(size, decode, probe)
+    
+    def search(self, query: str, top_k: int = 10, prune: bool = None) -> List[Tuple[int, float]]:
+        """Tìm kiếm (cosine) một lượt trên posting list của mọi segment
+        
+        Mọi segment được chấm theo cùng vector query và cùng norm tính với
+        IDF toàn collection, bản đã bị tombstone bị bỏ ngay khi duyệt posting
+        list, nên top-k giống hệt index một segment build lại từ đầu.
+        
+        Với prune, cận trên của từng term và norm document lấy từ file thống
+        kê, list chỉ còn được tra cho các ứng viên thì tra theo khối (bảng
+        skip), không phải giải mã cả list.
+        
+        Args:
+            prune: Bật cắt tỉa MaxScore (mặc định: Config.DYNAMIC_PRUNING)
+        
+        Returns:
+            List of (doc_id, score) sorted by score descending
+        """
+        if self.matrix_backend is not None:
+            return self.matrix_backend.search(query, top_k)
+        
+        query_terms = self._query_terms(query)
+        
+        if not query_terms:
+            return []
+        
+        query_norm = math.sqrt(sum(weight ** 2 for _, weight in query_terms.values()))
+        
+        stats = self.stats
+        locations = {}  # {doc_id: (thứ tự segment, row)} của các document đã tra trong query
+        scored_terms = []
+        for term, (position, query_weight) in query_terms.items():
+            upper_bound = query_weight / query_norm * stats.term_max_weight[position]
+            scored_terms.append((query_weight, upper_bound) + self._doc_weights(term, self._idf_at(position), locations))
+        
+        if prune is None:
+            prune = Config.DYNAMIC_PRUNING
+        # Mọi document được chấm đều còn sống nên tra thẳng mảng norm theo doc_id
+        return self._cosine_top_k(scored_terms, query_norm, stats.doc_norms.__getitem__, top_k, prune)
+    
+    def all_doc_ids(self) -> List[int]:
+        return sorted(self.live_doc_ids())
+    
+    def doc_norm(self, doc_id: int) -> float:
+        return self.stats.doc_norm(doc_id)
+    
+    def iter_tf_idf(self) -> Iterator[Tuple[int, str, float]]:
+        """Duyệt các trọng số khác 0 của các bản document còn sống (IDF toàn collection)"""
+        return self._iter_live_weights()
+
+class SparseMatrixScorer:
+    """Backend NumPy/SciPy: ma trận doc-term dạng CSR với các hàng đã chuẩn hóa L2
+    
+    Một query = một phép nhân ma trận-vector, một batch query = một phép nhân
+    ma trận-ma trận; top-k lấy bằng argpartition.
+    """
+    
+    def __init__(self, inverted_index: SearchableIndex):
+        self.logger = logging.getLogger(__name__)
+        self.inverted_index = inverted_index
+        
+        self.term_ids = {}
+        self.doc_ids = np.array(inverted_index.all_doc_ids(), dtype=np.int64)
+        doc_rows = {doc_id: row for row, doc_id in enumerate(self.doc_ids.tolist())}
+        norms = [inverted_index.doc_norm(doc_id) for doc_id in self.doc_ids.tolist()]
+        
+        rows, cols, data = [], [], []
+        for doc_id, term, weight in inverted_index.iter_tf_idf():
+            row = doc_rows[doc_id]
+            if norms[row] == 0:
+                continue
+            rows.append(row)
+            cols.append(self.term_ids.setdefault(term, len(self.term_ids)))
+            data.append(weight / norms[row])
+        
+        self.matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), (rows, cols)),
+            shape=(len(self.doc_ids), len(self.term_ids))
+        )
+        
+        self.logger.info(f"Đã tạo ma trận CSR {self.matrix.shape} với {self.matrix.nnz} phần tử")
+    
+    def _query_matrix(self, queries: List[str]):
+        """Tạo ma trận query (mỗi hàng một query, đã chuẩn hóa L2)"""
+        rows, cols, data = [], [], []
+        for row, query in enumerate(queries):
+            query_vector = self.inverted_index.query_vector(query)
+            norm = math.sqrt(sum(weight ** 2 for weight in query_vector.values()))
+            for term, weight in query_vector.items():
+                if term not in self.term_ids:
+                    continue
+                rows.append(row)
+                cols.append(self.term_ids[term])
+                data.append(weight / norm)
+        
+        return sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), (rows, cols)),
+            shape=(len(queries), len(self.term_ids))
+        )
+    
+    def _top_k(self, doc_rows, scores, top_k: int) -> List[Tuple[int, float]]:
+        """Chọn top-k (doc_id, score) trong các điểm > 0"""
+        mask = scores > 0
+        doc_rows, scores = doc_rows[mask], scores[mask]
+        
+        if len(scores) > top_k:
+            selected = np.argpartition(-scores, top_k - 1)[:top_k]
+            doc_rows, scores = doc_rows[selected], scores[selected]
+        
+        order = np.argsort(-scores, kind='stable')
+        return [(int(doc_id), float(score))
+                for doc_id, score in zip(self.doc_ids[doc_rows[order]], scores[order])]
+    
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Tìm kiếm một query bằng một phép nhân ma trận-vector"""
+        query_matrix = self._query_matrix([query])
+        if query_matrix.nnz == 0 or top_k <= 0:
+            return []
+        
+        scores = self.matrix @ query_matrix.toarray().ravel()
+        return self._top_k(np.arange(len(scores)), scores, top_k)
+    
+    def search_batch(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[int, float]]]:
+        """Tìm kiếm cả batch query bằng một phép nhân ma trận"""
+        if not queries:
+            return []
+        
+        # (n_queries x n_terms) @ (n_terms x n_docs) -> ma trận điểm sparse
+        score_matrix = (self._query_matrix(queries) @ self.matrix.T).tocsr()
+        
+        results = []
+        for row in range(len(queries)):
+            start, end = score_matrix.indptr[row], score_matrix.indptr[row + 1]
+            if top_k <= 0 or start == end:
+                results.append([])
+                continue
+            results.append(self._top_k(score_matrix.indices[start:end], score_matrix.data[start:end], top_k))
+        
+        return results
 
 class MovieIndexBuilder:
     """Builder để xây dựng index cho dữ liệu phim"""
@@ -298,6 +1553,12 @@ class MovieIndexBuilder:
         self.logger = logging.getLogger(__name__)
         self.index = InvertedIndex()
         self.db_path = Config.DATABASE_PATH
+        self._loaded_mtime = None
+        self._lock = threading.RLock()
+        self._merge_thread = None
+    
+    # "cast" là từ khóa SQL nên phải đặt trong dấu nháy
+    MOVIE_COLUMNS = 'id, title, original_title, description, genre, "cast", director, country, year'
     
     def build_index_from_database(self):
         """Xây dựng index từ dữ liệu trong database"""
@@ -305,10 +1566,10 @@ class MovieIndexBuilder:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT id, title, original_title, description, genre, 
-                       cast, director, country 
+            cursor.execute(f'''
+                SELECT {self.MOVIE_COLUMNS}
                 FROM movies
+                ORDER BY id
             ''')
             
             movies = cursor.fetchall()
@@ -317,21 +1578,7 @@ class MovieIndexBuilder:
             self.logger.info(f"Bắt đầu xây dựng index cho {len(movies)} phim...")
             
             for movie in movies:
-                doc_id, title, original_title, description, genre, cast, director, country = movie
-                
-                # Chuẩn bị text fields
-                text_fields = {
-                    'title': title or '',
-                    'original_title': original_title or '',
-                    'description': description or '',
-                    'genre': genre or '',
-                    'cast': cast or '',
-                    'director': director or '',
-                    'country': country or ''
-                }
-                
-                # Thêm vào index
-                self.index.add_document(doc_id, text_fields)
+                self._add_movie(self.index, movie)
             
             # Tính TF-IDF
             self.index.calculate_tf_idf()
@@ -341,19 +1588,364 @@ class MovieIndexBuilder:
         except Exception as e:
             self.logger.error(f"Lỗi khi xây dựng index: {e}")
     
+    def _add_movie(self, index: InvertedIndex, movie: Tuple):
+        """Thêm (hoặc thay thế) một phim vào index từ một dòng MOVIE_COLUMNS"""
+        doc_id, title, original_title, description, genre, cast, director, country, year = movie
+        
+        # Chuẩn bị text fields
+        text_fields = {
+            'title': title or '',
+            'original_title': original_title or '',
+            'description': description or '',
+            'genre': genre or '',
+            'cast': cast or '',
+            'director': director or '',
+            'country': country or ''
+        }
+        
+        # Thêm vào index
+        index.add_document(doc_id, text_fields)
+        
+        # Keyword index: cùng các field và cách ghép như SearchEngine
+        title_lower = str(title or '').lower()
+        full_text = " ".join([
+            title_lower,
+            str(original_title or ''),
+            str(genre or ''),
+            str(cast or ''),
+            str(director or ''),
+            str(country or ''),
+            str(year or '')
+        ]).lower()
+        index.add_keyword_document(doc_id, title_lower, full_text, year)
+    
+    def update_index_from_database(self, movie_ids: List[int] = None) -> Tuple[int, int]:
+        """Cập nhật index theo database bằng một segment mới, không build lại toàn bộ
+        
+        Phim mới (kể cả phim được INSERT OR REPLACE, vốn nhận id mới) và movie_ids
+        (nếu có) được ghi vào một segment mới; bản cũ và phim không còn trong
+        database được đánh tombstone. Sau đó chạy merge segment ở background.
+        
+        Returns:
+            (số phim đã thêm/cập nhật, số phim đã xóa)
+        """
+        with self._lock:
+            manifest = SegmentedIndex.read_manifest(Config.INDEX_SEGMENTS_PATH)
+            if not manifest['segments']:
+                self.logger.info("Chưa có index, build toàn bộ từ database...")
+                self.index = InvertedIndex()
+                self.build_index_from_database()
+                self.save_index()
+                return self.index.doc_count, 0
+            
+            try:
+                current = SegmentedIndex(Config.INDEX_SEGMENTS_PATH)
+            except ValueError as e:
+                # Segment ghi bằng định dạng cũ: build lại toàn bộ
+                self.logger.info(f"Không thể mở index hiện có ({e}), build toàn bộ từ database...")
+                self.index = InvertedIndex()
+                self.build_index_from_database()
+                self.save_index()
+                return self.index.doc_count, 0
+            
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id FROM movies')
+            db_ids = {row[0] for row in cursor.fetchall()}
+            indexed_ids = set(current.live_doc_ids())
+            
+            removed_ids = indexed_ids - db_ids
+            changed_ids = sorted((db_ids - indexed_ids) | (set(movie_ids or []) & db_ids))
+            
+            if not changed_ids and not removed_ids:
+                conn.close()
+                return 0, 0
+            
+            segment = InvertedIndex()
+            
+            # SQLite giới hạn số tham số mỗi câu lệnh, đọc theo từng lô
+            batch_size = 500
+            for start in range(0, len(changed_ids), batch_size):
+                batch = changed_ids[start:start + batch_size]
+                placeholders = ','.join('?' * len(batch))
+                cursor.execute(f'SELECT {self.MOVIE_COLUMNS} FROM movies WHERE id IN ({placeholders})', batch)
+                for movie in cursor.fetchall():
+                    self._add_movie(segment, movie)
+            
+            conn.close()
+            
+            generation = manifest['generation'] + 1
+            total_docs = len(indexed_ids - removed_ids - set(changed_ids)) + segment.doc_count
+            other_segments = [entry[2] for entry in current.segments]
+            self._write_segment(manifest, segment, generation, other_segments, total_docs)
+            
+            # Bản cũ của phim được cập nhật và phim đã xóa
+            for doc_id in (set(changed_ids) & indexed_ids) | removed_ids:
+                manifest['tombstones'][str(doc_id)] = generation
+            manifest['generation'] = generation
+            self._write_stats(manifest, *self._collection_stats(manifest))
+            SegmentedIndex.write_manifest(Config.INDEX_SEGMENTS_PATH, manifest)
+            self._delete_unused_segments(manifest)
+        
+        self.logger.info(f"Cập nhật index: {len(changed_ids)} phim thêm/cập nhật, {len(removed_ids)} phim bị xóa")
+        self.merge_segments_async()
+        return len(changed_ids), len(removed_ids)
+    
+    def _write_segment(self, manifest: Dict, segment: InvertedIndex, generation: int,
+                       other_segments: List[MappedIndex] = (), total_docs: int = None):
+        """Tính TF-IDF theo thống kê toàn collection rồi ghi segment, thêm vào manifest"""
+        external_df = {}
+        if other_segments:
+            for term in segment.index:
+                external_df[term] = sum(other.document_frequency(term) for other in other_segments)
+        segment.calculate_tf_idf(total_docs=total_docs, external_df=external_df)
+        
+        name = f"segment_{manifest['next_segment']:06d}.bin"
+        manifest['next_segment'] += 1
+        segment.save_index(str(Config.INDEX_SEGMENTS_PATH / name))
+        manifest['segments'].append({'name': name, 'generation': generation, 'doc_count': segment.doc_count})
+    
+    def _collection_stats(self, manifest: Dict) -> Tuple[Dict[int, float], Dict[str, Tuple[int, float]]]:
+        """Tính norm và (df, cận trên điểm) trên các bản còn sống của mọi segment trong manifest
+        
+        IDF của mọi term đổi theo số document, nên norm không thể chỉ trừ đi
+        phần của các bản bị tombstone mà phải tính lại từ tf trong posting
+        list. Việc này làm một lần ở phía ghi khi tập document còn sống thay
+        đổi; merge không đổi tập đó nên giữ nguyên file thống kê.
+        
+        Returns:
+            ({doc_id: norm}, {term: (df, max tf_idf / norm)})
+        """
+        tombstones = {int(doc_id): generation for doc_id, generation in manifest['tombstones'].items()}
+        segments = []
+        try:
+            for info in manifest['segments']:
+                segment = MappedIndex(str(Config.INDEX_SEGMENTS_PATH / info['name']))
+                segments.append((segment, SegmentedIndex.dead_rows(segment.reader, info['generation'], tombstones)))
+            
+            # Một lượt giải mã: tf chuẩn hóa theo độ dài của các bản còn sống, theo term
+            doc_norms = {}
+            term_frequencies = {}  # {term: (array doc_id, array tf / độ dài document)}
+            for segment, dead in segments:
+                reader = segment.reader
+                doc_norms.update((doc_id, 0.0) for row, doc_id in enumerate(reader.doc_ids) if row not in dead)
+                for position in range(reader.term_count):
+                    doc_ids, frequencies = term_frequencies.setdefault(reader.term_at(position), (array('q'), array('d')))
+                    for row, tf in reader.frequencies_at(position):
+                        if row not in dead:
+                            doc_ids.append(reader.doc_ids[row])
+                            frequencies.append(tf / reader.doc_lengths[row])
+        finally:
+            for segment, _ in segments:
+                segment.close()
+        
+        doc_count = len(doc_norms)
+        term_weights = {}
+        for term, (doc_ids, frequencies) in term_frequencies.items():
+            df = len(doc_ids)
+            idf = max(math.log(doc_count / df), 0) if df > 0 else 0
+            if idf == 0:
+                continue
+            weights = array('d', [frequency * idf for frequency in frequencies])
+            for doc_id, weight in zip(doc_ids, weights):
+                doc_norms[doc_id] += weight ** 2
+            term_weights[term] = weights
+        
+        doc_norms = {doc_id: math.sqrt(squared_norm) for doc_id, squared_norm in doc_norms.items()}
+        terms = {}
+        for term, (doc_ids, _) in term_frequencies.items():
+            if not doc_ids:
+                continue
+            weights = term_weights.get(term, ())
+            terms[term] = (len(doc_ids), max((weight / doc_norms[doc_id] for doc_id, weight in zip(doc_ids, weights)),
+                                             default=0.0))
+        return doc_norms, terms
+    
+    def _write_stats(self, manifest: Dict, doc_norms: Dict[int, float], terms: Dict[str, Tuple[int, float]]):
+        """Ghi file thống kê toàn collection cho manifest (tên theo generation)"""
+        name = f"stats_{manifest['generation']:06d}.bin"
+        write_stats_file(str(Config.INDEX_SEGMENTS_PATH / name), doc_norms, terms)
+        manifest['stats'] = name
+    
+    def _select_merge(self, segments: List[Dict]) -> List[Dict]:
+        """Chính sách merge theo tầng (tiered)
+        
+        Segment được xếp tầng theo log(doc_count, SEGMENT_MERGE_FACTOR); tầng nào
+        đủ SEGMENT_MERGE_FACTOR segment thì gộp lại. Nếu số segment vượt
+        MAX_SEGMENTS thì gộp các segment nhỏ nhất để giới hạn số segment phải truy vấn.
+        """
+        factor = Config.SEGMENT_MERGE_FACTOR
+        tiers = defaultdict(list)
+        for info in segments:
+            tiers[int(math.log(max(info['doc_count'], 1), factor))].append(info)
+        
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= factor:
+                return tiers[tier]
+        
+        if len(segments) > Config.MAX_SEGMENTS:
+            smallest = sorted(segments, key=lambda info: info['doc_count'])
+            return smallest[:len(segments) - Config.MAX_SEGMENTS + 1]
+        
+        return []
+    
+    def merge_segments(self) -> int:
+        """Gộp các segment nhỏ theo chính sách merge, bỏ các bản đã bị tombstone
+        
+        Returns:
+            Số lần merge đã thực hiện
+        """
+        merges = 0
+        with self._lock:
+            while True:
+                manifest = SegmentedIndex.read_manifest(Config.INDEX_SEGMENTS_PATH)
+                selected = self._select_merge(manifest['segments'])
+                if len(selected) < 2:
+                    break
+                
+                current = SegmentedIndex(Config.INDEX_SEGMENTS_PATH)
+                selected_names = {info['name'] for info in selected}
+                
+                # Chép các document còn sống, không tách từ lại
+                merged = InvertedIndex()
+                for generation, name, segment in current.segments:
+                    if name not in selected_names:
+                        continue
+                    source = segment.to_inverted_index()
+                    for doc_id in source.doc_lengths:
+                        if current.is_live(doc_id, generation):
+                            merged.copy_document(source, doc_id)
+                
+                remaining = [entry for entry in current.segments if entry[1] not in selected_names]
+                manifest['segments'] = [info for info in manifest['segments'] if info['name'] not in selected_names]
+                self._write_segment(manifest, merged, max(info['generation'] for info in selected),
+                                    [entry[2] for entry in remaining], current.doc_count)
+                
+                # Chỉ giữ tombstone còn che một bản cũ trong segment chưa merge
+                manifest['tombstones'] = {
+                    doc_id: generation for doc_id, generation in manifest['tombstones'].items()
+                    if any(
+                        segment_generation < generation and segment.reader.row_of(int(doc_id)) >= 0
+                        for segment_generation, _, segment in remaining
+                    )
+                }
+                SegmentedIndex.write_manifest(Config.INDEX_SEGMENTS_PATH, manifest)
+                self._delete_unused_segments(manifest)
+                
+                merges += 1
+                self.logger.info(f"Đã merge {len(selected)} segment thành {merged.doc_count} phim")
+        
+        return merges
+    
+    def merge_segments_async(self):
+        """Chạy merge_segments ở thread nền"""
+        self._merge_thread = threading.Thread(target=self.merge_segments, daemon=True)
+        self._merge_thread.start()
+    
+    def wait_for_merge(self):
+        """Chờ merge nền (nếu có) chạy xong"""
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+    
+    def _delete_unused_segments(self, manifest: Dict):
+        """Xóa các file segment/thống kê không còn trong manifest (đã merge hoặc bị thay thế)"""
+        live_names = {info['name'] for info in manifest['segments']} | {manifest.get('stats')}
+        for segment_file in [*Config.INDEX_SEGMENTS_PATH.glob('segment_*.bin'),
+                             *Config.INDEX_SEGMENTS_PATH.glob('stats_*.bin')]:
+            if segment_file.name in live_names:
+                continue
+            try:
+                segment_file.unlink()
+            except OSError as e:
+                # Windows không cho xóa file đang được mmap, để lần sau dọn
+                self.logger.warning(f"Không thể xóa segment {segment_file.name}: {e}")
+    
     def save_index(self):
-        """Lưu index ra file"""
+        """Ghi index hiện tại thành segment duy nhất (thay cho toàn bộ segment cũ)"""
         Config.init_directories()
-        index_file = Config.INDEX_PATH / 'movie_index.pkl'
-        self.index.save_index(str(index_file))
+        Config.INDEX_SEGMENTS_PATH.mkdir(parents=True, exist_ok=True)
+        
+        old_manifest = SegmentedIndex.read_manifest(Config.INDEX_SEGMENTS_PATH)
+        manifest = {
+            'generation': old_manifest['generation'] + 1,
+            'next_segment': old_manifest['next_segment'],
+            'segments': [],
+            'tombstones': {}
+        }
+        self._write_segment(manifest, self.index, manifest['generation'])
+        
+        # Một segment: thống kê toàn collection chính là TF-IDF vừa tính
+        index = self.index
+        self._write_stats(manifest, index.doc_norms, {
+            term: (len(postings), index.term_max_weight.get(term, 0.0)) for term, postings in index.index.items()
+        })
+        SegmentedIndex.write_manifest(Config.INDEX_SEGMENTS_PATH, manifest)
+        self._delete_unused_segments(manifest)
     
     def load_index(self):
-        """Load index từ file"""
-        index_file = Config.INDEX_PATH / 'movie_index.pkl'
-        if index_file.exists():
-            self.index.load_index(str(index_file))
-            return True
+        """Mở index (các segment qua mmap, chỉ đọc)"""
+        manifest_file = Config.INDEX_SEGMENTS_PATH / SegmentedIndex.MANIFEST_NAME
+        if manifest_file.exists():
+            try:
+                mtime = manifest_file.stat().st_mtime
+                self.index = SegmentedIndex(Config.INDEX_SEGMENTS_PATH)
+                self._loaded_mtime = mtime
+                return True
+            except Exception as e:
+                self.logger.warning(f"Không thể mở index {Config.INDEX_SEGMENTS_PATH}: {e}")
         return False
+    
+    def reload_if_changed(self) -> bool:
+        """Mở lại index nếu manifest đã được ghi lại (ví dụ sau khi crawler cập nhật)
+        
+        Returns:
+            True nếu đã mở bản mới
+        """
+        try:
+            mtime = (Config.INDEX_SEGMENTS_PATH / SegmentedIndex.MANIFEST_NAME).stat().st_mtime
+        except OSError:
+            return False
+        
+        if mtime == self._loaded_mtime:
+            return False
+        
+        # Không đóng bản cũ: request khác có thể vẫn đang đọc, mmap tự giải phóng khi hết tham chiếu
+        return self.load_index()
+    
+    @property
+    def index_version(self):
+        """Phiên bản index đang mở (mtime của manifest), đổi mỗi khi mở bản mới"""
+        return self._loaded_mtime
+    
+    def is_index_stale(self) -> bool:
+        """Kiểm tra index có cũ hơn database không"""
+        manifest_file = Config.INDEX_SEGMENTS_PATH / SegmentedIndex.MANIFEST_NAME
+        db_file = Path(self.db_path)
+        if not manifest_file.exists():
+            return True
+        if db_file.exists() and db_file.stat().st_mtime > manifest_file.stat().st_mtime:
+            return True
+        return self.index.doc_count == 0
+    
+    def load_or_build_index(self):
+        """Load index có sẵn, cập nhật tăng dần nếu index cũ hơn database
+        
+        Chỉ build toàn bộ khi chưa có index (hoặc không mở được index cũ).
+        """
+        if self.load_index():
+            if not self.is_index_stale():
+                return
+            # Chỉ ghi segment cho phim thêm/cập nhật và tombstone cho phim đã xóa
+            self.update_index_from_database()
+        else:
+            self.logger.info("Chưa có index, đang build từ database...")
+            self.index = InvertedIndex()
+            self.build_index_from_database()
+            self.save_index()
+        
+        # Phía tìm kiếm dùng bản mmap vừa ghi
+        self.load_index()
 
 def main():
     """Hàm main để build index"""
@@ -380,9 +1972,10 @@ def main():
     # Build index
     builder = MovieIndexBuilder()
     
-    # Thử load index có sẵn
+    # Thử load index có sẵn và cập nhật các phim đã thay đổi
     if builder.load_index():
-        print("Đã load index có sẵn")
+        added, removed = builder.update_index_from_database()
+        print(f"Đã load index có sẵn (+{added} / -{removed} phim)")
     else:
         print("Xây dựng index mới...")
         builder.build_index_from_database()
@@ -0,0 +1,152 @@
+"""
+Module 3: Search Engine & Ranking
+Index gợi ý tìm kiếm (autocomplete) nằm trong bộ nhớ
+
+Các tên (tiêu đề, tên gốc, diễn viên, đạo diễn) được bỏ dấu, rồi mọi hậu tố
+bắt đầu ở đầu một từ được đưa vào một mảng đã sắp xếp. Tra tiền tố hoặc
+tiền tố của một từ ở giữa tên là một lần binary search; các tiền tố ngắn
+(nhiều kết quả nhất) có sẵn danh sách top-k tính trước. Khớp giữa từ (như
+LIKE '%q%') tra qua index n-gram (độ dài 1-3): query ngắn dùng đúng posting
+list của nó, query dài chỉ kiểm tra các tên chứa n-gram hiếm nhất của query,
+nên query không khớp gì không phải duyệt toàn bộ tên.
+"""
+
+import bisect
+from array import array
+import heapq
+import re
+from pathlib import Path
+import sys
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from modules.module2_text_processing.text_processor import VietnameseTextProcessor
+
+def fold_text(text: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d) và gộp khoảng trắng"""
+    return ' '.join(VietnameseTextProcessor.fold_diacritics(text.lower()).split())
+
+class SuggestionIndex:
+    """Index gợi ý: mảng hậu tố theo từ, xếp hạng theo rating rồi năm"""
+    
+    # Độ dài tiền tố (đã bỏ dấu) được tính sẵn top-k
+    PRECOMPUTED_PREFIX_LENGTH = 2
+    PRECOMPUTED_LIMIT = 20
+    
+    # Độ dài n-gram lớn nhất của index khớp giữa từ
+    NGRAM_LENGTH = 3
+    
+    WORD_START = re.compile(r'(?:^|(?<=[\s\-:(\[,.]))\w')
+    
+    def __init__(self, names: Iterable[Tuple[str, Optional[float], Optional[int]]] = ()):
+        """
+        Args:
+            names: (tên, rating, năm); một tên xuất hiện nhiều lần giữ rating/năm cao nhất
+        """
+        best = {}
+        for name, rating, year in names:
+            name = ' '.join((name or '').split())
+            folded = fold_text(name)
+            if not folded:
+                continue
+            rank_key = (rating if rating is not None else -1.0, year or 0)
+            current = best.get(folded)
+            if current is None or rank_key > current[0]:
+                best[folded] = (rank_key, name)
+        
+        # Thứ hạng = vị trí trong danh sách sắp theo (rating, năm) giảm dần
+        ordered = sorted(best.items(), key=lambda item: (-item[1][0][0], -item[1][0][1], item[0]))
+        self.names = [name for _, (_, name) in ordered]
+        self.folded_names = [folded for folded, _ in ordered]
+        
+        # (hậu tố, tier, rank): tier 0 = khớp từ đầu tên, 1 = khớp đầu một từ ở giữa
+        suffixes = []
+        for rank, folded in enumerate(self.folded_names):
+            for match in self.WORD_START.finditer(folded):
+                suffixes.append((folded[match.start():], 0 if match.start() == 0 else 1, rank))
+        suffixes.sort()
+        self._keys = [suffix for suffix, _, _ in suffixes]
+        self._hits = [(tier, rank) for _, tier, rank in suffixes]
+        
+        self._precomputed = {}
+        for length in range(1, self.PRECOMPUTED_PREFIX_LENGTH + 1):
+            groups: Dict[str, List[Tuple[int, int]]] = {}
+            for key, hit in zip(self._keys, self._hits):
+                if len(key) >= length:
+                    groups.setdefault(key[:length], []).append(hit)
+            for prefix, hits in groups.items():
+                self._precomputed[prefix] = self._best(hits, self.PRECOMPUTED_LIMIT)
+        
+        # {n-gram: array rank tăng dần của các tên chứa n-gram}
+        self._ngrams: Dict[str, array] = {}
+        for rank, folded in enumerate(self.folded_names):
+            grams = {
+                folded[start:start + length]
+                for length in range(1, self.NGRAM_LENGTH + 1)
+                for start in range(len(folded) - length + 1)
+            }
+            for gram in grams:
+                postings = self._ngrams.get(gram)
+                if postings is None:
+                    postings = self._ngrams[gram] = array('I')
+                postings.append(rank)
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    @staticmethod
+    def _best(hits: Iterable[Tuple[int, int]], limit: int) -> List[int]:
+        """Chọn top rank (mỗi tên một lần, ưu tiên tier thấp)"""
+        tiers = {}
+        for tier, rank in hits:
+            if tier < tiers.get(rank, 2):
+                tiers[rank] = tier
+        return [rank for _, rank in heapq.nsmallest(limit, ((tier, rank) for rank, tier in tiers.items()))]
+    
+    def _prefix_ranks(self, prefix: str, limit: int) -> List[int]:
+        if limit <= self.PRECOMPUTED_LIMIT and prefix in self._precomputed:
+            return self._precomputed[prefix][:limit]
+        
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + '\U0010ffff', start)
+        return self._best(self._hits[start:end], limit)
+    
+    def _infix_ranks(self, text: str, exclude: Set[int], limit: int) -> List[int]:
+        """Tối đa limit rank nhỏ nhất (ngoài exclude) có tên chứa text ở bất kỳ đâu"""
+        length = self.NGRAM_LENGTH
+        if len(text) <= length:
+            candidates = self._ngrams.get(text, ())
+        else:
+            # Tên chứa text thì chứa mọi n-gram của text: chỉ xét list ngắn nhất
+            candidates = min((self._ngrams.get(text[start:start + length], ())
+                              for start in range(len(text) - length + 1)), key=len)
+        
+        ranks = []
+        for rank in candidates:
+            if rank not in exclude and text in self.folded_names[rank]:
+                ranks.append(rank)
+                if len(ranks) == limit:
+                    break
+        return ranks
+    
+    def suggest(self, query: str, limit: int = 5) -> List[str]:
+        """Lấy tối đa limit gợi ý cho query (không phân biệt dấu)
+        
+        Thứ tự: tên bắt đầu bằng query, tên có một từ bắt đầu bằng query,
+        cuối cùng là tên chứa query ở giữa từ; trong mỗi nhóm theo rating rồi năm.
+        """
+        prefix = fold_text(query)
+        if not prefix or limit <= 0:
+            return []
+        
+        ranks = self._prefix_ranks(prefix, limit)
+        
+        # Bổ sung khớp giữa từ (như LIKE '%q%') khi chưa đủ kết quả
+        if len(ranks) < limit:
+            ranks.extend(self._infix_ranks(prefix, set(ranks), limit - len(ranks)))
+        
+        # Tên khớp đúng dấu với query đứng trước (sort ổn định giữ thứ hạng còn lại)
+        exact = ' '.join(query.lower().split())
+        ranks.sort(key=lambda rank: exact not in self.names[rank].lower())
+        
+        return [self.names[rank] for rank in ranks]
@@ -0,0 +1,234 @@
+"""
+Module 3: Search Engine & Ranking
+Bộ lọc và đếm facet (quốc gia, thể loại, năm, trạng thái)
+
+Mỗi giá trị facet có một bitmap (số nguyên Python, bit thứ i ứng với phim
+thứ i theo thứ tự id). Lọc là phép AND giữa bitmap ứng viên của query và
+bitmap của bộ lọc; đếm facet là popcount của phép AND với bitmap từng giá trị.
+Bitmap của từng term query được cache nên bitmap ứng viên của query chỉ là
+vài phép AND trên số nguyên lớn.
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import sys
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from modules.module2_text_processing.text_processor import VietnameseTextProcessor
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value: int) -> int:
+        return bin(value).count('1')
+
+# Vị trí các bit 1 trong từng giá trị byte, dùng để giải mã bitmap
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+def facet_key(value: str) -> str:
+    """Khóa so khớp giá trị facet: chữ thường, bỏ dấu, gộp khoảng trắng"""
+    return ' '.join(VietnameseTextProcessor.fold_diacritics(value.lower()).split())
+
+def status_key(status: Optional[str]) -> Optional[str]:
+    """Chuẩn hóa trạng thái phim ("Hoàn Tất (22/22)   Vietsub", "Tập 27 ...") về nhóm"""
+    folded = facet_key(status or '')
+    if folded.startswith(('hoan tat', 'full')):
+        return 'completed'
+    if folded.startswith('tap'):
+        return 'ongoing'
+    if folded.startswith('trailer'):
+        return 'trailer'
+    return None
+
+class FacetIndex:
+    """Bitmap theo từng giá trị facet của toàn bộ phim"""
+    
+    FACETS = ('country', 'genre', 'status', 'year')
+    LIST_FILTERS = ('country', 'genre', 'status')
+    STATUS_LABELS = {'completed': 'Hoàn tất', 'ongoing': 'Đang chiếu', 'trailer': 'Trailer'}
+    
+    # Số bitmap term giữ trong cache (LRU)
+    TERM_CACHE_SIZE = 1024
+    
+    def __init__(self, movies: Iterable[Tuple[int, Optional[str], Optional[str], Optional[str], Optional[int]]]):
+        """
+        Args:
+            movies: (id, country, genre, status, year); country/genre cách nhau bởi dấu phẩy
+        """
+        movies = sorted(movies, key=lambda movie: movie[0])
+        self.doc_ids = [movie[0] for movie in movies]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+        self.size = len(self.doc_ids)
+        self.all_docs = (1 << self.size) - 1
+        
+        rows = {facet: {} for facet in self.FACETS}  # {facet: {key: [row]}}
+        label_counts = {facet: {} for facet in self.FACETS}  # {facet: {key: {label: count}}}
+        
+        def add(facet, key, label, row):
+            rows[facet].setdefault(key, []).append(row)
+            labels = label_counts[facet].setdefault(key, {})
+            labels[label] = labels.get(label, 0) + 1
+        
+        for row, (_, country, genre, status, year) in enumerate(movies):
+            for facet, value in (('country', country), ('genre', genre)):
+                for label in {' '.join(part.split()) for part in (value or '').split(',')}:
+                    if label:
+                        add(facet, facet_key(label), label, row)
+            
+            key = status_key(status)
+            if key is not None:
+                add('status', key, self.STATUS_LABELS[key], row)
+            
+            if year:
+                add('year', int(year), str(year), row)
+        
+        self.bitmaps = {
+            facet: {key: self.to_bitmap_rows(key_rows) for key, key_rows in facet_rows.items()}
+            for facet, facet_rows in rows.items()
+        }
+        # Nhãn hiển thị: cách viết phổ biến nhất của mỗi giá trị
+        self.labels = {
+            facet: {key: max(labels, key=labels.get) for key, labels in facet_labels.items()}
+            for facet, facet_labels in label_counts.items()
+        }
+        
+        self._term_bitmaps = OrderedDict()  # {(term, folded): bitmap}
+        self._term_lock = threading.Lock()
+    
+    def to_bitmap_rows(self, rows: Iterable[int]) -> int:
+        """Tạo bitmap từ danh sách row (qua bytearray, không dựng số lớn từng bit)"""
+        data = bytearray((self.size + 7) // 8)
+        for row in rows:
+            data[row >> 3] |= 1 << (row & 7)
+        return int.from_bytes(data, 'little')
+    
+    def to_bitmap(self, doc_ids: Iterable[int]) -> int:
+        """Tạo bitmap từ tập doc_id (bỏ qua doc_id không có trong facet index)"""
+        rows = self.rows
+        return self.to_bitmap_rows(rows[doc_id] for doc_id in doc_ids if doc_id in rows)
+    
+    def to_doc_ids(self, bitmap: int) -> Set[int]:
+        """Giải mã bitmap thành tập doc_id"""
+        doc_ids = set()
+        for index, byte in enumerate(bitmap.to_bytes((self.size + 7) // 8, 'little')):
+            if byte:
+                base = index << 3
+                doc_ids.update(self.doc_ids[base + bit] for bit in _BYTE_BITS[byte])
+        return doc_ids
+    
+    def _term_bitmap(self, term: str, folded: bool, match_keywords: Callable) -> int:
+        key = (term, folded)
+        with self._term_lock:
+            bitmap = self._term_bitmaps.get(key)
+            if bitmap is not None:
+                self._term_bitmaps.move_to_end(key)
+                return bitmap
+        
+        bitmap = self.to_bitmap(match_keywords([term], folded))
+        with self._term_lock:
+            self._term_bitmaps[key] = bitmap
+            while len(self._term_bitmaps) > self.TERM_CACHE_SIZE:
+                self._term_bitmaps.popitem(last=False)
+        return bitmap
+    
+    def query_bitmap(self, terms: List[str], match_keywords: Callable) -> int:
+        """Bitmap các phim chứa đủ mọi term (AND các bitmap term đã cache)
+        
+        Args:
+            match_keywords: hàm (terms, folded) -> tập doc_id của index tìm kiếm
+        """
+        # Cùng quy tắc với SearchableIndex.match_keywords: có dấu ở bất kỳ term nào thì khớp đúng dấu
+        folded = not any(VietnameseTextProcessor.has_diacritics(term) for term in terms)
+        
+        bitmap = self.all_docs
+        for term in sorted(set(terms)):
+            bitmap &= self._term_bitmap(term, folded, match_keywords)
+            if not bitmap:
+                break
+        return bitmap
+    
+    @staticmethod
+    def count(bitmap: int) -> int:
+        return _popcount(bitmap)
+    
+    @classmethod
+    def normalize_filters(cls, filters: Optional[Dict]) -> Tuple:
+        """Chuẩn hóa bộ lọc thành tuple (dùng làm khóa cache), () nếu không lọc
+        
+        filters: {'country': [..], 'genre': [..], 'status': [..], 'year_from': int, 'year_to': int}
+        """
+        if not filters:
+            return ()
+        
+        normalized = []
+        for facet in cls.LIST_FILTERS:
+            values = filters.get(facet)
+            if isinstance(values, str):
+                values = [values]
+            keys = {facet_key(value) for value in values or [] if value and value.strip()}
+            if facet == 'status':
+                # Nhận cả mã ('completed') lẫn nhãn ('Hoàn tất')
+                keys = {status_key(key) or key for key in keys}
+            keys = sorted(keys)
+            if keys:
+                normalized.append((facet, tuple(keys)))
+        for name in ('year_from', 'year_to'):
+            if filters.get(name) is not None:
+                normalized.append((name, int(filters[name])))
+        return tuple(normalized)
+    
+    def filter_bitmap(self, filters: Tuple) -> int:
+        """Bitmap các phim thỏa bộ lọc đã chuẩn hóa
+        
+        Các giá trị trong cùng một facet là OR, giữa các facet là AND.
+        """
+        bitmap = self.all_docs
+        year_from = year_to = None
+        
+        for name, value in filters:
+            if name == 'year_from':
+                year_from = value
+            elif name == 'year_to':
+                year_to = value
+            else:
+                facet_bitmaps = self.bitmaps[name]
+                facet_filter = 0
+                for key in value:
+                    facet_filter |= facet_bitmaps.get(key, 0)
+                bitmap &= facet_filter
+        
+        if year_from is not None or year_to is not None:
+            year_filter = 0
+            for year, year_bitmap in self.bitmaps['year'].items():
+                if (year_from is None or year >= year_from) and (year_to is None or year <= year_to):
+                    year_filter |= year_bitmap
+            bitmap &= year_filter
+        
+        return bitmap
+    
+    def counts(self, bitmap: int, facet: str, limit: int = None) -> List[Dict]:
+        """Đếm số phim trong bitmap theo từng giá trị của facet (bỏ giá trị đếm 0)
+        
+        Returns:
+            List {'value', 'label', 'count'} theo số lượng giảm dần (năm: theo năm giảm dần)
+        """
+        labels = self.labels[facet]
+        counts = []
+        for key, value_bitmap in self.bitmaps[facet].items():
+            count = _popcount(bitmap & value_bitmap)
+            if count:
+                # value: giá trị truyền lại vào bộ lọc (năm và mã trạng thái dùng khóa)
+                counts.append({'value': key if facet in ('status', 'year') else labels[key],
+                               'label': labels[key], 'count': count})
+        
+        if facet == 'year':
+            counts.sort(key=lambda item: -item['value'])
+        else:
+            counts.sort(key=lambda item: (-item['count'], item['label']))
+        return counts[:limit] if limit else counts
+    
+    def all_counts(self, bitmap: int, limit: int = None) -> Dict[str, List[Dict]]:
+        """Đếm facet cho mọi facet"""
+        return {facet: self.counts(bitmap, facet, limit) for facet in self.FACETS}
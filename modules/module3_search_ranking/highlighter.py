@@ -0,0 +1,104 @@
+"""
+Module 3: Search Engine & Ranking
+Highlight từ khóa trong kết quả tìm kiếm
+
+Mỗi query được biên dịch một lần thành một regex dạng alternation (term dài
+trước) và cache lại; mỗi field chỉ cần một lần quét nên các thẻ <mark> không
+bao giờ lồng nhau. Với mô tả dài, đoạn trích (snippet) được chọn ở cửa sổ
+chứa nhiều term khớp nhất thay vì luôn lấy đoạn đầu.
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+import sys
+from typing import List, Optional, Pattern, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from modules.module2_text_processing.text_processor import VietnameseTextProcessor
+
+class QueryHighlighter:
+    """Highlight term của query bằng regex đã biên dịch sẵn"""
+    
+    # Số ký tự giữ lại trước term khớp đầu tiên của snippet
+    SNIPPET_CONTEXT = 30
+    
+    # Số vị trí khớp tối đa được thử làm điểm bắt đầu snippet
+    MAX_SNIPPET_CANDIDATES = 50
+    
+    def __init__(self, cache_size: int = 256):
+        self._compile = lru_cache(maxsize=cache_size)(self._build_pattern)
+    
+    @staticmethod
+    def _build_pattern(query: str) -> Optional[Tuple[Pattern, bool]]:
+        """Biên dịch query thành (regex alternation, có so khớp trên text đã bỏ dấu không)"""
+        # Dấu nháy kép (cụm từ bắt buộc) không phải một phần của term
+        terms = sorted({term for term in query.lower().replace('"', ' ').split() if len(term) > 1},
+                       key=len, reverse=True)
+        if not terms:
+            return None
+        
+        # Query gõ không dấu khớp cả chữ có dấu (giống cách lọc kết quả)
+        folded = not any(VietnameseTextProcessor.has_diacritics(term) for term in terms)
+        pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+        return pattern, folded
+    
+    def _find_matches(self, text: str, query: str) -> List[Tuple[int, int, str]]:
+        """Các đoạn khớp (start, end, term) trong text, một lần quét"""
+        compiled = self._compile(query)
+        if compiled is None:
+            return []
+        
+        pattern, folded = compiled
+        target = text
+        if folded:
+            # Bảng bỏ dấu giữ nguyên số ký tự với text dạng NFC nên vị trí dùng lại được
+            folded_text = VietnameseTextProcessor.fold_diacritics(text)
+            if len(folded_text) == len(text):
+                target = folded_text
+        
+        return [(match.start(), match.end(), match.group().lower()) for match in pattern.finditer(target)]
+    
+    def _best_window(self, text: str, matches: List[Tuple[int, int, str]], max_length: int) -> int:
+        """Chọn vị trí bắt đầu snippet dài max_length chứa nhiều term khác nhau nhất"""
+        last_start = len(text) - max_length
+        candidates = [0]
+        for start, _, _ in matches[:self.MAX_SNIPPET_CANDIDATES]:
+            candidate = min(max(start - self.SNIPPET_CONTEXT, 0), last_start)
+            # Lùi về đầu từ để không cắt giữa chữ
+            candidates.append(text.rfind(' ', 0, candidate) + 1 if candidate > 0 else 0)
+        
+        best_start, best_score = 0, (-1, -1)
+        for candidate in candidates:
+            window_end = candidate + max_length
+            covered = [term for start, end, term in matches if start >= candidate and end <= window_end]
+            score = (len(set(covered)), len(covered))
+            # Bằng điểm thì giữ cửa sổ sớm hơn
+            if score > best_score:
+                best_start, best_score = candidate, score
+        return best_start
+    
+    def highlight(self, text: str, query: str, max_length: int = None) -> str:
+        """Bọc các term của query trong <mark>, cắt snippet nếu text dài hơn max_length"""
+        if not text or not query:
+            return text
+        
+        matches = self._find_matches(text, query)
+        
+        start, end = 0, len(text)
+        if max_length and len(text) > max_length:
+            start = self._best_window(text, matches, max_length)
+            end = start + max_length
+        
+        parts = ['...'] if start > 0 else []
+        cursor = start
+        for match_start, match_end, _ in matches:
+            if match_start < start or match_end > end:
+                continue
+            parts.extend((text[cursor:match_start], '<mark>', text[match_start:match_end], '</mark>'))
+            cursor = match_end
+        parts.append(text[cursor:end])
+        if end < len(text):
+            parts.append('...')
+        
+        return ''.join(parts)
@@ -6,14 +6,169 @@ Xử lý truy vấn và xếp hạng kết quả tìm kiếm
 
 import sqlite3
 import json
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Set
 import logging
+import os
+import re
+import threading
+import time
+import heapq
+from collections import OrderedDict
 from pathlib import Path
 import sys
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from config.settings import Config
-from modules.module2_text_processing.text_processor import MovieIndexBuilder
+from modules.module2_text_processing.text_processor import MovieIndexBuilder, VietnameseTextProcessor
+from modules.module3_search_ranking.autocomplete import SuggestionIndex
+from modules.module3_search_ranking.highlighter import QueryHighlighter
+from modules.module3_search_ranking.facets import FacetIndex
+
+# Cụm từ bắt buộc khớp liền nhau: "hàn quốc"
+QUOTED_PHRASE = re.compile(r'"([^"]*)"')
+
+class SQLiteConnectionPool:
+    """Mỗi thread giữ một kết nối SQLite chỉ đọc và dùng lại cho mọi request
+    
+    Kết nối mở bằng URI mode=ro (thêm immutable=1 nếu Config.SQLITE_IMMUTABLE)
+    với pragma mmap_size/cache_size. Nếu file database bị thay (crawler xóa và
+    tạo lại) thì kết nối của thread được mở lại.
+    """
+    
+    def __init__(self, db_path):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self.stats = {'requests': 0, 'opened': 0, 'reopened': 0}
+    
+    def _database_uri(self) -> str:
+        uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+        if Config.SQLITE_IMMUTABLE:
+            uri += "&immutable=1"
+        return uri
+    
+    def _file_identity(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.db_path)
+            return stat.st_dev, stat.st_ino
+        except OSError:
+            return None
+    
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._database_uri(), uri=True)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA mmap_size = {int(Config.SQLITE_MMAP_SIZE)}')
+        conn.execute(f'PRAGMA cache_size = -{int(Config.SQLITE_CACHE_SIZE_KB)}')
+        conn.execute('PRAGMA query_only = 1')
+        return conn
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """Lấy kết nối của thread hiện tại (mở mới nếu chưa có hoặc file đã đổi)"""
+        identity = self._file_identity()
+        conn = getattr(self._local, 'conn', None)
+        
+        with self._lock:
+            self.stats['requests'] += 1
+            if conn is not None and self._local.identity == identity:
+                return conn
+            
+            if conn is not None:
+                self.stats['reopened'] += 1
+                self._connections.remove(conn)
+                conn.close()
+            
+            conn = self._open()
+            self._connections.append(conn)
+            self.stats['opened'] += 1
+        
+        self._local.conn = conn
+        self._local.identity = identity
+        return conn
+    
+    def get_stats(self) -> Dict:
+        """Thống kê pool: số lần lấy kết nối, số kết nối đã mở và tỉ lệ dùng lại"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['open_connections'] = len(self._connections)
+        stats['reuse_rate'] = 1 - stats['opened'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+    
+    def close_all(self):
+        """Đóng mọi kết nối (kết nối của thread khác chỉ đóng được khi thread đó không dùng)"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+class QueryResultCache:
+    """Cache danh sách kết quả đã xếp hạng theo query (LRU + TTL)
+    
+    Mỗi entry gắn với phiên bản index lúc tính; khi index đổi phiên bản
+    (crawler cập nhật) toàn bộ cache bị bỏ.
+    """
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # {key: (thời điểm tạo, value)}
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+    
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.stats['invalidations'] += 1
+            self._entries.clear()
+            self._version = version
+    
+    def get(self, key, version):
+        """Lấy value của key, None nếu chưa có, đã hết hạn hoặc khác phiên bản"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                entry = None
+            
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+    
+    def put(self, key, value, version):
+        with self._lock:
+            self._check_version(version)
+            if version != self._version:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict:
+        """Thống kê cache: hit/miss, số entry và tỉ lệ hit"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
 
 class SearchEngine:
     """Search Engine chính cho việc tìm kiếm phim"""
@@ -21,158 +176,316 @@ class SearchEngine:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.db_path = Config.DATABASE_PATH
+        self.db_pool = SQLiteConnectionPool(self.db_path)
+        self.result_cache = QueryResultCache(Config.SEARCH_CACHE_SIZE, Config.SEARCH_CACHE_TTL)
+        self.highlighter = QueryHighlighter()
         self.index_builder = MovieIndexBuilder()
+        self.index_builder.load_or_build_index()
+        self._derived_indexes = {}  # {tên: (phiên bản index, index phụ)}
+        self._derived_lock = threading.Lock()
     
-    def search(self, query: str, page: int = 1, per_page: int = None) -> Tuple[List[Dict], int]:
+    def search(self, query: str, page: int = 1, per_page: int = None,
+               filters: Dict = None) -> Tuple[List[Dict], int]:
+        """Tìm kiếm phim
+        
+        Args:
+            filters: Bộ lọc facet {'country': [..], 'genre': [..], 'status': [..],
+                     'year_from': int, 'year_to': int}; có bộ lọc thì query có thể rỗng
+        """
         if per_page is None:
             per_page = Config.RESULTS_PER_PAGE
         
-        if not query or not query.strip():
+        query = (query or '').strip()
+        filters = FacetIndex.normalize_filters(filters)
+        if not query.replace('"', '').strip() and not filters:
             return [], 0
         
         try:
-            results, total = self._search_simple(query, page, per_page)
+            self.index_builder.reload_if_changed()
+            results, total = self._search_simple(query, page, per_page, filters)
             return results, total
         except Exception as e:
             self.logger.error(f"Lỗi khi tìm kiếm: {e}")
             return [], 0
     
-    def _search_simple(self, query: str, page: int, per_page: int) -> Tuple[List[Dict], int]:
+    def _search_simple(self, query: str, page: int, per_page: int, filters: Tuple = ()) -> Tuple[List[Dict], int]:
         """
         Tìm kiếm với thuật toán Scoring (Tính điểm):
         - Khớp từ khóa rời rạc: Điểm thấp
         - Khớp cụm từ chính xác (Exact Phrase): Điểm cao
+        - Chỉ khớp sau khi bỏ dấu (gõ "han quoc" cho "hàn quốc"): thấp hơn khớp đúng dấu
+        - Các từ khóa đứng gần nhau trong cùng một field: cộng thêm theo độ gần
+        - Mức độ liên quan BM25F (trọng số field, độ dài field) phân hạng trong cùng mức khớp
+        
+        Ứng viên lấy từ posting list của keyword index (giao AND các term),
+        không còn quét toàn bộ bảng movies. Chỉ chọn top page * per_page
+        (heap) thay vì sắp xếp toàn bộ; phần đầu danh sách đã xếp hạng được
+        cache theo (query đã chuẩn hóa, số kết quả mỗi trang, bộ lọc), nên các
+        trang đã tính chỉ cần cắt danh sách.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM movies')
-            all_movies = cursor.fetchall()
-            conn.close()
-
             query_lower = query.lower().strip()
-            query_terms = query_lower.split() 
-            
-            matched_movies = []
-
-            for movie in all_movies:
-                # Gom tất cả thông tin lại
-                title = str(movie['title'] or '').lower()
-                full_text = " ".join([
-                    title,
-                    str(movie['original_title'] or ''),
-                    str(movie['genre'] or ''),
-                    str(movie['cast'] or ''),
-                    str(movie['director'] or ''),
-                    str(movie['country'] or ''),
-                    str(movie['year'] or '')
-                ]).lower()
-                
-                # 1. Lọc cơ bản: Phải chứa đủ các từ khóa (Logic AND)
-                is_match = True
-                for term in query_terms:
-                    if term not in full_text:
-                        is_match = False
-                        break
-                
-                if is_match:
-                    movie_dict = dict(movie)
-                    
-                    # --- [NÂNG CẤP] HỆ THỐNG TÍNH ĐIỂM ---
-                    score = 0.0
-                    
-                    # Tiêu chí 1: Khớp cụm từ chính xác (QUAN TRỌNG NHẤT)
-                    # Ví dụ: "Hàn Quốc" dính liền trong text
-                    if query_lower in full_text:
-                        score += 100.0
-                    
-                    # Tiêu chí 2: Từ khóa nằm trong Tiêu đề (Title)
-                    if query_lower in title:
-                        score += 50.0
-                        
-                    # Tiêu chí 3: Từ khóa rời rạc (Cơ bản)
-                    score += 10.0
-                    
-                    movie_dict['relevance_score'] = score
-                    
-                    # Highlight
-                    movie_dict['highlighted_title'] = self._highlight_text(
-                        movie_dict.get('title', ''), query
-                    )
-                    movie_dict['highlighted_description'] = self._highlight_text(
-                        movie_dict.get('description', ''), query, max_length=200
-                    )
-                    matched_movies.append(movie_dict)
-
-            # [QUAN TRỌNG] Sắp xếp: 
-            # Ưu tiên 1: Điểm cao (relevance_score)
-            # Ưu tiên 2: Năm mới nhất (year)
-            matched_movies.sort(key=lambda x: (x['relevance_score'], x.get('year') or 0), reverse=True)
-
-            total_results = len(matched_movies)
             
             start_idx = (page - 1) * per_page
             end_idx = start_idx + per_page
-            page_results = matched_movies[start_idx:end_idx]
             
-            return page_results, total_results
+            cache_key = (query_lower, per_page, filters)
+            version = self.index_builder.index_version
+            cached = self.result_cache.get(cache_key, version)
+            if cached is not None and (len(cached[0]) >= end_idx or len(cached[0]) == cached[1]):
+                scored_docs, total_results = cached
+            else:
+                scored_docs, total_results = self._rank_keyword_matches(query_lower, end_idx, filters)
+                self.result_cache.put(cache_key, (scored_docs, total_results), version)
+            
+            page_docs = scored_docs[start_idx:end_idx]
+            
+            # Chỉ đọc từ database các phim thuộc trang hiện tại
+            movies = self._get_movies_by_ids([doc_id for doc_id, _, _ in page_docs])
+            
+            page_results = []
+            for doc_id, score, _ in page_docs:
+                if doc_id not in movies:
+                    continue
+                movie_dict = movies[doc_id]
+                movie_dict['relevance_score'] = score
+                
+                # Highlight
+                movie_dict['highlighted_title'] = self._highlight_text(
+                    movie_dict.get('title', ''), query
+                )
+                movie_dict['highlighted_description'] = self._highlight_text(
+                    movie_dict.get('description', ''), query, max_length=200
+                )
+                page_results.append(movie_dict)
             
+            return page_results, total_results
+        
         except Exception as e:
             self.logger.error(f"Lỗi tìm kiếm simple: {e}")
             return [], 0
-
+    
+    @staticmethod
+    def _parse_query(query_lower: str) -> Tuple[List[str], List[str]]:
+        """Tách query thành (các từ khóa, các cụm từ đặt trong dấu nháy kép)
+        
+        Ví dụ: 'phim "hàn quốc"' -> (['phim', 'hàn', 'quốc'], ['hàn quốc'])
+        """
+        phrases = [phrase for phrase in QUOTED_PHRASE.findall(query_lower) if phrase.strip()]
+        return query_lower.replace('"', ' ').split(), phrases
+    
+    def _filter_phrases(self, candidate_ids: Set[int], phrases: List[str]) -> Set[int]:
+        """Giữ các phim chứa đúng từng cụm từ trong dấu nháy (giao vị trí trên posting list)"""
+        index = self.index_builder.index
+        for phrase in phrases:
+            tokens = index.text_processor.process_text(phrase)
+            # Cụm một từ đã được lọc bởi keyword index
+            if len(tokens) < 2 or not candidate_ids:
+                continue
+            folded = not VietnameseTextProcessor.has_diacritics(phrase)
+            candidate_ids = index.phrase_matches(tokens, candidate_ids, folded)
+        return candidate_ids
+    
+    def _rank_keyword_matches(self, query_lower: str, limit: int,
+                              filters: Tuple = ()) -> Tuple[List[Tuple[int, float, int]], int]:
+        """Lọc, chấm điểm và chọn top limit phim khớp query và bộ lọc
+        
+        Không có query (chỉ lọc facet) thì mọi phim khớp có điểm 0, xếp theo năm.
+        Cụm từ đặt trong dấu nháy kép ("hàn quốc") bắt buộc phải khớp liền nhau.
+        
+        Returns:
+            (List (doc_id, score, year) top limit theo điểm rồi năm giảm dần,
+             tổng số phim khớp)
+        """
+        index = self.index_builder.index
+        
+        query_terms, phrases = self._parse_query(query_lower)
+        query_text = ' '.join(query_terms)
+        # Query gõ không dấu: chấm thêm điểm khớp sau khi bỏ dấu (thấp hơn khớp đúng dấu)
+        fold_query = not VietnameseTextProcessor.has_diacritics(query_text)
+        
+        # 1. Lọc cơ bản: Phải chứa đủ các từ khóa (Logic AND), AND với bitmap bộ lọc
+        if filters or not query_terms:
+            facet_index, bitmap = self._candidate_bitmap(query_lower, filters)
+            candidate_ids = facet_index.to_doc_ids(bitmap)
+        else:
+            candidate_ids = self._filter_phrases(index.match_keywords(query_terms), phrases)
+        
+        # Điểm BM25F từ posting list, chỉ cho các phim ứng viên
+        relevance = index.bm25f_scores(query_text, candidate_ids) if query_terms else {}
+        
+        # Khớp cụm từ và độ gần giữa các từ khóa: giao vị trí trên posting list
+        # (trong cùng một field). Query chỉ còn một term sau khi tách từ thì
+        # so khớp chuỗi như cũ.
+        phrase_tokens = index.text_processor.process_text(query_text) if query_terms else []
+        positional = len(phrase_tokens) >= 2
+        if positional:
+            exact_phrases = index.phrase_matches(phrase_tokens, candidate_ids)
+            folded_phrases = (index.phrase_matches(phrase_tokens, candidate_ids - exact_phrases, folded=True)
+                              if fold_query else set())
+            spans = index.proximity_spans(phrase_tokens, candidate_ids, folded=fold_query)
+            term_count = len(set(phrase_tokens))
+        
+        scored_docs = []
+        
+        # Duyệt theo thứ tự id để giữ thứ tự khi bằng điểm như bản quét bảng
+        for doc_id in sorted(candidate_ids):
+            doc = index.get_doc(doc_id)
+            if doc is None:
+                # Phim mới trong database nhưng index chưa cập nhật
+                continue
+            
+            # --- [NÂNG CẤP] HỆ THỐNG TÍNH ĐIỂM ---
+            score = 0.0
+            if not query_terms:
+                scored_docs.append((doc_id, score, doc['year'] or 0))
+                continue
+            
+            # Tiêu chí 1: Khớp cụm từ chính xác (QUAN TRỌNG NHẤT)
+            # Ví dụ: "Hàn Quốc" dính liền trong một field
+            if positional:
+                if doc_id in exact_phrases:
+                    score += 100.0
+                elif doc_id in folded_phrases:
+                    score += 90.0
+                
+                # Các từ khóa càng gần nhau càng được cộng nhiều (tối đa khi liền nhau)
+                span = spans.get(doc_id)
+                if span is not None and span <= Config.PROXIMITY_WINDOW:
+                    score += Config.PROXIMITY_BOOST * term_count / span
+            elif query_text in doc['text']:
+                score += 100.0
+            elif fold_query and query_text in VietnameseTextProcessor.fold_diacritics(doc['text']):
+                score += 90.0
+            
+            # Tiêu chí 2: Từ khóa nằm trong Tiêu đề (Title)
+            if query_text in doc['title']:
+                score += 50.0
+            elif fold_query and query_text in VietnameseTextProcessor.fold_diacritics(doc['title']):
+                score += 40.0
+            
+            # Tiêu chí 3: Mức độ liên quan BM25F của các từ khóa rời rạc
+            score += relevance.get(doc_id, 0.0)
+            
+            scored_docs.append((doc_id, score, doc['year'] or 0))
+        
+        # [QUAN TRỌNG] Sắp xếp: 
+        # Ưu tiên 1: Điểm cao (relevance_score)
+        # Ưu tiên 2: Năm mới nhất (year)
+        # nlargest giữ thứ tự ổn định như sort(reverse=True), chỉ giữ limit phần tử
+        # Tổng chỉ đếm phim đã chấm (bỏ id mà index không còn document)
+        total = len(scored_docs)
+        if limit < len(scored_docs):
+            scored_docs = heapq.nlargest(limit, scored_docs, key=lambda x: (x[1], x[2]))
+        else:
+            scored_docs.sort(key=lambda x: (x[1], x[2]), reverse=True)
+        
+        return scored_docs, total
+    
+    def _candidate_bitmap(self, query_lower: str, filters: Tuple) -> Tuple[FacetIndex, int]:
+        """Bitmap các phim khớp query (AND các term, đúng các cụm trong nháy) và bộ lọc đã chuẩn hóa"""
+        facet_index = self._get_facet_index()
+        query_terms, phrases = self._parse_query(query_lower)
+        if query_terms:
+            bitmap = facet_index.query_bitmap(query_terms, self.index_builder.index.match_keywords)
+        else:
+            bitmap = facet_index.all_docs
+        if filters:
+            bitmap &= facet_index.filter_bitmap(filters)
+        if phrases and bitmap:
+            bitmap = facet_index.to_bitmap(self._filter_phrases(facet_index.to_doc_ids(bitmap), phrases))
+        return facet_index, bitmap
+    
+    def _get_movies_by_ids(self, movie_ids: List[int]) -> Dict[int, Dict]:
+        """Lấy thông tin nhiều phim theo danh sách ID"""
+        if not movie_ids:
+            return {}
+        
+        cursor = self.db_pool.get_connection().cursor()
+        placeholders = ','.join('?' * len(movie_ids))
+        cursor.execute(f'SELECT * FROM movies WHERE id IN ({placeholders})', movie_ids)
+        results = cursor.fetchall()
+        return {row['id']: dict(row) for row in results}
+    
     def _get_movie_by_id(self, movie_id: int) -> Optional[Dict]:
         """Lấy thông tin chi tiết phim theo ID"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self.db_pool.get_connection().cursor()
             cursor.execute('SELECT * FROM movies WHERE id = ?', (movie_id,))
             result = cursor.fetchone()
-            conn.close()
             
             if result:
-                col_names = [description[0] for description in cursor.description]
-                return dict(zip(col_names, result))
+                return dict(result)
             return None
         except Exception as e:
             self.logger.error(f"Lỗi khi lấy movie {movie_id}: {e}")
             return None
     
     def _highlight_text(self, text: str, query: str, max_length: int = None) -> str:
-        """Highlight từ khóa trong text"""
-        if not text or not query:
-            return text
+        """Highlight từ khóa trong text (snippet tốt nhất nếu có max_length)"""
+        return self.highlighter.highlight(text, query, max_length)
+    
+    def _build_suggestion_index(self) -> SuggestionIndex:
+        """Tạo index gợi ý từ tiêu đề, tên gốc, diễn viên và đạo diễn"""
+        cursor = self.db_pool.get_connection().cursor()
+        cursor.execute('SELECT title, original_title, "cast", director, rating, year FROM movies')
         
-        if max_length and len(text) > max_length:
-            text = text[:max_length] + "..."
+        names = []
+        for title, original_title, cast, director, rating, year in cursor.fetchall():
+            names.append((title, rating, year))
+            names.append((original_title, rating, year))
+            for person in f"{cast or ''},{director or ''}".split(','):
+                names.append((person, rating, year))
+        return SuggestionIndex(names)
+    
+    def _get_derived_index(self, name: str, build):
+        """Lấy index phụ (gợi ý, facet) dựng từ database, build lại khi index tìm kiếm đã đổi phiên bản"""
+        self.index_builder.reload_if_changed()
+        version = self.index_builder.index_version
         
-        highlighted_text = text
-        query_terms = query.lower().split()
-        query_terms.sort(key=len, reverse=True)
+        entry = self._derived_indexes.get(name)
+        if entry is None or entry[0] != version:
+            with self._derived_lock:
+                entry = self._derived_indexes.get(name)
+                if entry is None or entry[0] != version:
+                    entry = (version, build())
+                    self._derived_indexes[name] = entry
+                    self.logger.info(f"Đã build index {name}")
+        return entry[1]
+    
+    def _get_suggestion_index(self) -> SuggestionIndex:
+        return self._get_derived_index('suggestions', self._build_suggestion_index)
+    
+    def _build_facet_index(self) -> FacetIndex:
+        """Tạo bitmap facet (quốc gia, thể loại, trạng thái, năm) từ database"""
+        cursor = self.db_pool.get_connection().cursor()
+        cursor.execute('SELECT id, country, genre, status, year FROM movies')
+        return FacetIndex(cursor.fetchall())
+    
+    def _get_facet_index(self) -> FacetIndex:
+        return self._get_derived_index('facets', self._build_facet_index)
+    
+    def get_facets(self, query: str = '', filters: Dict = None, limit: int = None) -> Dict[str, List[Dict]]:
+        """Đếm facet (quốc gia, thể loại, trạng thái, năm) trên các phim khớp query và bộ lọc
         
-        for term in query_terms:
-            if len(term) > 1:
-                import re
-                pattern = re.compile(re.escape(term), re.IGNORECASE)
-                highlighted_text = pattern.sub(f'<mark>\\g<0></mark>', highlighted_text)
+        Args:
+            limit: Số giá trị tối đa mỗi facet (None: tất cả)
         
-        return highlighted_text
+        Returns:
+            {facet: [{'value', 'label', 'count'}]}
+        """
+        try:
+            query_lower = (query or '').lower().strip()
+            facet_index, bitmap = self._candidate_bitmap(query_lower, FacetIndex.normalize_filters(filters))
+            return facet_index.all_counts(bitmap, limit)
+        except Exception as e:
+            self.logger.error(f"Lỗi khi đếm facet: {e}")
+            return {}
     
     def get_suggestions(self, query: str, limit: int = 5) -> List[str]:
-        """Lấy gợi ý tìm kiếm"""
+        """Lấy gợi ý tìm kiếm (tiền tố/giữa tên, không phân biệt dấu)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT DISTINCT title FROM movies 
-                WHERE LOWER(title) LIKE ? 
-                LIMIT ?
-            ''', (f'%{query.lower()}%', limit))
-            suggestions = [row[0] for row in cursor.fetchall()]
-            conn.close()
-            return suggestions
+            return self._get_suggestion_index().suggest(query, limit)
         except Exception as e:
             self.logger.error(f"Lỗi khi lấy suggestions: {e}")
             return []
@@ -180,9 +493,7 @@ class SearchEngine:
     def get_popular_movies(self, limit: int = 10) -> List[Dict]:
         """Lấy danh sách phim phổ biến"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            cursor = self.db_pool.get_connection().cursor()
             cursor.execute('''
                 SELECT * FROM movies 
                 WHERE rating IS NOT NULL
@@ -190,13 +501,16 @@ class SearchEngine:
                 LIMIT ?
             ''', (limit,))
             results = cursor.fetchall()
-            conn.close()
             return [dict(row) for row in results]
         except Exception as e:
             self.logger.error(f"Lỗi khi lấy popular movies: {e}")
             return []
     
     def get_movies_by_genre(self, genre: str, limit: int = 10) -> List[Dict]:
-        """Lấy phim theo thể loại"""
-        movies, _ = self._search_simple(genre, page=1, per_page=limit)
-        return movies
\ No newline at end of file
+        """Lấy phim theo thể loại (bộ lọc facet, mới nhất trước)"""
+        movies, _ = self.search('', page=1, per_page=limit, filters={'genre': [genre]})
+        return movies
+    
+    def get_stats(self) -> Dict:
+        """Thống kê vận hành (pool kết nối database, cache kết quả tìm kiếm)"""
+        return {'db_pool': self.db_pool.get_stats(), 'result_cache': self.result_cache.get_stats()}
\ No newline at end of file
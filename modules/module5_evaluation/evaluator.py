@@ -125,6 +125,10 @@ class SearchEvaluator:
         results, _ = self.search_engine.search(query, page=1, per_page=k)
         retrieved_ids = [r['id'] for r in results]
         
+        return self._compute_metrics(query, retrieved_ids, k)
+    
+    def _compute_metrics(self, query: str, retrieved_ids: List[int], k: int) -> Dict[str, float]:
+        """Tính các chỉ số từ danh sách ID đã truy xuất"""
         # 2. Lấy danh sách đáp án đúng (Ground Truth)
         relevant_ids = set(self.ground_truth[query])
         if not relevant_ids: 
@@ -195,6 +199,53 @@ class SearchEvaluator:
         else:
             print("=> ĐÁNH GIÁ: CẦN CẢI THIỆN (Độ chính xác chưa cao)")
 
+    def evaluate_tfidf_batch(self, k: int = 10):
+        """Đánh giá xếp hạng TF-IDF của InvertedIndex
+        
+        Toàn bộ query set được chấm điểm trong một lần gọi search_batch
+        (một phép nhân ma trận khi bật backend NumPy/SciPy).
+        """
+        index = self.search_engine.index_builder.index
+        if index.matrix_backend is None:
+            index.enable_matrix_backend()
+        
+        queries = sorted(self.ground_truth.keys())
+        batch_results = index.search_batch(queries, top_k=k)
+        self._print_ranking_report('TF-IDF', queries, batch_results, k)
+    
+    def evaluate_bm25f(self, k: int = 10):
+        """Đánh giá xếp hạng BM25F của index (trọng số field trong Config.FIELD_BOOSTS)"""
+        index = self.search_engine.index_builder.index
+        
+        queries = sorted(self.ground_truth.keys())
+        results = [index.search_bm25f(query, top_k=k) for query in queries]
+        self._print_ranking_report('BM25F', queries, results, k)
+    
+    def _print_ranking_report(self, name: str, queries: List[str], batch_results: List[List[Tuple[int, float]]], k: int):
+        print("\n" + "="*85)
+        print(f"BÁO CÁO ĐÁNH GIÁ XẾP HẠNG {name} (Top-K = {k})")
+        print("="*85)
+        print(f"{'Query (Truy vấn)':<20} | {'P@10':<8} | {'R@10':<8} | {'MAP':<8} | {'Kết quả tìm/Tổng đúng'}")
+        print("-" * 85)
+        
+        total_ap = 0
+        count = 0
+        
+        for query, results in zip(queries, batch_results):
+            metrics = self._compute_metrics(query, [doc_id for doc_id, _ in results], k)
+            if not metrics:
+                continue
+            
+            print(f"{query:<20} | {metrics['precision']:.2f}     | {metrics['recall']:.2f}     | {metrics['ap']:.2f}     | {metrics['retrieved_count']}/{metrics['relevant_count']} docs")
+            
+            total_ap += metrics['ap']
+            count += 1
+        
+        print("-" * 85)
+        mean_map = total_ap / count if count > 0 else 0
+        print(f"ĐIỂM TRUNG BÌNH {name} (Mean MAP): {mean_map:.4f}")
+        print("="*85)
+
 def main():
     """Hàm main"""
     # Tắt log rác
@@ -208,6 +259,12 @@ def main():
         return
 
     evaluator.evaluate_system()
+    
+    # So sánh thêm với xếp hạng TF-IDF (chạy batch)
+    if '--tfidf' in sys.argv:
+        evaluator.evaluate_tfidf_batch()
+    if '--bm25f' in sys.argv:
+        evaluator.evaluate_bm25f()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
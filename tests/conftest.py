@@ -0,0 +1,36 @@
+"""
+Cấu hình chung cho các bài kiểm tra hồi quy
+
+Chạy từ thư mục gốc dự án: python -m pytest -q
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config.settings import Config
+
+# Các bài kiểm tra so sánh kết quả của backend Python (cắt tỉa, segment)
+Config.SCORING_BACKEND = 'python'
+
+@pytest.fixture(scope='session')
+def movie_index():
+    """InvertedIndex build từ database mẫu data/search_engine.db (chỉ đọc)"""
+    from modules.module2_text_processing.text_processor import MovieIndexBuilder
+    
+    builder = MovieIndexBuilder()
+    builder.db_path = Config.DATABASE_PATH
+    builder.build_index_from_database()
+    return builder.index
+
+@pytest.fixture(scope='session')
+def sample_queries(movie_index):
+    """Vài query cố định và 200 query ngẫu nhiên (seed cố định) gồm 1-3 từ trong nội dung phim"""
+    rng = random.Random(2024)
+    words = sorted({word for doc in movie_index.doc_store.values() for word in doc['text'].split()})
+    queries = ['tình yêu', 'phim hành động', 'hàn quốc', 'gia đình', 'cổ trang trung quốc']
+    queries += [' '.join(rng.sample(words, rng.randint(1, 3))) for _ in range(200)]
+    return queries
@@ -0,0 +1,174 @@
+"""
+Crawl bị dừng giữa chừng (hoặc có trang lỗi) rồi chạy tiếp phải cho đúng bảng
+movies của một lượt crawl trọn vẹn, không tải lại trang đã xong
+
+Crawler chạy trên server HTTP local giả lập bố cục Motchilli, không cần internet.
+"""
+
+import logging
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from config.settings import Config
+from modules.module1_crawler.checkpoint import CrawlCheckpoint
+from modules.module1_crawler.crawler import MotchillCrawler
+
+MAX_PAGES = 3
+PAGES_PER_CATEGORY = 2  # Trang danh sách có phim; trang sau đó trống (crawler dừng category)
+MOVIES_PER_PAGE = 6
+FAILED_LISTING = '/the-loai/hanh-dong'
+
+def listing_html(category: str, page: int) -> str:
+    slug = category.rsplit('/', 1)[-1]
+    items = ''.join(f'<li class="item"><h3 class="name-title"><a href="/phim/{slug}-{page}-{i}">Phim</a></h3></li>'
+                    for i in range(MOVIES_PER_PAGE if page <= PAGES_PER_CATEGORY else 0))
+    return f'<html><body><ul class="list-film">{items}</ul></body></html>'
+
+def detail_html(slug: str) -> str:
+    return f'''<html><body><div class="poster"><img src="/img/{slug}.jpg"></div>
+<h1><span class="title">Phim {slug}</span></h1><span class="real-name">Movie {slug} (2020)</span>
+<span class="average" id="average">7.5</span>
+<dl><dt>Năm sản xuất:</dt><dd>2021</dd><dt>Thể loại:</dt><dd><a>Hành Động</a><a>Hài Hước</a></dd>
+<dt>Quốc gia:</dt><dd><a>Hàn Quốc</a></dd><dt>Diễn viên:</dt><dd><a>Bà B</a>, <a>Ông C</a></dd>
+<dt>Số tập:</dt><dd>16</dd><dt>Trạng thái:</dt><dd>Hoàn Tất (16/16)</dd></dl>
+<div class="detail"><div class="tab">Mô tả phim {slug}.</div></div></body></html>'''
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Trang danh sách (?page= hoặc /page/) và trang chi tiết /phim/<slug>"""
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_GET(self):
+        server = self.server
+        parts = urlparse(self.path)
+        path, query = parts.path.rstrip('/'), parse_qs(parts.query)
+        with server.lock:
+            server.requests.append(self.path)
+        
+        if path.startswith('/phim/'):
+            body = detail_html(path.rsplit('/', 1)[-1])
+            failed = path in server.failing
+        else:
+            category, page = path, int(query.get('page', ['1'])[0])
+            if '/page/' in path:
+                category, page = path.rsplit('/page/', 1)[0], int(path.rsplit('/', 1)[-1])
+            body = listing_html(category, page)
+            failed = (category, page) in server.failing
+        
+        content = b'' if failed else body.encode('utf-8')
+        self.send_response(500 if failed else 200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+@pytest.fixture
+def standin():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandinHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failing = set()  # Đường dẫn trang chi tiết / (category, trang) danh sách trả 500
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(Config, 'CRAWL_WRITE_BATCH', 5)
+    logging.disable(logging.ERROR)
+    yield
+    logging.disable(logging.NOTSET)
+
+def make_crawler(server, db_path) -> MotchillCrawler:
+    return MotchillCrawler(base_url=f'http://127.0.0.1:{server.server_port}', db_path=str(db_path),
+                           concurrency=4, rate=1000)
+
+def crawl(server, db_path, resume: bool = False):
+    crawler = make_crawler(server, db_path)
+    try:
+        crawler.crawl_motchill_categories(max_pages=MAX_PAGES, resume=resume)
+    finally:
+        crawler.close()
+
+def movies_table(db_path):
+    conn = sqlite3.connect(str(db_path))
+    try:
+        columns = ', '.join(f'"{column}"' for column in MotchillCrawler.MOVIE_COLUMNS)
+        return conn.execute(f'SELECT {columns} FROM movies ORDER BY url').fetchall()
+    finally:
+        conn.close()
+
+def detail_requests(server):
+    return [path for path in server.requests if path.startswith('/phim/')]
+
+@pytest.fixture
+def complete_crawl(standin, tmp_path):
+    """Bảng movies của một lượt crawl không bị dừng, không lỗi"""
+    crawl(standin, tmp_path / 'complete.db')
+    standin.requests.clear()
+    return movies_table(tmp_path / 'complete.db')
+
+def test_resume_after_interruption(standin, tmp_path, complete_crawl, monkeypatch):
+    db_path = tmp_path / 'interrupted.db'
+    crawler = make_crawler(standin, db_path)
+    refresh = crawler.refresh_movie_detail
+    calls = []
+    
+    def refresh_then_stop(url, cached=None):
+        with standin.lock:
+            calls.append(url)
+            if len(calls) > 40:
+                raise KeyboardInterrupt
+        return refresh(url, cached)
+    
+    monkeypatch.setattr(crawler, 'refresh_movie_detail', refresh_then_stop)
+    with pytest.raises(KeyboardInterrupt):
+        crawler.crawl_motchill_categories(max_pages=MAX_PAGES)
+    # Dừng đột ngột: bộ đệm ghi chưa flush bị mất
+    crawler._write_conn.close()
+    
+    saved = {row[2] for row in movies_table(db_path)}
+    assert 0 < len(saved) < len(complete_crawl)
+    assert CrawlCheckpoint(str(db_path)).unfinished()
+    
+    standin.requests.clear()
+    crawl(standin, db_path, resume=True)
+    
+    assert movies_table(db_path) == complete_crawl
+    assert not CrawlCheckpoint(str(db_path)).unfinished()
+    # Chạy tiếp không tải lại trang danh sách hay trang chi tiết đã lưu
+    assert all(path.startswith('/phim/') for path in standin.requests)
+    refetched = {f'{crawler.base_url}{path}' for path in detail_requests(standin)} & saved
+    assert not refetched
+
+def test_failed_pages_retried_on_resume(standin, tmp_path, complete_crawl):
+    db_path = tmp_path / 'failed.db'
+    failed_detail = '/phim/tam-ly-2-3'
+    standin.failing = {(FAILED_LISTING, 1), failed_detail}
+    crawl(standin, db_path)
+    
+    checkpoint = CrawlCheckpoint(str(db_path))
+    assert checkpoint.failed_pages() == {FAILED_LISTING: [1]}
+    assert checkpoint.categories()[FAILED_LISTING] == (PAGES_PER_CATEGORY, False)
+    assert checkpoint.unfinished()
+    urls = {row[2] for row in movies_table(db_path)}
+    assert not any('/phim/hanh-dong-1-' in url for url in urls)
+    assert not any(url.endswith(failed_detail) for url in urls)
+    
+    standin.failing = set()
+    standin.requests.clear()
+    crawl(standin, db_path, resume=True)
+    
+    assert movies_table(db_path) == complete_crawl
+    assert CrawlCheckpoint(str(db_path)).failed_pages() == {}
+    assert not CrawlCheckpoint(str(db_path)).unfinished()
+    assert f'{FAILED_LISTING}?page=1' in standin.requests
+    assert sorted(detail_requests(standin)) == sorted([failed_detail] + [
+        f'/phim/hanh-dong-1-{i}' for i in range(MOVIES_PER_PAGE)])
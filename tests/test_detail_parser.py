@@ -0,0 +1,56 @@
+"""
+Bóc tách trang chi tiết bằng lxml một lượt phải cho đúng kết quả của BeautifulSoup (html.parser)
+"""
+
+import pytest
+
+pytest.importorskip('lxml')
+
+from config.settings import Config
+from modules.module1_crawler.crawler import MotchillCrawler
+from modules.module1_crawler.detail_parser import parse_detail_html
+from modules.module1_crawler.parser_benchmark import load_fixtures, sample_fixtures
+
+# Biến thể bố cục trang: (tên, chuỗi cần thay, chuỗi thay thế)
+VARIANTS = [
+    ('nhãn năm khác', '<dt>Năm sản xuất:</dt>', '<dt>Khác:</dt>'),
+    ('link trailer', '</footer>', '<a href="/trailer">Xem Trailer</a></footer>'),
+    ('link trailer chữ thường', '</footer>', '<a href="/trailer">xem trailer</a></footer>'),
+    ('nhãn lặp lại', '</dl>', '<dt>Số tập:</dt><dd>99</dd></dl>'),
+    ('iframe youtube', '</footer>', '<iframe src="https://www.youtube.com/embed/x"></iframe></footer>'),
+    ('rating nhiều class', '<span class="average" id="average">', '<span class="average big" id="average"> điểm '),
+    ('nhãn lồng thẻ', '<dt>Thời lượng:</dt>', '<dt><b>Thời lượng:</b></dt>'),
+    ('dd lồng thẻ', '<dd>', '<dd>\n  <span>'),
+    ('không có span.title', 'class="title"', 'class="x"'),
+    ('thiếu div.detail', 'class="detail"', 'class="x"')
+]
+
+@pytest.fixture(scope='module')
+def crawler(tmp_path_factory):
+    return MotchillCrawler(db_path=str(tmp_path_factory.mktemp('crawler') / 'crawler.db'))
+
+def parse_both(crawler, content: bytes):
+    """Kết quả của hai cách bóc tách; None khi lỗi (crawler bỏ qua trang lỗi, kiểu exception không quan trọng)"""
+    results = []
+    for parse in (lambda: crawler.parse_movie_detail_soup('', content),
+                  lambda: dict(parse_detail_html(content, crawler.base_url), url='', source_website='motchilli.io')):
+        try:
+            results.append(parse())
+        except Exception:
+            results.append(None)
+    return results
+
+def test_saved_and_sample_pages_match(crawler):
+    pages = load_fixtures(Config.RAW_HTML_PATH) + sample_fixtures(100)
+    for name, content in pages:
+        soup_result, lxml_result = parse_both(crawler, content)
+        assert isinstance(soup_result, dict), name
+        assert soup_result == lxml_result, name
+
+@pytest.mark.parametrize('old, new', [(old, new) for _, old, new in VARIANTS], ids=[name for name, _, _ in VARIANTS])
+def test_layout_variants_match(crawler, old, new):
+    for name, content in sample_fixtures(10):
+        page = content.decode('utf-8')
+        assert old in page
+        soup_result, lxml_result = parse_both(crawler, page.replace(old, new).encode('utf-8'))
+        assert soup_result == lxml_result, name
@@ -0,0 +1,53 @@
+"""
+Cắt tỉa MaxScore khi chọn top-k phải cho đúng kết quả của bản duyệt toàn bộ
+"""
+
+import pytest
+
+from modules.module2_text_processing.index_format import POSTING_BLOCK_SIZE
+from modules.module2_text_processing.text_processor import MappedIndex, SearchableIndex
+
+@pytest.mark.parametrize('top_k', [1, 5, 10, 50])
+def test_inverted_index_pruned_matches_exhaustive(movie_index, sample_queries, top_k):
+    for query in sample_queries:
+        assert movie_index.search(query, top_k, prune=True) == movie_index.search(query, top_k, prune=False), query
+
+# PROBE_DECODE_RATIO = 0: list chưa giải mã luôn được tra theo khối (bảng skip)
+@pytest.mark.parametrize('probe_decode_ratio', [0, SearchableIndex.PROBE_DECODE_RATIO])
+@pytest.mark.parametrize('top_k', [1, 10])
+def test_mapped_index_pruned_matches_exhaustive(movie_index, sample_queries, tmp_path, monkeypatch,
+                                                top_k, probe_decode_ratio):
+    monkeypatch.setattr(SearchableIndex, 'PROBE_DECODE_RATIO', probe_decode_ratio)
+    movie_index.save_index(str(tmp_path / 'index.bin'))
+    mapped = MappedIndex(str(tmp_path / 'index.bin'))
+    try:
+        for query in sample_queries:
+            pruned = mapped.search(query, top_k, prune=True)
+            assert pruned == mapped.search(query, top_k, prune=False), query
+            assert pruned == movie_index.search(query, top_k, prune=False), query
+    finally:
+        mapped.close()
+
+def test_block_lookup_matches_full_decode(movie_index, tmp_path):
+    movie_index.save_index(str(tmp_path / 'index.bin'))
+    mapped = MappedIndex(str(tmp_path / 'index.bin'))
+    try:
+        reader = mapped.reader
+        long_lists = [position for position in range(reader.term_count)
+                      if reader.term_df[position] > POSTING_BLOCK_SIZE]
+        assert long_lists
+        for position in long_lists:
+            expected = dict(reader.frequencies_at(position))
+            blocks = {}
+            for row in range(reader.doc_count):
+                block = reader.find_block(position, row)
+                if block < 0:
+                    assert row not in expected
+                    continue
+                if block not in blocks:
+                    blocks[block] = reader.block_frequencies(position, block)
+                    assert len(blocks[block]) <= POSTING_BLOCK_SIZE
+                assert blocks[block].get(row) == expected.get(row), (reader.term_at(position), row)
+            assert sum(map(len, blocks.values())) == len(expected)
+    finally:
+        mapped.close()
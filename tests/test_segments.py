@@ -0,0 +1,128 @@
+"""
+Index nhiều segment (thêm/cập nhật/xóa qua update_index_from_database) phải
+xếp hạng giống hệt index build lại từ đầu trên cùng database
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+
+import pytest
+
+from config.settings import Config
+from modules.module2_text_processing.text_processor import MovieIndexBuilder, SearchableIndex, SegmentedIndex
+
+BATCHES = 6
+CHANGES_PER_BATCH = 5  # Số phim bị xóa và số phim được INSERT OR REPLACE sau mỗi đợt
+
+def build_segments(db_path, rng):
+    """Nạp database theo từng đợt, mỗi đợt một segment mới kèm xóa/cập nhật vài phim"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('SELECT * FROM movies ORDER BY id').fetchall()
+        columns = ','.join(f'"{column[1]}"' for column in conn.execute('PRAGMA table_info(movies)') if column[1] != 'id')
+        conn.execute('DELETE FROM movies')
+        conn.commit()
+        
+        builder = MovieIndexBuilder()
+        builder.db_path = db_path
+        size = len(rows) // BATCHES + 1
+        for start in range(0, len(rows), size):
+            conn.executemany(f'INSERT INTO movies VALUES ({",".join("?" * len(rows[0]))})', rows[start:start + size])
+            ids = [movie_id for (movie_id,) in conn.execute('SELECT id FROM movies ORDER BY id')]
+            conn.executemany('DELETE FROM movies WHERE id = ?', [(movie_id,) for movie_id in rng.sample(ids, CHANGES_PER_BATCH)])
+            ids = [movie_id for (movie_id,) in conn.execute('SELECT id FROM movies ORDER BY id')]
+            conn.executemany(f'INSERT OR REPLACE INTO movies ({columns}) SELECT {columns} FROM movies WHERE id = ?',
+                             [(movie_id,) for movie_id in rng.sample(ids, CHANGES_PER_BATCH)])
+            conn.commit()
+            builder.update_index_from_database()
+            builder.wait_for_merge()
+    finally:
+        conn.close()
+
+@pytest.fixture(params=[(100, 100), (2, 3)], ids=['khong-gop', 'gop-segment'])
+def indexes(request, tmp_path, monkeypatch):
+    """(SegmentedIndex, InvertedIndex build lại từ đầu) trên bản sao database mẫu"""
+    merge_factor, max_segments = request.param
+    monkeypatch.setattr(Config, 'INDEX_SEGMENTS_PATH', tmp_path / 'segments')
+    monkeypatch.setattr(Config, 'SEGMENT_MERGE_FACTOR', merge_factor)
+    monkeypatch.setattr(Config, 'MAX_SEGMENTS', max_segments)
+    db_path = tmp_path / 'search_engine.db'
+    shutil.copy(Config.DATABASE_PATH, db_path)
+    
+    build_segments(str(db_path), random.Random(merge_factor))
+    segmented = SegmentedIndex(Config.INDEX_SEGMENTS_PATH)
+    
+    builder = MovieIndexBuilder()
+    builder.db_path = str(db_path)
+    builder.build_index_from_database()
+    return segmented, builder.index
+
+def assert_same_ranking(actual, expected, query):
+    assert [doc_id for doc_id, _ in actual] == [doc_id for doc_id, _ in expected], query
+    assert all(abs(a - e) < 1e-9 for (_, a), (_, e) in zip(actual, expected)), query
+
+def test_segmented_matches_rebuilt_index(indexes, sample_queries, monkeypatch):
+    segmented, full = indexes
+    if Config.MAX_SEGMENTS < 100:
+        assert len(segmented.segments) <= Config.MAX_SEGMENTS
+    else:
+        assert len(segmented.segments) > 1
+    assert segmented.tombstones
+    assert segmented.doc_count == full.doc_count
+    
+    # Thống kê ghi sẵn lúc cập nhật/merge khớp với index build lại
+    assert segmented.all_doc_ids() == full.all_doc_ids()
+    assert all(abs(segmented.doc_norm(doc_id) - full.doc_norm(doc_id)) < 1e-9 for doc_id in full.all_doc_ids())
+    assert all(segmented.document_frequency(term) == full.document_frequency(term) for term in full.vocabulary)
+    
+    for query in sample_queries:
+        expected = full.search(query, 10, prune=False)
+        assert_same_ranking(segmented.search(query, 10, prune=True), expected, query)
+        assert_same_ranking(segmented.search(query, 10, prune=False), expected, query)
+        
+        actual_bm25f, expected_bm25f = segmented.bm25f_scores(query), full.bm25f_scores(query)
+        assert set(actual_bm25f) == set(expected_bm25f), query
+        assert all(abs(actual_bm25f[doc_id] - expected_bm25f[doc_id]) < 1e-9 for doc_id in actual_bm25f), query
+    
+    # List chưa giải mã luôn được tra theo khối (bảng skip) của từng segment
+    monkeypatch.setattr(SearchableIndex, 'PROBE_DECODE_RATIO', 0)
+    for query in sample_queries:
+        assert_same_ranking(segmented.search(query, 10, prune=True), full.search(query, 10, prune=False), query)
+
+def test_startup_updates_existing_index_incrementally(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'INDEX_SEGMENTS_PATH', tmp_path / 'segments')
+    db_path = tmp_path / 'search_engine.db'
+    shutil.copy(Config.DATABASE_PATH, db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        movie = conn.execute('SELECT * FROM movies ORDER BY id DESC LIMIT 1').fetchone()
+        conn.execute('DELETE FROM movies WHERE id = ?', (movie[0],))
+        conn.commit()
+        
+        # Chưa có index: build toàn bộ
+        builder = MovieIndexBuilder()
+        builder.db_path = str(db_path)
+        builder.load_or_build_index()
+        assert movie[0] not in builder.index.all_doc_ids()
+        
+        # Crawl thêm phim làm database mới hơn manifest: lần khởi động sau chỉ cập nhật tăng dần
+        conn.execute(f'INSERT INTO movies VALUES ({",".join("?" * len(movie))})', movie)
+        conn.commit()
+        db_ids = sorted(movie_id for (movie_id,) in conn.execute('SELECT id FROM movies'))
+    finally:
+        conn.close()
+    manifest_mtime = (Config.INDEX_SEGMENTS_PATH / SegmentedIndex.MANIFEST_NAME).stat().st_mtime
+    os.utime(db_path, (manifest_mtime + 10, manifest_mtime + 10))
+    
+    def full_rebuild(self):
+        raise AssertionError("index đã có, không được build lại toàn bộ")
+    monkeypatch.setattr(MovieIndexBuilder, 'build_index_from_database', full_rebuild)
+    
+    restarted = MovieIndexBuilder()
+    restarted.db_path = str(db_path)
+    restarted.load_or_build_index()
+    restarted.wait_for_merge()
+    assert isinstance(restarted.index, SegmentedIndex)
+    assert restarted.index.all_doc_ids() == db_ids